@@ -0,0 +1,180 @@
+"""Find every way for SHORT to beat Shannon's heuristic.
+
+Shannon always plays the same move in the same position, so to find all the ways of beating him as
+SHORT only SHORT's moves need to be searched: CUT's reply to each one is forced. The positions
+reached by different orders of SHORT's moves are merged (so the tree of lines becomes a graph), and
+Shannon's reply to each position is only worked out once. The subtrees for SHORT's first moves are
+searched in parallel.
+
+The result holds, for each position with SHORT to move from which SHORT can win, the winning moves
+and the number of plies each takes to win. Since Shannon's replies are forced, this is every
+winning strategy for SHORT. The shortest winning lines, or all of them, can be read off it.
+
+    python beat_shannon.py --M 3
+    python beat_shannon.py --M 4 --max-plies 16 --records wins.bcg
+"""
+
+import argparse
+import multiprocessing
+import time
+from collections import namedtuple
+
+from birdcage import *
+from birdcage import _top_left_moves
+
+# the result of a search: Shannon's first move, and a dictionary keyed by position (a `(cuts, shorts)`
+# pair, as in `CompactBirdCage`, with SHORT to move) of the positions from which SHORT can win, whose
+# values are dictionaries of the winning moves, each with the number of plies it takes to win, Shannon's
+# reply and the position after it (with SHORT to move again), or None for both if the move wins straight away
+Wins = namedtuple("Wins", ["M", "first_move", "moves"])
+
+class _Searcher:
+    def __init__(self, M, use_extra_resistors=True, max_plies=None):
+        self.M = M
+        self.shannon = Shannon(use_extra_resistors=use_extra_resistors, solver=ExactSolver())
+        self.max_plies = max_plies if max_plies is not None else len(_top_left_moves(M))
+        self.replies = {} # Shannon's move in each position
+        self.wins = {}
+        self.searched = set()
+
+    def reply(self, board):
+        key = (board.cuts, board.shorts)
+        move = self.replies.get(key)
+        if move is None:
+            move = self.replies[key] = self.shannon.play(board)
+        return move
+
+    def search(self, board):
+        """Search the position on `board` (with SHORT to move), and return the fewest plies SHORT needs
+        to win from it, or None if SHORT can't win (within `max_plies` of the start)."""
+        key = (board.cuts, board.shorts)
+        if key in self.searched:
+            winning = self.wins.get(key)
+            return min(plies for plies, _, _ in winning.values()) if winning else None
+        winning = {}
+        if len(board.moves) < self.max_plies:
+            for move in _top_left_moves(self.M):
+                if board.state(move) != OPEN:
+                    continue
+                board.move(move)
+                if board.black_has_won():
+                    winning[move] = (1, None, None)
+                elif len(board.moves) + 1 < self.max_plies:
+                    reply = self.reply(board)
+                    board.move(reply)
+                    if not board.white_has_won():
+                        plies = self.search(board)
+                        if plies is not None:
+                            winning[move] = (plies + 2, reply, (board.cuts, board.shorts))
+                    board.undo()
+                board.undo()
+        self.searched.add(key)
+        if winning:
+            self.wins[key] = winning
+            return min(plies for plies, _, _ in winning.values())
+        return None
+
+def _search_subtree(args):
+    M, moves, use_extra_resistors, max_plies = args
+    searcher = _Searcher(M, use_extra_resistors, max_plies)
+    searcher.search(CompactBirdCage(M, moves))
+    return searcher.wins
+
+def find_wins(M=3, use_extra_resistors=True, max_plies=None, workers=None):
+    """Find every way for SHORT to beat Shannon on a board of size `M`, in games of up to `max_plies`
+    plies (or any length), searching on `workers` processes (the number of CPUs by default), and
+    return a `Wins`."""
+    searcher = _Searcher(M, use_extra_resistors, max_plies)
+    board = CompactBirdCage(M)
+    first_move = searcher.reply(board)
+    board.move(first_move)
+    # search the positions after each of SHORT's first moves and Shannon's reply in parallel
+    tasks = []
+    for move in _top_left_moves(M):
+        if board.state(move) != OPEN:
+            continue
+        board.move(move)
+        if not board.black_has_won() and len(board.moves) + 1 < searcher.max_plies:
+            board.move(searcher.reply(board))
+            if not board.white_has_won():
+                tasks.append((M, list(board.moves), use_extra_resistors, max_plies))
+            board.undo()
+        board.undo()
+    pool = multiprocessing.Pool(workers) if workers != 1 else None
+    try:
+        results = pool.imap(_search_subtree, tasks) if pool is not None else map(_search_subtree, tasks)
+        for wins in results:
+            searcher.wins.update(wins)
+            searcher.searched.update(wins)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    # the subtrees are searched, so this only combines their results
+    for _, moves, _, _ in tasks:
+        child = CompactBirdCage(M, moves)
+        searcher.searched.add((child.cuts, child.shorts))
+    searcher.search(board)
+    return Wins(M, first_move, searcher.wins)
+
+def _root(wins):
+    board = CompactBirdCage(wins.M, [wins.first_move])
+    return (board.cuts, board.shorts)
+
+def count_lines(wins):
+    """Return the number of different winning lines for SHORT."""
+    counts = {}
+    def count(key):
+        if key not in counts:
+            counts[key] = sum(1 if child is None else count(child) for _, _, child in wins.moves[key].values())
+        return counts[key]
+    root = _root(wins)
+    return count(root) if root in wins.moves else 0
+
+def winning_lines(wins, shortest=False):
+    """Generate the winning lines for SHORT, as lists of moves (including Shannon's), or only the
+    shortest ones if `shortest` is set."""
+    root = _root(wins)
+    if root not in wins.moves:
+        return
+    board = CompactBirdCage(wins.M, [wins.first_move])
+    def lines(key):
+        winning = wins.moves[key]
+        fewest = min(plies for plies, _, _ in winning.values())
+        for move, (plies, reply, child) in winning.items():
+            if shortest and plies > fewest:
+                continue
+            board.move(move)
+            if child is None:
+                yield list(board.moves)
+            else:
+                board.move(reply)
+                yield from lines(child)
+                board.undo()
+            board.undo()
+    yield from lines(root)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find every way for SHORT to beat Shannon's heuristic.")
+    parser.add_argument("--M", type=int, default=3, help="board size")
+    parser.add_argument("--no-extra-resistors", action="store_true", help="play against Shannon without the extra resistors")
+    parser.add_argument("--max-plies", type=int, default=None, help="only search games of up to this many plies")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--records", help="game record file to append every winning line to (see game_records.py)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    wins = find_wins(args.M, not args.no_extra_resistors, args.max_plies, args.workers)
+    print(f"searched in {time.perf_counter() - start:.1f}s")
+    print(f"Shannon opens with {wins.first_move}")
+    print(f"{len(wins.moves)} positions from which SHORT can win, {count_lines(wins)} winning lines")
+    shortest = list(winning_lines(wins, shortest=True))
+    if shortest:
+        print(f"{len(shortest)} shortest winning lines ({len(shortest[0])} plies):")
+        for line in shortest:
+            print("  " + display_moves(line))
+    if args.records:
+        from game_records import GameWriter
+
+        with GameWriter(args.records) as writer:
+            for line in winning_lines(wins):
+                writer.write(args.M, line, "shannon", "short")
@@ -0,0 +1,232 @@
+"""Benchmarks for board operations, win detection and Shannon's move selection.
+
+Each benchmark is timed on a range of board sizes, and the results (the best time per operation, in
+seconds) are appended to a JSON history file, along with the commit, Python version and machine they
+were run on. Each result is compared with the last result for the same benchmark on the same machine,
+and any benchmark that has slowed down by more than a threshold is reported as a regression.
+
+    python benchmark.py                 # run everything, and add the results to benchmarks.json
+    python benchmark.py -k Shannon      # only run benchmarks whose name contains "Shannon"
+    python benchmark.py --check         # exit with an error if there are any regressions
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+import warnings
+
+from birdcage import *
+
+# benchmarks, as (name, board sizes, function), where the function takes a board size and returns a
+# function to time (which does all of the setup) and the number of operations it performs per call
+BENCHMARKS = []
+
+def benchmark(name, sizes):
+    """Register a benchmark."""
+    def register(f):
+        BENCHMARKS.append((name, sizes, f))
+        return f
+    return register
+
+BOARD_SIZES = (3, 4, 8, 16, 32)
+NUMPY_SIZES = (3, 4, 8, 16)
+LCAPY_SIZES = (3, 4)
+
+def random_game(M, seed=0):
+    """Return the moves of a random game on a board of size `M`."""
+    rng = random.Random(seed)
+    moves = list(valid_moves(M))
+    rng.shuffle(moves)
+    board = CompactBirdCage(M)
+    for move in moves:
+        board.move(move)
+        if board.white_has_won() or board.black_has_won():
+            break
+    return board.moves
+
+def _midgame(board_type, M):
+    """Return a board part way through a random game."""
+    moves = random_game(M)
+    return board_type(M, moves[:len(moves) // 2])
+
+def _play_game(board_type):
+    def setup(M):
+        moves = random_game(M)
+        def run():
+            board = board_type(M)
+            for move in moves:
+                board.move(move)
+        return run, len(moves)
+    return setup
+
+benchmark("BirdCage.move", BOARD_SIZES)(_play_game(BirdCage))
+benchmark("BridgIt.move", BOARD_SIZES)(_play_game(BridgIt))
+benchmark("CompactBirdCage.move", BOARD_SIZES)(_play_game(CompactBirdCage))
+
+def _has_won(board_type, method):
+    def setup(M):
+        return getattr(_midgame(board_type, M), method), 1
+    return setup
+
+for board_type in (BirdCage, BridgIt):
+    for method in ("white_has_won", "black_has_won"):
+        benchmark(f"{board_type.__name__}.{method}", BOARD_SIZES)(_has_won(board_type, method))
+
+@benchmark("BirdCage.__repr__", BOARD_SIZES)
+def _(M):
+    return _midgame(BirdCage, M).__repr__, 1
+
+@benchmark("BridgIt.__repr__", BOARD_SIZES)
+def _(M):
+    return _midgame(BridgIt, M).__repr__, 1
+
+@benchmark("Shannon.play (Lcapy)", LCAPY_SIZES)
+def _(M):
+    board = _midgame(BirdCage, M)
+    return lambda: Shannon().play(board), 1
+
+@benchmark("Shannon.play (NumPy)", NUMPY_SIZES)
+def _(M):
+    board = _midgame(BirdCage, M)
+    return lambda: Shannon(solver=NumpySolver()).play(board), 1
+
+@benchmark("Shannon.play (exact)", NUMPY_SIZES)
+def _(M):
+    board = _midgame(CompactBirdCage, M)
+    return lambda: Shannon(solver=ExactSolver()).play(board), 1
+
+@benchmark("LookaheadShannon.play", NUMPY_SIZES)
+def _(M):
+    board = _midgame(CompactBirdCage, M)
+    return lambda: LookaheadShannon().play(board), 1
+
+@benchmark("MCTS rollout", BOARD_SIZES)
+def _(M):
+    from mcts import MCTS
+
+    board = _midgame(CompactBirdCage, M)
+    return lambda: MCTS(time_limit=None, max_rollouts=100, prior_weight=0, seed=0).search(board), 100
+
+@benchmark("Shannon.voltage_diffs_str", LCAPY_SIZES)
+def _(M):
+    board = _midgame(BirdCage, M)
+    return lambda: Shannon().voltage_diffs_str(board), 1
+
+def time_benchmark(run, ops, repeat=5, min_time=0.2):
+    """Return the best time per operation over `repeat` runs, each of at least `min_time` seconds."""
+    timer = timeit.Timer(run)
+    number = 1
+    while True:
+        seconds = timer.timeit(number)
+        if seconds >= min_time:
+            break
+        number *= 10 if seconds == 0 else min(10, max(2, int(min_time / seconds) + 1))
+    times = [seconds] + timer.repeat(repeat - 1, number) if repeat > 1 else [seconds]
+    return min(times) / number / ops
+
+def run_benchmarks(keyword=None, sizes=None, repeat=5, min_time=0.2):
+    """Run the benchmarks (optionally only those whose name contains `keyword`, or for the given board
+    `sizes`) and return a dictionary of the time per operation, keyed by "name[M=size]"."""
+    results = {}
+    for name, benchmark_sizes, setup in BENCHMARKS:
+        if keyword is not None and keyword not in name:
+            continue
+        for M in benchmark_sizes:
+            if sizes is not None and M not in sizes:
+                continue
+            run, ops = setup(M)
+            results[f"{name}[M={M}]"] = time_benchmark(run, ops, repeat, min_time)
+    return results
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def make_run(results):
+    """Return a history record for a set of results."""
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "results": results,
+    }
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+def save_history(path, history):
+    with open(path, "w") as f:
+        json.dump(history, f, indent=1)
+        f.write("\n")
+
+def compare(run, history, threshold=1.2):
+    """Compare `run` with the most recent results in `history` from the same machine.
+
+    Return a list of (name, previous time, time, ratio) for every benchmark that has been run before,
+    and a list of the names of those that are slower by more than `threshold` times."""
+    rows = []
+    regressions = []
+    for name, seconds in run["results"].items():
+        previous = next(
+            (r["results"][name] for r in reversed(history) if r["machine"] == run["machine"] and name in r["results"]),
+            None,
+        )
+        if previous is not None:
+            ratio = seconds / previous
+            rows.append((name, previous, seconds, ratio))
+            if ratio > threshold:
+                regressions.append(name)
+    return rows, regressions
+
+def _format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("µs", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Bird Cage benchmarks.")
+    parser.add_argument("-k", dest="keyword", help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", help="comma-separated board sizes to run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum time for each repeat, in seconds")
+    parser.add_argument("--history", default="benchmarks.json", help="JSON file of previous results")
+    parser.add_argument("--no-save", action="store_true", help="don't add the results to the history")
+    parser.add_argument("--threshold", type=float, default=1.2, help="slow down ratio that counts as a regression")
+    parser.add_argument("--check", action="store_true", help="exit with an error if there are any regressions")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    sizes = [int(M) for M in args.sizes.split(",")] if args.sizes else None
+    history = load_history(args.history)
+    results = run_benchmarks(args.keyword, sizes, args.repeat, args.min_time)
+    run = make_run(results)
+    rows, regressions = compare(run, history, args.threshold)
+    previous = {name: (before, ratio) for name, before, _, ratio in rows}
+    for name, seconds in results.items():
+        line = f"{name:<40} {_format_time(seconds):>10}"
+        if name in previous:
+            before, ratio = previous[name]
+            line += f"  (was {_format_time(before)}, x{ratio:.2f}{' REGRESSION' if name in regressions else ''})"
+        print(line)
+    if not args.no_save:
+        history.append(run)
+        save_history(args.history, history)
+    if args.check and regressions:
+        print(f"{len(regressions)} regression(s)", file=sys.stderr)
+        sys.exit(1)
@@ -1,20 +1,64 @@
+import json
 import math
+from array import array
+from fractions import Fraction
+import sqlite3
+import time
+from collections import OrderedDict, defaultdict, namedtuple
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+import heapq
 from itertools import product
-from lcapy import Circuit
-import networkx as nx
+import numpy as np
 import random
-from sympy.core.numbers import ilcm
+import threading
+
+# Lcapy, SymPy and networkx are slow to import, so they are imported when they are first used
+# (see `prewarm`), so that tools that don't solve circuits start quickly
+
+# Resistance of the pull-up resistors, relative to the unit resistors in the bird cage
+PULL_UP_RESISTANCE = 30
 
 # Utility functions for dealing with move notation
 
 def _to_numeric(alpha):
-    """Convert move (or position) from alphanumeric ('A3') to numeric (1, 3) notation."""
-    col_letter, row_num = alpha[0], int(alpha[1])
-    return ord(col_letter) - ord("A") + 1, row_num
+    """Convert move (or position) from alphanumeric ('A3') to numeric (1, 3) notation.
+
+    On large boards columns after 'Z' are 'AA', 'AB', and so on, and rows can have more than one digit."""
+    i = len(alpha.rstrip("0123456789"))
+    x = 0
+    for col_letter in alpha[:i]:
+        x = x * 26 + ord(col_letter) - ord("A") + 1
+    return x, int(alpha[i:])
+
+def _column_name(x):
+    """Return the letters for column `x` (from 1): 'A' to 'Z', then 'AA', 'AB', and so on."""
+    col = ""
+    while x > 0:
+        x, r = divmod(x - 1, 26)
+        col = chr(r + ord("A")) + col
+    return col
 
 def _to_alpha(x, y):
     """Convert move (or position) from numeric (1, 3) to alphanumeric ('A3') notation."""
-    return f"{chr(x + ord('A') - 1)}{y}"
+    return f"{_column_name(x)}{y}"
+
+def _column_label_rows(M):
+    """Return the rows of column letters under a board of size `M`, one row per letter, with
+    letters right-aligned so that a one letter column name is on the last row."""
+    names = [_column_name(x) for x in range(1, 2 * M)]
+    width = len(names[-1])
+    return ["    " + "".join(f"{name.rjust(width)[i]} " for name in names) + "  " for i in range(width)]
+
+def _top_left_order(move):
+    """Sort key for ordering moves from top-left to bottom-right."""
+    x, y = _to_numeric(move)
+    return -y, x
+
+@lru_cache(maxsize=None)
+def _top_left_moves(M):
+    """Return all the valid moves on the board of size `M`, ordered from top-left to bottom-right."""
+    return tuple(sorted(valid_moves(M), key=_top_left_order))
 
 def is_valid_move(move, M=3):
     """Check if a move is a valid move on a board of size `M`."""
@@ -39,6 +83,66 @@ def display_moves(moves):
             s += move.lower()
     return s
 
+class _UnionFind:
+    """A union-find (disjoint set) structure over hashable items, using union by size.
+
+    If `rollback` is set then paths are not compressed, so that `undo` can take back the most
+    recent `union` in constant time."""
+
+    def __init__(self, rollback=False):
+        self.parent = {}
+        self.size = {}
+        self.rollback = rollback
+        self.history = []
+
+    def find(self, x):
+        """Return the representative item of the set containing `x`."""
+        parent = self.parent
+        root = x
+        while root in parent:
+            root = parent[root]
+        if not self.rollback:
+            while x != root:
+                parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """Merge the sets containing `a` and `b`."""
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            if self.size.get(a, 1) < self.size.get(b, 1):
+                a, b = b, a
+            self.parent[b] = a
+            self.size[a] = self.size.get(a, 1) + self.size.get(b, 1)
+        if self.rollback:
+            self.history.append((a, b))
+
+    def undo(self):
+        """Take back the most recent union (only if `rollback` is set)."""
+        a, b = self.history.pop()
+        if a != b:
+            del self.parent[b]
+            self.size[a] -= self.size.get(b, 1)
+
+    def connected(self, a, b):
+        """Check if `a` and `b` are in the same set."""
+        return self.find(a) == self.find(b)
+
+    def copy(self):
+        """Return a copy of this union-find structure."""
+        uf = _UnionFind(self.rollback)
+        uf.parent = dict(self.parent)
+        uf.size = dict(self.size)
+        uf.history = list(self.history)
+        return uf
+
+def _graph_of(edges):
+    import networkx as nx
+
+    G = nx.Graph()
+    G.add_edges_from(edges)
+    return G
+
 class BridgIt:
     """A Bridg-It board containing the moves of both players,
     and a graph of connections for each player.
@@ -58,14 +162,18 @@ class BridgIt:
     def __init__(self, M=3, moves=None):
         self.M = M
         self.moves = []
-        self.white_graph = nx.Graph()
-        self.black_graph = nx.Graph()
+        # the connections of each player, as (u, v) pairs (see `white_graph` and `black_graph`)
+        self.white_edges = set()
+        self.black_edges = set()
+        # connected components of each graph, for detecting a win
+        self.white_sets = _UnionFind()
+        self.black_sets = _UnionFind()
         # add the initial connections at each side of the board
         for i in range(M - 1):
-            self.white_graph.add_edge((0, 2 * i + 1), (0, 2 * i + 3))
-            self.black_graph.add_edge((2 * i + 1, 0), (2 * i + 3, 0))
-            self.white_graph.add_edge((2 * M, 2 * i + 1), (2 * M, 2 * i + 3))
-            self.black_graph.add_edge((2 * i + 1, 2 * M), (2 * i + 3, 2 * M))
+            self._add_edge(True, (0, 2 * i + 1), (0, 2 * i + 3))
+            self._add_edge(False, (2 * i + 1, 0), (2 * i + 3, 0))
+            self._add_edge(True, (2 * M, 2 * i + 1), (2 * M, 2 * i + 3))
+            self._add_edge(False, (2 * i + 1, 2 * M), (2 * i + 3, 2 * M))
         # play any moves
         for move in moves or []:
             self.move(move)
@@ -77,13 +185,32 @@ class BridgIt:
         else:
             return (x - 1, y), (x + 1, y)
 
+    def _add_edge(self, white, u, v):
+        """Add an edge to the graph for white or black."""
+        if white:
+            self.white_edges.add((u, v))
+            self.white_sets.union(u, v)
+        else:
+            self.black_edges.add((u, v))
+            self.black_sets.union(u, v)
+
+    @property
+    def white_graph(self):
+        """A networkx graph of white's connections (networkx is only imported when this is used)."""
+        return _graph_of(self.white_edges)
+
+    @property
+    def black_graph(self):
+        """A networkx graph of black's connections."""
+        return _graph_of(self.black_edges)
+
     def white_has_won(self):
         """Check if white has won, by joining the left and right sides of the board."""
-        return len(list(nx.connected_components(self.white_graph))) == 1
+        return self.white_sets.connected((0, 1), (2 * self.M, 1))
 
     def black_has_won(self):
         """Check if black has won, by joining the top and bottom sides of the board."""
-        return len(list(nx.connected_components(self.black_graph))) == 1
+        return self.black_sets.connected((1, 0), (1, 2 * self.M))
 
     def move(self, move):
         """Apply the given move to the current board and return the resulting board."""
@@ -95,10 +222,10 @@ class BridgIt:
         x, y = _to_numeric(move)
         if len(self.moves) % 2 == 0: # white move
             edge = self._move_to_edge(x, y, True)
-            self.white_graph.add_edge(*edge)
+            self._add_edge(True, *edge)
         else: # black move
             edge = self._move_to_edge(x, y, False)
-            self.black_graph.add_edge(*edge)
+            self._add_edge(False, *edge)
         self.moves.append(move)
         return self
 
@@ -116,13 +243,13 @@ class BridgIt:
             for x in range(0, 2 * M + 1):
                 if (x + y) % 2 == 0: # edge
                     # TODO: use _move_to_edge here
-                    if x % 2 == 0 and ((x, y - 1), (x, y + 1)) in self.white_graph.edges():
+                    if x % 2 == 0 and ((x, y - 1), (x, y + 1)) in self.white_edges:
                         s += "| "
-                    elif x % 2 == 0 and ((x - 1, y), (x + 1, y)) in self.black_graph.edges():
+                    elif x % 2 == 0 and ((x - 1, y), (x + 1, y)) in self.black_edges:
                         s += "- "
-                    elif x % 2 == 1  and ((x - 1, y), (x + 1, y)) in self.white_graph.edges():
+                    elif x % 2 == 1  and ((x - 1, y), (x + 1, y)) in self.white_edges:
                         s += "- "
-                    elif x % 2 == 1  and ((x, y - 1), (x, y + 1)) in self.black_graph.edges():
+                    elif x % 2 == 1  and ((x, y - 1), (x, y + 1)) in self.black_edges:
                         s += "| "
                     else:
                         s += "  "
@@ -132,14 +259,9 @@ class BridgIt:
                     else:
                         s += "● "
             s += "\n"
-        # letters on bottom row
-        s += "  "
-        for x in range(0, 2 * M + 1):
-            if 0 < x < 2 * M:
-                s += f"{chr(x + ord('A') - 1)} "
-            else:
-                s += "  "
-        s += "\n"
+        # letters on bottom row(s)
+        for row in _column_label_rows(M):
+            s += row + "\n"
         s += display_moves(self.moves)
         s += "\n"
         return s
@@ -163,17 +285,43 @@ class BirdCage:
     def __init__(self, M=3, moves=None):
         self.M = M
         self.moves = []
-        # unlike BridgIt, we use a single graph to represent the state
-        self.G = nx.Graph()
-        # add all valid moves as edges of weight 1
-        for move in valid_moves(self.M):
-            x, y = _to_numeric(move)
-            u, v = self._move_to_edge(x, y)
-            self.G.add_edge(u, v, weight=1)
+        # the graph (see `G`) is only built when a solver needs it, since networkx is slow to import
+        self._G = None
+        # nodes joined by SHORT moves, for detecting a win by black
+        self.short_sets = _UnionFind()
+        # faces joined by CUT moves (the white graph of the equivalent Bridg-It board),
+        # for detecting a win by white
+        self.cut_sets = _UnionFind()
+        for i in range(M - 1):
+            self.cut_sets.union((0, 2 * i + 1), (0, 2 * i + 3))
+            self.cut_sets.union((2 * M, 2 * i + 1), (2 * M, 2 * i + 3))
         # play any moves
         for move in moves or []:
             self.move(move)
 
+    @property
+    def G(self):
+        """The bird cage graph: unlike BridgIt, a single graph represents the state. Every edge that
+        hasn't been CUT has a weight, which is 0 once it has been SHORTed and 1 before."""
+        if self._G is None:
+            import networkx as nx
+
+            G = nx.Graph()
+            # add all valid moves as edges of weight 1
+            for move in valid_moves(self.M):
+                G.add_edge(*self._move_to_edge(*_to_numeric(move)), weight=1)
+            for i, move in enumerate(self.moves):
+                self._update_graph(G, move, i % 2 == 0)
+            self._G = G
+        return self._G
+
+    def _update_graph(self, G, move, cut):
+        u, v = self._move_to_edge(*_to_numeric(move))
+        if cut: # white moves are CUT (remove from graph)
+            G.remove_edge(u, v)
+        else: # black moves are SHORT (weight 0)
+            G.add_edge(u, v, weight=0)
+
     def _move_to_edge(self, x, y):
         """Convert a numeric move to an edge."""
         if x % 2 == 1:
@@ -187,17 +335,26 @@ class BirdCage:
             return self.M, y
         return x, y
 
+    def _move_to_dual_edge(self, x, y):
+        """Convert a numeric move to the edge between the faces on either side of it.
+
+        The faces are the nodes of the white graph on the equivalent Bridg-It board, where the
+        left and right sides of the board are the faces outside the bird cage."""
+        if x % 2 == 0:
+            return (x, y - 1), (x, y + 1)
+        else:
+            return (x - 1, y), (x + 1, y)
+
     def white_has_won(self):
         """Check if white has won, by CUTting all paths from top to bottom."""
-        top_node = self._map_node(0, 2 * self.M)
-        bottom_node = self._map_node(0, 0)
-        return not nx.has_path(self.G, top_node, bottom_node)
+        # equivalently, the CUT edges join the faces on the left and right of the bird cage
+        return self.cut_sets.connected((0, 1), (2 * self.M, 1))
 
     def black_has_won(self):
         """Check if black has won, by SHORTing a path from top to bottom."""
         top_node = self._map_node(0, 2 * self.M)
         bottom_node = self._map_node(0, 0)
-        return nx.shortest_path_length(self.G, top_node, bottom_node, weight="weight") == 0
+        return self.short_sets.connected(top_node, bottom_node)
 
     def move(self, move):
         """Apply the given move to the current board and return the resulting board."""
@@ -207,58 +364,429 @@ class BirdCage:
         if move in self.moves:
             raise ValueError(f"Move {move} has already been made")
         x, y = _to_numeric(move)
-        u, v = self._move_to_edge(x, y)
-        if len(self.moves) % 2 == 0: # white moves are CUT (remove from graph)
-            self.G.remove_edge(u, v)
-        else: # black moves are SHORT (weight 0)
-            self.G.add_edge(u, v, weight=0)
+        cut = len(self.moves) % 2 == 0
+        if cut:
+            self.cut_sets.union(*self._move_to_dual_edge(x, y))
+        else:
+            self.short_sets.union(*self._move_to_edge(x, y))
+        if self._G is not None:
+            self._update_graph(self._G, move, cut)
         self.moves.append(move)
         return self
 
     def __repr__(self):
         """Return a printable representation of this board"""
         M = self.M
-        s = ""
+        cuts, shorts = set(self.moves[0::2]), set(self.moves[1::2])
+        rows = []
         for y in range(2 * M, -1, -1):
             # numbers on left side
-            if 0 < y < 2 * M:
-                s += f"{y} "
-            else:
-                s += "  "
+            row = [f"{y} " if 0 < y < 2 * M else "  "]
             # main grid
             for x in range(0, 2 * M + 1):
                 if (x + y) % 2 == 0: # edge
-                    edge = self._move_to_edge(x, y)
-                    if edge in self.G.edges():
-                        weight = self.G.get_edge_data(*edge)["weight"]
+                    move = _to_alpha(x, y)
+                    if 0 < x < 2 * M and 0 < y < 2 * M and move not in cuts:
+                        short = move in shorts
                         if y % 2 == 0:
-                            s += "- " if weight == 1 else "= "
+                            row.append("= " if short else "- ")
                         else:
-                            s += "| " if weight == 1 else "‖ "
+                            row.append("‖ " if short else "| ")
                     elif 0 < x < 2 * M and y in (0, 2 * M):
-                        s += "= "
+                        row.append("= ")
                     else:
-                        s += "  "
+                        row.append("  ")
                 else: # node
-                    if y % 2 == 0:
-                        s += "● "
+                    row.append("● " if y % 2 == 0 else "  ")
+            rows.append("".join(row))
+        # letters on bottom row(s)
+        rows.extend(_column_label_rows(M))
+        rows.append(display_moves(self.moves))
+        return "\n".join(rows) + "\n"
+
+# the fixed layout of a board of size M: the moves (in `valid_moves` order) and their index,
+# the nodes and their index, the top and bottom node indices, the node indices at each
+# end of every move's edge (as arrays, and as a list of pairs), and the faces either side
+# of every move's edge (see `BirdCage._move_to_dual_edge`)
+_Layout = namedtuple("_Layout", ["M", "moves", "move_index", "nodes", "node_index", "top", "bottom", "u", "v", "edges", "dual_edges"])
+
+@lru_cache(maxsize=None)
+def _layout(M):
+    """Return the `_Layout` for a board of size `M`."""
+    birdcage = BirdCage(M)
+    moves = tuple(valid_moves(M))
+    edges = [birdcage._move_to_edge(*_to_numeric(move)) for move in moves]
+    nodes = sorted({node for edge in edges for node in edge})
+    node_index = {node: i for i, node in enumerate(nodes)}
+    return _Layout(
+        M,
+        moves,
+        {move: i for i, move in enumerate(moves)},
+        nodes,
+        node_index,
+        node_index[birdcage._map_node(0, 2 * M)],
+        node_index[birdcage._map_node(0, 0)],
+        np.array([node_index[n1] for n1, _ in edges]),
+        np.array([node_index[n2] for _, n2 in edges]),
+        [(node_index[n1], node_index[n2]) for n1, n2 in edges],
+        [birdcage._move_to_dual_edge(*_to_numeric(move)) for move in moves],
+    )
+
+class CompactBirdCage:
+    """A Bird Cage board that stores the state of every edge in a pair of integer bitboards.
+
+    Bit `i` of `cuts` (or `shorts`) is set if move `i` (in `valid_moves` order) has been CUT (or
+    SHORTed). This has the same `move` and `moves` API as `BirdCage`, but moves are applied and
+    undone in constant time, and boards are cheap to copy. Boards with the same moves are equal
+    (and have the same hash), regardless of the order the moves were played in."""
+
+    def __init__(self, M=3, moves=None):
+        self.M = M
+        self.moves = []
+        self.cuts = 0
+        self.shorts = 0
+        self.layout = _layout(M)
+        # as for BirdCage, but these can be rolled back when a move is undone
+        self.short_sets = _UnionFind(rollback=True)
+        self.cut_sets = _UnionFind(rollback=True)
+        for i in range(M - 1):
+            self.cut_sets.union((0, 2 * i + 1), (0, 2 * i + 3))
+            self.cut_sets.union((2 * M, 2 * i + 1), (2 * M, 2 * i + 3))
+        # play any moves
+        for move in moves or []:
+            self.move(move)
+
+    def move(self, move):
+        """Apply the given move to the current board and return the resulting board."""
+        move = move.upper()
+        i = self.layout.move_index.get(move)
+        if i is None:
+            raise ValueError(f"Invalid move: {move}")
+        bit = 1 << i
+        if (self.cuts | self.shorts) & bit:
+            raise ValueError(f"Move {move} has already been made")
+        if len(self.moves) % 2 == 0: # white moves are CUT
+            self.cuts |= bit
+            self.cut_sets.union(*self.layout.dual_edges[i])
+        else: # black moves are SHORT
+            self.shorts |= bit
+            self.short_sets.union(*self.layout.edges[i])
+        self.moves.append(move)
+        return self
+
+    def undo(self):
+        """Take back the last move and return the resulting board."""
+        move = self.moves.pop()
+        mask = ~(1 << self.layout.move_index[move])
+        self.cuts &= mask
+        self.shorts &= mask
+        if len(self.moves) % 2 == 0:
+            self.cut_sets.undo()
+        else:
+            self.short_sets.undo()
+        return self
+
+    def copy(self):
+        """Return a copy of this board."""
+        board = object.__new__(type(self))
+        board.M = self.M
+        board.moves = list(self.moves)
+        board.cuts = self.cuts
+        board.shorts = self.shorts
+        board.layout = self.layout
+        board.short_sets = self.short_sets.copy()
+        board.cut_sets = self.cut_sets.copy()
+        return board
+
+    def state(self, move):
+        """Return the state of the given move: `OPEN`, `CUT` or `SHORT`."""
+        bit = 1 << self.layout.move_index[move.upper()]
+        return CUT if self.cuts & bit else SHORT if self.shorts & bit else OPEN
+
+    def states(self):
+        """Return an array of the state of every move (in `valid_moves` order), for `batch_voltage_diffs`."""
+        n = len(self.layout.moves)
+        cuts = np.array([(self.cuts >> i) & 1 for i in range(n)], dtype=bool)
+        shorts = np.array([(self.shorts >> i) & 1 for i in range(n)], dtype=bool)
+        return np.where(cuts, CUT, np.where(shorts, SHORT, OPEN)).astype(np.int8)
+
+    def white_has_won(self):
+        """Check if white has won, by CUTting all paths from top to bottom."""
+        return self.cut_sets.connected((0, 1), (2 * self.M, 1))
+
+    def black_has_won(self):
+        """Check if black has won, by SHORTing a path from top to bottom."""
+        return self.short_sets.connected(self.layout.top, self.layout.bottom)
+
+    def __eq__(self, other):
+        return isinstance(other, CompactBirdCage) and (self.M, self.cuts, self.shorts) == (other.M, other.cuts, other.shorts)
+
+    def __hash__(self):
+        return hash((self.M, self.cuts, self.shorts))
+
+    def _edge_char(self, x, y, state):
+        """Return the characters for an edge on the board."""
+        if state == CUT:
+            return "  "
+        if y % 2 == 0:
+            return "- " if state == OPEN else "= "
+        return "| " if state == OPEN else "‖ "
+
+    def _border_char(self, x, y):
+        """Return the characters for an edge position on the border of the board."""
+        return "= " if 0 < x < 2 * self.M and y in (0, 2 * self.M) else "  "
+
+    def _node_char(self, x, y):
+        """Return the characters for a node position on the board."""
+        return "● " if y % 2 == 0 else "  "
+
+    def __repr__(self):
+        """Return a printable representation of this board"""
+        M = self.M
+        index = self.layout.move_index
+        rows = []
+        for y in range(2 * M, -1, -1):
+            # numbers on left side
+            row = [f"{y} " if 0 < y < 2 * M else "  "]
+            # main grid
+            for x in range(0, 2 * M + 1):
+                if (x + y) % 2 == 0: # edge
+                    if 0 < x < 2 * M and 0 < y < 2 * M:
+                        bit = 1 << index[_to_alpha(x, y)]
+                        state = CUT if self.cuts & bit else SHORT if self.shorts & bit else OPEN
+                        row.append(self._edge_char(x, y, state))
                     else:
-                        s += "  "
-            s += "\n"
-        # letters on bottom row
-        s += "  "
-        for x in range(0, 2 * M + 1):
-            if 0 < x < 2 * M:
-                s += f"{chr(x + ord('A') - 1)} "
-            else:
-                s += "  "
-        s += "\n"
-        s += display_moves(self.moves)
-        s += "\n" 
-        return s
+                        row.append(self._border_char(x, y))
+                else: # node
+                    row.append(self._node_char(x, y))
+            rows.append("".join(row))
+        # letters on bottom row(s)
+        rows.extend(_column_label_rows(M))
+        rows.append(display_moves(self.moves))
+        return "\n".join(rows) + "\n"
+
+class CompactBridgIt(CompactBirdCage):
+    """A Bridg-It board with the same compact representation as `CompactBirdCage`.
+
+    Bridg-It is the planar dual of Bird Cage: white joining the left and right sides of the
+    board is the same as CUT separating the top and bottom of the bird cage, and black joining
+    the top and bottom is the same as SHORT joining them, so only the display differs."""
+
+    def _edge_char(self, x, y, state):
+        if state == OPEN:
+            return "  "
+        white = state == CUT
+        return "| " if (x % 2 == 0) == white else "- "
+
+    def _border_char(self, x, y):
+        if 0 < y < 2 * self.M and x in (0, 2 * self.M):
+            return "| "
+        if 0 < x < 2 * self.M and y in (0, 2 * self.M):
+            return "- "
+        return "  "
+
+    def _node_char(self, x, y):
+        return "○ " if x % 2 == 0 else "● "
+
+class SwitchingGame:
+    """The Shannon switching game on an arbitrary graph, between two terminal nodes `s` and `t`.
+
+    CUT (who moves first) removes edges and wins by disconnecting `s` from `t`, while SHORT fixes
+    edges and wins by joining `s` to `t` with fixed edges. Moves are edge indices, and the graph is
+    held as arrays (the nodes at either end of each edge, and the state of each edge: `OPEN`, `CUT`
+    or `SHORT`), so large graphs don't need a Python object per edge.
+
+    Use `SwitchingGame.from_file` to load a graph from an edge list file. Shannon's heuristic
+    (with `NumpySolver` or `SparseSolver`) and `Random` can play on it, and ties between equal
+    voltage differences go to the edge that comes first in the file."""
+
+    def __init__(self, u, v, s, t, n=None, labels=None, moves=None):
+        self.u = np.asarray(u, dtype=np.int32)
+        self.v = np.asarray(v, dtype=np.int32)
+        if len(self.u) != len(self.v):
+            raise ValueError("Edges need a node at each end")
+        self.n = int(max(self.u.max(initial=-1), self.v.max(initial=-1), s, t)) + 1 if n is None else n
+        self.s = s
+        self.t = t
+        # node labels (as in the edge list file), indexed by node
+        self.labels = labels
+        self.states = np.zeros(len(self.u), dtype=np.int8)
+        self.moves = []
+        # nodes joined by SHORT moves, for detecting a win by SHORT
+        self.short_sets = _UnionFind(rollback=True)
+        self._cut_won = None
+        for move in moves or []:
+            self.move(move)
+
+    @classmethod
+    def from_file(cls, path, s=None, t=None):
+        """Load a game from an edge list file.
+
+        Each line of the file has the labels of the two nodes joined by an edge, separated by whitespace,
+        apart from a line `terminals <s> <t>` that gives the labels of the terminal nodes (which may
+        instead be given as `s` and `t`). Anything after a `#` is a comment. The file is read a line
+        at a time, and edges are stored in compact arrays as they are read."""
+        index = {}
+        labels = []
+        def node(label):
+            i = index.get(label)
+            if i is None:
+                i = index[label] = len(labels)
+                labels.append(label)
+            return i
+        u, v = array("i"), array("i")
+        with open(path) as f:
+            for line_number, line in enumerate(f, 1):
+                tokens = line.split("#", 1)[0].split()
+                if not tokens:
+                    continue
+                if tokens[0] == "terminals" and len(tokens) == 3:
+                    s = tokens[1] if s is None else s
+                    t = tokens[2] if t is None else t
+                elif len(tokens) == 2:
+                    u.append(node(tokens[0]))
+                    v.append(node(tokens[1]))
+                else:
+                    raise ValueError(f"Invalid edge on line {line_number} of {path}: {line.strip()}")
+        if s is None or t is None:
+            raise ValueError(f"No terminals given for {path}")
+        if str(s) not in index or str(t) not in index:
+            raise ValueError(f"Terminals {s} and {t} must both be nodes in {path}")
+        return cls(
+            np.frombuffer(u, dtype=np.int32), np.frombuffer(v, dtype=np.int32),
+            index[str(s)], index[str(t)], n=len(labels), labels=labels,
+        )
+
+    def move(self, move):
+        """Apply the given move (an edge index) to the current board and return the resulting board."""
+        move = int(move)
+        if not 0 <= move < len(self.states):
+            raise ValueError(f"Invalid move: {move}")
+        if self.states[move] != OPEN:
+            raise ValueError(f"Move {move} has already been made")
+        if len(self.moves) % 2 == 0: # white moves are CUT
+            self.states[move] = CUT
+            self._cut_won = None
+        else: # black moves are SHORT
+            self.states[move] = SHORT
+            self.short_sets.union(int(self.u[move]), int(self.v[move]))
+        self.moves.append(move)
+        return self
+
+    def undo(self):
+        """Take back the last move and return the resulting board."""
+        move = self.moves.pop()
+        if self.states[move] == CUT:
+            self._cut_won = None
+        else:
+            self.short_sets.undo()
+        self.states[move] = OPEN
+        return self
+
+    def copy(self):
+        """Return a copy of this board (the edges are shared, since they never change)."""
+        board = object.__new__(type(self))
+        board.__dict__.update(self.__dict__)
+        board.states = self.states.copy()
+        board.moves = list(self.moves)
+        board.short_sets = self.short_sets.copy()
+        return board
+
+    def state(self, move):
+        """Return the state of the given move: `OPEN`, `CUT` or `SHORT`."""
+        return int(self.states[int(move)])
+
+    def open_moves(self):
+        """Return an array of the moves that have not been played yet."""
+        return np.flatnonzero(self.states == OPEN)
+
+    def white_has_won(self):
+        """Check if white has won, by CUTting all paths from `s` to `t`."""
+        if self._cut_won is None:
+            from scipy import sparse
+            from scipy.sparse import csgraph
+
+            keep = self.states != CUT
+            graph = sparse.coo_matrix(
+                (np.ones(int(keep.sum()), dtype=np.int8), (self.u[keep], self.v[keep])), shape=(self.n, self.n)
+            )
+            reached = csgraph.breadth_first_order(graph, self.s, directed=False, return_predecessors=False)
+            self._cut_won = not np.any(reached == self.t)
+        return self._cut_won
+
+    def black_has_won(self):
+        """Check if black has won, by SHORTing a path from `s` to `t`."""
+        return self.short_sets.connected(self.s, self.t)
+
+    def __repr__(self):
+        label = (lambda i: self.labels[i]) if self.labels is not None else str
+        return (
+            f"SwitchingGame({self.n} nodes, {len(self.states)} edges, s={label(self.s)}, t={label(self.t)})\n"
+            f"{display_moves([str(move) for move in self.moves])}\n"
+        )
+
+# Symmetries of the board
+
+@lru_cache(maxsize=None)
+def symmetries(M=3, top_bottom=False):
+    """Return the symmetries of the board of size `M`, as permutations of the move indices (in `valid_moves` order).
+
+    The first is the identity and the second is the left-right reflection, which maps column A to
+    the last column. The game is also symmetric under top-bottom reflection (which swaps the two
+    special nodes), so if `top_bottom` is set then it is included too, along with its composition
+    with the left-right reflection. The voltages in the circuit with the extra resistors are only
+    symmetric under left-right reflection, though. Every symmetry is its own inverse."""
+    layout = _layout(M)
+    reflections = [(False, False), (True, False)]
+    if top_bottom:
+        reflections += [(False, True), (True, True)]
+    perms = []
+    for left_right, up_down in reflections:
+        perm = []
+        for move in layout.moves:
+            x, y = _to_numeric(move)
+            x = 2 * M - x if left_right else x
+            y = 2 * M - y if up_down else y
+            perm.append(layout.move_index[_to_alpha(x, y)])
+        perms.append(tuple(perm))
+    return tuple(perms)
+
+def _permute_bits(bits, perm):
+    """Move bit `i` of `bits` to bit `perm[i]`."""
+    result = 0
+    i = 0
+    while bits:
+        if bits & 1:
+            result |= 1 << perm[i]
+        bits >>= 1
+        i += 1
+    return result
+
+def canonical_form(board, top_bottom=False):
+    """Return the canonical form of the position on `board`, and a map to translate moves back to it.
+
+    The canonical form is the `(cuts, shorts)` bitboard pair (as in `CompactBirdCage`) that is
+    lexicographically smallest over all the symmetric equivalents of the position (see `symmetries`),
+    so symmetric positions have the same canonical form, whatever order their moves were played in.
+    The map takes each move in the canonical orientation to the same move in the orientation of `board`."""
+    layout = _layout(board.M)
+    cuts = shorts = 0
+    for i, move in enumerate(board.moves):
+        bit = 1 << layout.move_index[move.upper()]
+        if i % 2 == 0:
+            cuts |= bit
+        else:
+            shorts |= bit
+    form, perm = min(
+        ((_permute_bits(cuts, perm), _permute_bits(shorts, perm)), perm)
+        for perm in symmetries(board.M, top_bottom)
+    )
+    return form, {layout.moves[perm[i]]: move for i, move in enumerate(layout.moves)}
 
 class Random:
     def play(self, board):
+        if isinstance(board, SwitchingGame):
+            return int(random.choice(board.open_moves()))
         all_moves = valid_moves(board.M)
         candidate_moves = set(all_moves) - set(board.moves)
         return random.choice(list(candidate_moves))
@@ -266,36 +794,33 @@ class Random:
     def __repr__(self):
         return "Random"
 
-class Shannon:
+class LcapySolver:
+    """Solve the bird cage circuit symbolically using Lcapy.
 
-    def __init__(self, use_extra_resistors=True):
-        # pull-up resistors and a resistor to avoid shorting (when SHORT wins)
-        self.use_extra_resistors = use_extra_resistors
+    Voltages are exact SymPy `Rational`s, so this is the reference solver, but it is slow
+    since a netlist has to be built, parsed and solved for every position."""
 
-    def play(self, board):
-        birdcage = BirdCage(board.M, board.moves)
-        voltage_diffs = self._get_voltage_diffs(birdcage)
-        return next(iter(voltage_diffs))
+    tolerance = 0
 
-    def _get_voltage_diffs(self, birdcage):
-        """Return a dictionary voltage diffs, keyed by move, in order of decreasing voltage diff"""
-        all_moves = valid_moves(birdcage.M)
-        candidate_moves = set(all_moves) - set(birdcage.moves)
-        # sort moves from top-left to bottom-right (in case of ties)
-        candidate_moves = sorted(candidate_moves, key=lambda x: (-int(x[1]), x[0]))
-        
-        circuit = self._create_circuit(birdcage)
+    def voltage_diffs(self, birdcage, moves, use_extra_resistors=True, timer=None):
+        """Return the voltage difference across each of `moves`, in the same order.
+
+        If a `PhaseTimer` is given then it records the time spent building the netlist, parsing it,
+        solving the circuit (which Lcapy does when the first voltage is looked up), and looking up
+        the rest of the voltages."""
+        circuit = self._create_circuit(birdcage, use_extra_resistors, timer)
         #circuit.draw(f"birdcage_move{len(birdcage.moves)}.png", label_ids=False, label_values=False, draw_nodes="all")
-        voltage_diffs = {}
-        for move in candidate_moves:
-            x, y = _to_numeric(move)
-            n1, n2 = birdcage._move_to_edge(x, y)
-            v1 = self._get_voltage(circuit, n1)
-            v2 = self._get_voltage(circuit, n2)
-            voltage_diffs[move] = abs(v1 - v2)
-        # sort by value and return largest
-        voltage_diffs = {k: v for k, v in sorted(voltage_diffs.items(), key=lambda item: -item[1])}
-        return voltage_diffs
+        edges = [birdcage._move_to_edge(*_to_numeric(move)) for move in moves]
+        if edges:
+            with _phase(timer, "solve"):
+                self._get_voltage(circuit, edges[0][0])
+        diffs = []
+        with _phase(timer, "lookup"):
+            for n1, n2 in edges:
+                v1 = self._get_voltage(circuit, n1)
+                v2 = self._get_voltage(circuit, n2)
+                diffs.append(abs(v1 - v2))
+        return diffs
 
     def _orientation(self, u, v):
         """Return a Lcapy orientation hint for a component placed between two nodes"""
@@ -313,15 +838,22 @@ class Shannon:
     def _to_circuit_node(self, node):
         return f"{node[0]}_{node[1]}"
 
-    def _create_circuit(self, birdcage):
+    def _create_circuit(self, birdcage, use_extra_resistors=True, timer=None):
         """Create a Lcapy circuit from the bird cage graph"""
+        with _phase(timer, "netlist"):
+            s = self._create_netlist(birdcage, use_extra_resistors)
+        with _phase(timer, "parse"):
+            from lcapy import Circuit
+            return Circuit(s)
+
+    def _create_netlist(self, birdcage, use_extra_resistors=True):
         M = birdcage.M
         G = birdcage.G
         f = self._to_circuit_node
 
         s = 'V1 Q 0 1; down\n'
         s += f'W Q {M}_{2 * M}; right={M / 2}\n'
-        if self.use_extra_resistors:
+        if use_extra_resistors:
             s += f'R 0 {M}_0 1; right={M / 2}\n' # avoid short
         else:
             s += f'W 0 {M}_0; right={M / 2}\n'
@@ -332,25 +864,867 @@ class Shannon:
                 s += f'W {f(n1)} {f(n2)}; {orient}\n' # wire
             else:
                 s += f'R__{f(n1)}__{f(n2)} {f(n1)} {f(n2)} {R}; {orient}\n' # resistor
-        if self.use_extra_resistors:
+        if use_extra_resistors:
             # need pull-up resistors to avoid errors if part of circuit is not connected
             for n in G.nodes():
-                s += f'R__{f(n)}__Q {f(n)} Q 30\n' # pull-up resistor
-        return Circuit(s)
+                s += f'R__{f(n)}__Q {f(n)} Q {PULL_UP_RESISTANCE}\n' # pull-up resistor
+        return s
 
     def _get_voltage(self, circuit, node):
         v = circuit[self._to_circuit_node(node)].V
         # convert to a SymPy Rational
         return v.dc.as_expr().expr
 
+    def __repr__(self):
+        return "LcapySolver"
+
+class NumpySolver:
+    """Solve the bird cage circuit numerically using nodal analysis.
+
+    Nodes joined by SHORT edges are merged, then the node voltages are found with a single
+    linear solve of the weighted Laplacian. Voltages are floats, so voltage differences that
+    are within `tolerance` of each other are treated as ties."""
+
+    tolerance = 1e-9
+
+    def voltage_diffs(self, birdcage, moves, use_extra_resistors=True, timer=None):
+        """Return the voltage difference across each of `moves`, in the same order.
+
+        If a `PhaseTimer` is given then it records the time spent building the lists of resistors
+        and wires from the graph, solving for the voltages, and looking up the voltage diffs."""
+        with _phase(timer, "netlist"):
+            nodes = list(birdcage.G.nodes())
+            index = {node: i for i, node in enumerate(nodes)}
+            resistors = [[], []]
+            wires = [[], []]
+            for n1, n2, d in birdcage.G.edges(data=True):
+                edges = resistors if d["weight"] == 1 else wires
+                edges[0].append(index[n1])
+                edges[1].append(index[n2])
+            top = index[birdcage._map_node(0, 2 * birdcage.M)]
+            bottom = index[birdcage._map_node(0, 0)]
+        with _phase(timer, "solve"):
+            voltages = _solve_nodal(len(nodes), top, bottom, resistors, wires, use_extra_resistors)
+        diffs = []
+        with _phase(timer, "lookup"):
+            for move in moves:
+                x, y = _to_numeric(move)
+                n1, n2 = birdcage._move_to_edge(x, y)
+                diffs.append(abs(voltages[index[n1]] - voltages[index[n2]]))
+        return diffs
+
+    def solve_network(self, n, top, bottom, resistors, wires, use_extra_resistors=True):
+        """Return the voltage at each of `n` nodes of an arbitrary network (see `_solve_nodal`)."""
+        return _solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors)
+
+    def __repr__(self):
+        return "NumpySolver"
+
+class SparseSolver:
+    """Solve the bird cage circuit numerically using nodal analysis with sparse matrices, for large boards.
+
+    This finds the same voltages as `NumpySolver`, but the weighted Laplacian is assembled directly
+    from the board's moves (without a graph) as a SciPy sparse matrix, so memory grows linearly in the
+    number of edges, and it is solved with a sparse direct factorization (SuperLU), or if `iterative`
+    is set, with the conjugate gradient method and a Jacobi preconditioner.
+
+    Per-move latency targets (for `Shannon.play`, mid-game, on a single core) are 0.25s for M=100
+    (about 20,000 edges) and 2s for M=300 (about 180,000 edges)."""
+
+    tolerance = 1e-9
+    # the solver only needs the board's moves, not its graph
+    needs_graph = False
+
+    def __init__(self, iterative=False):
+        self.iterative = iterative
+
+    def voltage_diffs(self, birdcage, moves, use_extra_resistors=True, timer=None):
+        """Return the voltage difference across each of `moves`, in the same order.
+
+        Only the board size and moves of `birdcage` are used, so it can be any kind of board."""
+        with _phase(timer, "netlist"):
+            layout = _layout(birdcage.M)
+            states = _position_states([birdcage.moves], layout)[0]
+            open_edges = states == OPEN
+            shorted = states == SHORT
+            resistors = layout.u[open_edges], layout.v[open_edges]
+            wires = layout.u[shorted], layout.v[shorted]
+        with _phase(timer, "solve"):
+            voltages = self.solve_network(len(layout.nodes), layout.top, layout.bottom, resistors, wires, use_extra_resistors)
+        with _phase(timer, "lookup"):
+            index = np.fromiter((layout.move_index[move.upper()] for move in moves), dtype=int, count=len(moves))
+            return np.abs(voltages[layout.u[index]] - voltages[layout.v[index]])
+
+    def solve_network(self, n, top, bottom, resistors, wires, use_extra_resistors=True):
+        """Return the voltage at each of `n` nodes of an arbitrary network (see `_solve_nodal`)."""
+        return _sparse_solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors, self.iterative)
+
+    def __repr__(self):
+        return "SparseSolver"
+
+class ExactSolver:
+    """Solve the bird cage circuit exactly using nodal analysis with integer arithmetic.
+
+    This finds the same voltages as `LcapySolver`, as exact fractions, so ties are exact, but it
+    is orders of magnitude faster. The nodal equations (scaled so that every conductance is an integer)
+    are solved with Bareiss's fraction-free elimination over Python integers, which keeps every
+    intermediate value an integer, without SymPy."""
+
+    tolerance = 0
+    # the solver only needs the board's moves, not its graph
+    needs_graph = False
+
+    def voltage_diffs(self, birdcage, moves, use_extra_resistors=True, timer=None):
+        """Return the voltage difference across each of `moves`, as a `Fraction`, in the same order.
+
+        Only the board size and moves of `birdcage` are used, so it can be any kind of board."""
+        with _phase(timer, "netlist"):
+            layout = _layout(birdcage.M)
+            states = _position_states([birdcage.moves], layout)[0]
+            open_edges = states == OPEN
+            shorted = states == SHORT
+            resistors = layout.u[open_edges], layout.v[open_edges]
+            wires = layout.u[shorted], layout.v[shorted]
+        with _phase(timer, "solve"):
+            # subtracting integers over a common denominator is much faster than subtracting `Fraction`s
+            voltages, det = _exact_nodal_numerators(
+                len(layout.nodes), layout.top, layout.bottom, resistors, wires, use_extra_resistors
+            )
+        with _phase(timer, "lookup"):
+            diffs = []
+            for move in moves:
+                i = layout.move_index[move.upper()]
+                diffs.append(Fraction(abs(voltages[layout.u[i]] - voltages[layout.v[i]]), det))
+            return diffs
+
+    def solve_network(self, n, top, bottom, resistors, wires, use_extra_resistors=True):
+        """Return the voltage at each of `n` nodes of an arbitrary network (see `_solve_nodal`), as an
+        object array of `Fraction`s (so it can be indexed like the other solvers' arrays, but stays exact)."""
+        return np.array(_exact_solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors), dtype=object)
+
+    def __repr__(self):
+        return "ExactSolver"
+
+def _merge_nodes(n, wires):
+    """Return an array mapping each of `n` nodes to a group, where nodes joined by `wires` share a group,
+    and the number of groups."""
+    parent = list(range(n))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for i, j in zip(*wires):
+        parent[find(i)] = find(j)
+    roots = np.array([find(i) for i in range(n)])
+    _, groups = np.unique(roots, return_inverse=True)
+    return groups, groups.max() + 1
+
+def _solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors=True):
+    """Return the voltage at each of `n` nodes, when `top` is held at 1V and `bottom` is connected to 0V.
+
+    `resistors` and `wires` are pairs of node index sequences for the unit resistors and the
+    zero-resistance wires. If `use_extra_resistors` is set, `bottom` is connected to 0V via a unit
+    resistor, and every node has a pull-up resistor to 1V, otherwise `ValueError` is raised if
+    the circuit has a short or a part that is not connected."""
+    groups, A, b, free, V = _nodal_system(n, top, bottom, resistors, wires, use_extra_resistors)
+    V[free] = np.linalg.solve(A, b)
+    return V[groups]
+
+def _exact_solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors=True):
+    """Return the voltage at each of `n` nodes as a list of `Fraction`s, for the circuit described in `_solve_nodal`."""
+    numerators, det = _exact_nodal_numerators(n, top, bottom, resistors, wires, use_extra_resistors)
+    return [Fraction(y, det) for y in numerators]
+
+def _exact_nodal_numerators(n, top, bottom, resistors, wires, use_extra_resistors=True):
+    """Return the voltages found by `_exact_solve_nodal` as integer numerators over a common positive
+    denominator, and the denominator."""
+    groups, A, b, free, V = _nodal_system(n, top, bottom, resistors, wires, use_extra_resistors)
+    # every conductance is a multiple of the pull-up conductance, so scaling by the pull-up
+    # resistance makes the equations integers (which they are exactly, as floats, before rounding)
+    A = np.rint(A * PULL_UP_RESISTANCE).astype(np.int64).tolist()
+    b = np.rint(b * PULL_UP_RESISTANCE).astype(np.int64).tolist()
+    numerators, det = _bareiss_solve(A, b)
+    if det < 0:
+        numerators, det = [-y for y in numerators], -det
+    voltages = [int(v) * det for v in V]
+    for i, y in zip(np.flatnonzero(free), numerators):
+        voltages[i] = y
+    return [voltages[g] for g in groups], det
+
+def _bareiss_solve(A, b):
+    """Solve `A x = b` for a non-singular integer matrix `A` (a list of rows) and integer vector `b`.
+
+    Returns integers `y` and `d` where `x = y / d`. This uses fraction-free Gauss-Jordan elimination
+    (Bareiss's algorithm), where each division is exact, so every entry stays an integer (a minor of
+    the augmented matrix) that is no bigger than the determinant."""
+    n = len(A)
+    rows = [list(row) + [bi] for row, bi in zip(A, b)]
+    prev = 1
+    for k in range(n):
+        if rows[k][k] == 0:
+            swap = next((i for i in range(k + 1, n) if rows[i][k] != 0), None)
+            if swap is None:
+                raise ValueError("The circuit's nodal equations are singular")
+            rows[k], rows[swap] = rows[swap], rows[k]
+        pivot_row = rows[k]
+        p = pivot_row[k]
+        for i in range(n):
+            if i == k:
+                continue
+            row = rows[i]
+            a = row[k]
+            for j in range(k, n + 1):
+                row[j] = (p * row[j] - a * pivot_row[j]) // prev
+        prev = p
+    # the last column is now the solution scaled by the last pivot (the determinant, up to sign)
+    return [row[n] for row in rows], prev
+
+def _nodal_system(n, top, bottom, resistors, wires, use_extra_resistors=True):
+    """Return the nodal equations for the circuit described in `_solve_nodal`.
+
+    Returns the group of each node (after merging nodes joined by wires), the matrix and right hand
+    side for the groups whose voltage is not fixed, a mask of those free groups, and an array
+    of group voltages with the fixed voltages filled in."""
+    groups, k = _merge_nodes(n, wires)
+    u = groups[np.asarray(resistors[0], dtype=int)]
+    v = groups[np.asarray(resistors[1], dtype=int)]
+    keep = u != v # resistors between merged nodes carry no current
+    u, v = u[keep], v[keep]
+    top, bottom = groups[top], groups[bottom]
+
+    L = np.zeros((k, k))
+    np.add.at(L, (u, v), -1.0)
+    np.add.at(L, (v, u), -1.0)
+    np.add.at(L, (u, u), 1.0)
+    np.add.at(L, (v, v), 1.0)
+    b = np.zeros(k)
+    fixed = np.zeros(k, dtype=bool)
+    fixed[top] = True
+    if use_extra_resistors:
+        pull_ups = np.bincount(groups, minlength=k) / PULL_UP_RESISTANCE
+        L[np.diag_indices(k)] += pull_ups
+        b += pull_ups
+        L[bottom, bottom] += 1.0 # series resistor to 0V
+    else:
+        if bottom == top:
+            raise ValueError("The circuit has a short from top to bottom")
+        fixed[bottom] = True
+        # every node in the circuit needs a path to 1V or 0V
+        present = np.zeros(k, dtype=bool)
+        present[groups[np.concatenate([resistors[0], wires[0], resistors[1], wires[1]]).astype(int)]] = True
+        reached, _ = _merge_nodes(k, (np.concatenate([u, [top]]), np.concatenate([v, [bottom]])))
+        connected = np.isin(reached, reached[top])
+        if np.any(present & ~connected):
+            raise ValueError("Part of the circuit is not connected")
+        # nodes with no edges are not part of the circuit, so their voltage is irrelevant
+        fixed |= ~present
+
+    V = np.zeros(k)
+    V[top] = 1.0
+    free = ~fixed
+    b -= L[:, fixed] @ V[fixed]
+    return groups, L[np.ix_(free, free)], b[free], free, V
+
+def _sparse_solve_nodal(n, top, bottom, resistors, wires, use_extra_resistors=True, iterative=False):
+    """Return the voltage at each of `n` nodes, as for `_solve_nodal`, but using sparse matrices."""
+    from scipy import sparse
+    from scipy.sparse import csgraph, linalg
+
+    resistors = [np.asarray(nodes, dtype=int) for nodes in resistors]
+    wires = [np.asarray(nodes, dtype=int) for nodes in wires]
+    # merge nodes joined by wires
+    W = sparse.coo_matrix((np.ones(len(wires[0])), (wires[0], wires[1])), shape=(n, n))
+    k, groups = csgraph.connected_components(W, directed=False)
+    u, v = groups[resistors[0]], groups[resistors[1]]
+    keep = u != v # resistors between merged nodes carry no current
+    u, v = u[keep], v[keep]
+    top, bottom = groups[top], groups[bottom]
+
+    ones = np.ones(len(u))
+    L = sparse.coo_matrix(
+        (np.concatenate([-ones, -ones, ones, ones]), (np.concatenate([u, v, u, v]), np.concatenate([v, u, u, v]))),
+        shape=(k, k),
+    ).tocsr()
+    b = np.zeros(k)
+    fixed = np.zeros(k, dtype=bool)
+    fixed[top] = True
+    if use_extra_resistors:
+        pull_ups = np.bincount(groups, minlength=k) / PULL_UP_RESISTANCE
+        extra = pull_ups.copy()
+        extra[bottom] += 1.0 # series resistor to 0V
+        L = L + sparse.diags(extra)
+        b += pull_ups
+    else:
+        if bottom == top:
+            raise ValueError("The circuit has a short from top to bottom")
+        fixed[bottom] = True
+        # every node in the circuit needs a path to 1V or 0V
+        present = np.zeros(k, dtype=bool)
+        present[groups[np.concatenate([resistors[0], wires[0], resistors[1], wires[1]])]] = True
+        R = sparse.coo_matrix((np.ones(len(u) + 1), (np.append(u, top), np.append(v, bottom))), shape=(k, k))
+        _, reached = csgraph.connected_components(R, directed=False)
+        connected = reached == reached[top]
+        if np.any(present & ~connected):
+            raise ValueError("Part of the circuit is not connected")
+        # nodes with no edges are not part of the circuit, so their voltage is irrelevant
+        fixed |= ~present
+
+    V = np.zeros(k)
+    V[top] = 1.0
+    free = np.flatnonzero(~fixed)
+    L = L.tocsc()
+    b = (b - L[:, fixed] @ V[fixed])[free]
+    A = L[free][:, free]
+    if len(free) > 0:
+        if iterative:
+            preconditioner = sparse.diags(1 / A.diagonal())
+            x, info = linalg.cg(A, b, rtol=1e-13, atol=0, M=preconditioner, maxiter=10 * len(free))
+            if info != 0:
+                raise ValueError("The conjugate gradient method did not converge")
+            V[free] = x
+        else:
+            V[free] = linalg.spsolve(A.tocsc(), b)
+    return V[groups]
+
+def batch_voltage_diffs(positions, M=3, use_extra_resistors=True, chunk_size=4096, pull_up_resistance=PULL_UP_RESISTANCE):
+    """Return a 2-D array of the voltage differences across every move, for many positions at once.
+
+    `positions` is a sequence of positions on a board of size `M`, each a list of moves (or a board
+    with a `moves` attribute), or an array of edge states (`OPEN`, `CUT` or `SHORT`) with a column
+    per move. Row `i` of the result is for position `i`, and column `j` is for move `j` in
+    `valid_moves(M)` order. Moves that have already been played are NaN, as are positions that
+    cannot be solved (when `use_extra_resistors` is not set).
+
+    All positions are solved together, `chunk_size` at a time, as a stack of linear systems. The
+    pull-up resistors (used with `use_extra_resistors`) are `pull_up_resistance` times the others."""
+    layout = _layout(M)
+    states = _position_states(positions, layout)
+    diffs = np.empty(states.shape)
+    for start in range(0, len(states), chunk_size):
+        chunk = states[start:start + chunk_size]
+        V = _batch_solve_nodal(
+            chunk, len(layout.nodes), layout.top, layout.bottom, layout.u, layout.v, use_extra_resistors, pull_up_resistance
+        )
+        d = np.abs(V[:, layout.u] - V[:, layout.v])
+        d[chunk != OPEN] = np.nan
+        diffs[start:start + chunk_size] = d
+    return diffs
+
+def _position_states(positions, layout):
+    """Return an array of edge states with a row for each position, and a column for each move in `layout`."""
+    if isinstance(positions, np.ndarray):
+        if positions.ndim != 2 or positions.shape[1] != len(layout.moves):
+            raise ValueError(f"Expected an array of shape (n, {len(layout.moves)}), got {positions.shape}")
+        return positions
+    states = np.full((len(positions), len(layout.moves)), OPEN, dtype=np.int8)
+    for i, moves in enumerate(positions):
+        for j, move in enumerate(getattr(moves, "moves", moves)):
+            move = move.upper()
+            if move not in layout.move_index:
+                raise ValueError(f"Invalid move: {move}")
+            states[i, layout.move_index[move]] = CUT if j % 2 == 0 else SHORT
+    return states
+
+def _batch_merge_nodes(n, mask, u, v):
+    """Return an array with a row for each row of `mask`, mapping each of `n` nodes to a representative
+    node, where nodes joined by the edges (`u`, `v`) selected by `mask` share a representative."""
+    rep = np.tile(np.arange(n), (len(mask), 1))
+    rows, edges = np.nonzero(mask)
+    a, b = u[edges], v[edges]
+    # propagate the smallest node index along edges until nothing changes
+    while True:
+        m = np.minimum(rep[rows, a], rep[rows, b])
+        new = rep.copy()
+        np.minimum.at(new, (rows, a), m)
+        np.minimum.at(new, (rows, b), m)
+        new = np.take_along_axis(new, new, axis=1)
+        if np.array_equal(new, rep):
+            return rep
+        rep = new
+
+def _batch_solve_nodal(states, n, top, bottom, u, v, use_extra_resistors=True, pull_up_resistance=PULL_UP_RESISTANCE):
+    """Return an array of node voltages with a row for each row of edge `states`.
+
+    This is the batched equivalent of `_solve_nodal`, with edges (`u`, `v`) and a state per edge.
+    Each system keeps one unknown per node, so they can be stacked: nodes merged by wires are
+    represented by a single node, and the others (and nodes with fixed voltages) get trivial
+    equations. Rows for circuits that cannot be solved are NaN."""
+    P = len(states)
+    rows = np.arange(P)[:, None]
+    short = states == SHORT
+    rep = _batch_merge_nodes(n, short, u, v)
+    is_rep = rep == np.arange(n)
+
+    # resistors, ignoring any between merged nodes
+    pi, ei = np.nonzero(states == OPEN)
+    ra, rb = rep[pi, u[ei]], rep[pi, v[ei]]
+    keep = ra != rb
+    pi, ra, rb = pi[keep], ra[keep], rb[keep]
+    L = np.zeros((P, n, n))
+    np.add.at(L, (pi, ra, rb), -1.0)
+    np.add.at(L, (pi, rb, ra), -1.0)
+    np.add.at(L, (pi, ra, ra), 1.0)
+    np.add.at(L, (pi, rb, rb), 1.0)
+    b = np.zeros((P, n))
+
+    T = rep[:, top]
+    B = rep[:, bottom]
+    fixed = ~is_rep
+    fixed[np.arange(P), T] = True
+    invalid = np.zeros(P, dtype=bool)
+    if use_extra_resistors:
+        pull_ups = np.broadcast_to(np.full(n, 1 / pull_up_resistance), (P, n))
+        np.add.at(L, (rows, rep, rep), pull_ups)
+        np.add.at(b, (rows, rep), pull_ups)
+        L[np.arange(P), B, B] += 1.0 # series resistor to 0V
+    else:
+        invalid |= T == B
+        fixed[np.arange(P), B] = True
+        # every node in the circuit needs a path to 1V or 0V
+        in_circuit = states != CUT
+        present = np.zeros((P, n), dtype=bool)
+        np.logical_or.at(present, (rows, rep[:, u]), in_circuit)
+        np.logical_or.at(present, (rows, rep[:, v]), in_circuit)
+        joined = np.concatenate([in_circuit, np.ones((P, 1), dtype=bool)], axis=1)
+        reached = _batch_merge_nodes(n, joined, np.append(u, top), np.append(v, bottom))
+        connected = reached == reached[:, [top]]
+        invalid |= np.any(present & is_rep & ~connected, axis=1)
+        # nodes with no edges are not part of the circuit, so their voltage is irrelevant
+        fixed |= ~present
+
+    # move the fixed voltages to the right hand side, and replace their equations with V = fixed value
+    V = np.zeros((P, n))
+    V[np.arange(P), T] = 1.0
+    b -= np.einsum("pij,pj->pi", L, V)
+    L[fixed[:, :, None] | fixed[:, None, :]] = 0.0
+    L[fixed[:, :, None] & np.eye(n, dtype=bool)] = 1.0
+    b[fixed] = V[fixed]
+    L[invalid] = np.eye(n)
+    V = np.linalg.solve(L, b[:, :, None])[:, :, 0]
+    V = np.take_along_axis(V, rep, axis=1)
+    V[invalid] = np.nan
+    return V
+
+def _order_voltage_diffs(voltage_diffs, tolerance=0):
+    """Return a dictionary of voltage diffs in order of decreasing voltage diff.
+
+    Voltage diffs within `tolerance` of each other are ties, and keep their order in `voltage_diffs`."""
+    items = sorted(voltage_diffs.items(), key=lambda item: -item[1])
+    if tolerance > 0:
+        # give each run of near-equal values the rank of its first (largest) value
+        ranked = []
+        rank = None
+        for move, v in items:
+            if rank is None or rank - v > tolerance:
+                rank = v
+            ranked.append((rank, move, v))
+        order = {move: i for i, move in enumerate(voltage_diffs)}
+        items = [(move, v) for _, move, v in sorted(ranked, key=lambda r: (-r[0], order[r[1]]))]
+    return dict(items)
+
+def _top_voltage_diffs(moves, diffs, k=None, tolerance=0):
+    """Return a dictionary of the `k` largest voltage `diffs` across `moves`, in the same order as
+    `_order_voltage_diffs` would put them, or all of them if `k` is None.
+
+    Floating point diffs (when `tolerance` is non-zero) are partitioned to find the top `k`, so only
+    those that are within `tolerance` of the `k`th largest are sorted."""
+    if k is None or k >= len(moves):
+        ordered = _order_voltage_diffs(dict(zip(moves, diffs)), tolerance)
+        return ordered if k is None else dict(list(ordered.items())[:k])
+    if tolerance == 0:
+        # exact diffs (such as `Fraction`s) are slow to compare, so only compare enough to find the top
+        # `k`, which (like a stable sort) keeps ties in their order in `moves`
+        top = heapq.nlargest(k, range(len(moves)), key=diffs.__getitem__)
+        return {moves[i]: diffs[i] for i in top}
+    diffs = np.asarray(diffs, dtype=float)
+    kth = np.partition(diffs, len(diffs) - k)[len(diffs) - k]
+    top = np.flatnonzero(diffs >= kth - tolerance)
+    ordered = _order_voltage_diffs({moves[i]: diffs[i] for i in top}, tolerance)
+    return dict(list(ordered.items())[:k])
+
+# edge states, indexed by move
+OPEN, CUT, SHORT = 0, 1, 2
+
+class CircuitSession:
+    """The bird cage circuit for a game in progress, kept up to date as moves are played.
+
+    Rather than solving the circuit from scratch for every position, this holds the inverse of the
+    nodal matrix and the node voltages, and applies each move as a rank-one update: a CUT removes
+    a unit conductance, and a SHORT adds an infinite one (which merges two nodes). Since rounding
+    errors accumulate, the inverse is rebuilt from scratch every `refactor_interval` updates, or
+    when an update is numerically unreliable."""
+
+    def __init__(self, M=3, moves=None, use_extra_resistors=True, refactor_interval=16):
+        self.M = M
+        self.moves = []
+        self.use_extra_resistors = use_extra_resistors
+        self.refactor_interval = refactor_interval
+        self.layout = _layout(M)
+        self.state = np.full(len(self.layout.moves), OPEN, dtype=np.int8)
+        self._stale = True # no factorization yet
+        for move in moves or []:
+            self.move(move)
+
+    def move(self, move):
+        """Apply the given move to the circuit and return this session."""
+        move = move.upper()
+        if not is_valid_move(move, self.M):
+            raise ValueError(f"Invalid move: {move}")
+        if move in self.moves:
+            raise ValueError(f"Move {move} has already been made")
+        i = self.layout.move_index[move]
+        self.state[i] = CUT if len(self.moves) % 2 == 0 else SHORT
+        self.moves.append(move)
+        if not self._stale:
+            self._update(i, self.state[i])
+        return self
+
+    def copy(self):
+        """Return a copy of this session, which can be updated independently."""
+        session = object.__new__(type(self))
+        session.__dict__.update(self.__dict__)
+        session.moves = list(self.moves)
+        session.state = self.state.copy()
+        if not self._stale:
+            session.K = self.K.copy()
+            session.V = self.V.copy()
+        return session
+
+    def voltage_diffs(self, moves):
+        """Return an array of the voltage difference across each of `moves`, in the same order."""
+        if self._stale:
+            self._refactor()
+        i = np.array([self.layout.move_index[move] for move in moves], dtype=int)
+        return np.abs(self.V[self.layout.u[i]] - self.V[self.layout.v[i]])
+
+    def _refactor(self):
+        """Solve the circuit from scratch, and store the inverse of its nodal matrix."""
+        layout = self.layout
+        n = len(layout.nodes)
+        resistors = layout.u[self.state == OPEN], layout.v[self.state == OPEN]
+        wires = layout.u[self.state == SHORT], layout.v[self.state == SHORT]
+        groups, A, b, free, V = _nodal_system(n, layout.top, layout.bottom, resistors, wires, self.use_extra_resistors)
+        K = np.linalg.inv(A)
+        V[free] = K @ b
+        # expand the inverse from free groups to nodes, where nodes with fixed voltages have zero rows
+        # (this is the limit of the inverse as the conductance of each wire goes to infinity)
+        row = np.full(len(free), -1)
+        row[free] = np.arange(np.count_nonzero(free))
+        row = row[groups]
+        mask = row >= 0
+        self.K = np.zeros((n, n))
+        self.K[np.ix_(mask, mask)] = K[np.ix_(row[mask], row[mask])]
+        self.V = V[groups]
+        self._updates = 0
+        self._stale = False
+
+    def _update(self, i, kind, eps=1e-9):
+        """Update the inverse and node voltages for move index `i` being a CUT or SHORT."""
+        a, b = self.layout.u[i], self.layout.v[i]
+        Kw = self.K[:, a] - self.K[:, b]
+        s = Kw[a] - Kw[b] # effective resistance between a and b (excluding fixed nodes)
+        d = self.V[a] - self.V[b]
+        if kind == CUT:
+            denom = 1 - s
+            if denom < eps: # the cut disconnects part of the circuit
+                self._stale = True
+                return
+            self.V += Kw * (d / denom)
+            self.K += np.outer(Kw, Kw / denom)
+        else:
+            if s < eps:
+                # a and b are already joined by wires, or both fixed
+                if abs(d) > eps:
+                    self._stale = True
+                return
+            self.V -= Kw * (d / s)
+            self.K -= np.outer(Kw, Kw / s)
+        self._updates += 1
+        if self._updates >= self.refactor_interval:
+            self._stale = True
+
+# hit and miss statistics for a `VoltageDiffCache`
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+class VoltageDiffCache:
+    """A bounded cache of Shannon's voltage diffs for each position, evicting the least recently used.
+
+    Positions are keyed by their set of CUT moves and set of SHORT moves, so the order the moves
+    were played in doesn't matter. Results for different solvers, and with or without the extra
+    resistors, are kept separate. If `path` is given then results are also stored in an SQLite
+    database there, so a warm cache can be shared between processes, and outlives them."""
+
+    def __init__(self, maxsize=4096, path=None):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS voltage_diffs (key TEXT PRIMARY KEY, value TEXT)")
+
+    @staticmethod
+    def key(solver, M, moves, use_extra_resistors=True):
+        """Return the cache key for a position, given the name of the solver used for it."""
+        cuts = ",".join(sorted(move.upper() for move in moves[0::2]))
+        shorts = ",".join(sorted(move.upper() for move in moves[1::2]))
+        return f"{solver}:{M}:{int(use_extra_resistors)}:{cuts}:{shorts}"
+
+    def get(self, key):
+        """Return the voltage diffs for `key`, or None if they are not in the cache."""
+        voltage_diffs = self.entries.get(key)
+        if voltage_diffs is not None:
+            self.entries.move_to_end(key)
+        elif self.db is not None:
+            row = self.db.execute("SELECT value FROM voltage_diffs WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                voltage_diffs = _decode_voltage_diffs(row[0])
+                self._remember(key, voltage_diffs)
+        if voltage_diffs is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return voltage_diffs
+
+    def put(self, key, voltage_diffs):
+        """Store the voltage diffs for `key`."""
+        self._remember(key, voltage_diffs)
+        if self.db is not None:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO voltage_diffs VALUES (?, ?)", (key, _encode_voltage_diffs(voltage_diffs))
+                )
+
+    def _remember(self, key, voltage_diffs):
+        self.entries[key] = voltage_diffs
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def info(self):
+        """Return the hits, misses, maximum size and current size (in memory) of the cache."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def clear(self):
+        """Empty the in-memory cache and reset the statistics (the database is left untouched)."""
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __len__(self):
+        return len(self.entries)
+
+def _encode_voltage_diffs(voltage_diffs):
+    """Convert voltage diffs (exact or floating point) to a JSON string, preserving their order and type."""
+    return json.dumps([
+        [move, str(v), "fraction" if isinstance(v, Fraction) else not isinstance(v, float)]
+        for move, v in voltage_diffs.items()
+    ])
+
+def _decode_voltage_diffs(s):
+    def decode(v, exact):
+        if exact == "fraction":
+            return Fraction(v)
+        if exact:
+            from sympy import Rational
+            return Rational(v)
+        return float(v)
+    return {move: decode(v, exact) for move, v, exact in json.loads(s)}
+
+# the phases of a move timed by a `PhaseTimer`: the board size (None for a `SwitchingGame`), the number of candidate moves,
+# and the total wall time (in seconds) and number of calls of each phase
+MoveTimings = namedtuple("MoveTimings", ["M", "candidates", "phases"])
+
+class PhaseTimer:
+    """Records the wall time and number of calls of each phase of Shannon's moves.
+
+    Pass one to `Shannon` (or use `Shannon.timed`) to turn timing on. Each move is recorded as a
+    `MoveTimings` in `moves`, and passed to `callback` (if given) when it is finished."""
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.moves = []
+        self.current = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of the current move."""
+        if self.current is None:
+            self.current = defaultdict(lambda: [0.0, 0])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals = self.current[name]
+            totals[0] += time.perf_counter() - start
+            totals[1] += 1
+
+    def discard(self):
+        """Forget the phases timed since the last move, for work that isn't part of a move."""
+        self.current = None
+
+    def end_move(self, M, candidates):
+        """Finish recording the current move."""
+        phases = {name: tuple(totals) for name, totals in (self.current or {}).items()}
+        self.current = None
+        timings = MoveTimings(M, candidates, phases)
+        self.moves.append(timings)
+        if self.callback is not None:
+            self.callback(timings)
+
+    def totals(self):
+        """Return a dictionary of the total time and number of calls of each phase, over all moves."""
+        totals = defaultdict(lambda: [0.0, 0])
+        for timings in self.moves:
+            for name, (seconds, calls) in timings.phases.items():
+                totals[name][0] += seconds
+                totals[name][1] += calls
+        return {name: tuple(t) for name, t in totals.items()}
+
+    def summary(self):
+        """Return a table of the time spent in each phase (as a string)."""
+        totals = self.totals()
+        overall = sum(seconds for seconds, _ in totals.values())
+        n = max(len(self.moves), 1)
+        lines = [f"{len(self.moves)} moves, {overall * 1000:.1f} ms"]
+        lines.append(f"{'phase':<10} {'calls':>7} {'total ms':>10} {'ms/move':>9} {'%':>6}")
+        for name, (seconds, calls) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            share = seconds / overall if overall > 0 else 0
+            lines.append(f"{name:<10} {calls:>7} {seconds * 1000:>10.2f} {seconds * 1000 / n:>9.3f} {share:>6.1%}")
+        return "\n".join(lines)
+
+    def collapsed(self):
+        """Return the timings in the collapsed stack format read by flame graph tools
+        (such as flamegraph.pl and speedscope), with a frame for the board size and a weight
+        for each phase in microseconds."""
+        weights = defaultdict(float)
+        for timings in self.moves:
+            for name, (seconds, _) in timings.phases.items():
+                weights[f"Shannon;M={timings.M};{name}"] += seconds * 1e6
+        return "".join(f"{stack} {round(weight)}\n" for stack, weight in weights.items())
+
+def _phase(timer, name):
+    """Return a context manager that times a phase with `timer`, or does nothing if it is None."""
+    return _NO_PHASE if timer is None else timer.phase(name)
+
+_NO_PHASE = nullcontext()
+
+class Shannon:
+
+    def __init__(self, use_extra_resistors=True, solver=None, cache=None, timer=None):
+        # pull-up resistors and a resistor to avoid shorting (when SHORT wins)
+        self.use_extra_resistors = use_extra_resistors
+        # LcapySolver is exact, NumpySolver is much faster
+        self.solver = solver or LcapySolver()
+        # an optional VoltageDiffCache, which may be shared between players
+        self.cache = cache
+        # an optional PhaseTimer, to record where the time goes in each move
+        self.timer = timer
+
+    @contextmanager
+    def timed(self, timer=None):
+        """Time the phases of the moves made in a `with` block, using (and returning) a `PhaseTimer`."""
+        previous = self.timer
+        self.timer = timer or PhaseTimer()
+        try:
+            yield self.timer
+        finally:
+            self.timer = previous
+
+    def play(self, board):
+        if isinstance(board, SwitchingGame):
+            return self._play_switching_game(board)
+        birdcage = board
+        if getattr(self.solver, "needs_graph", True):
+            with _phase(self.timer, "board"):
+                birdcage = BirdCage(board.M, board.moves)
+        voltage_diffs = self._get_voltage_diffs(birdcage, k=1)
+        self._end_move(birdcage)
+        return next(iter(voltage_diffs))
+
+    def _end_move(self, board):
+        """Record the end of a move on `board` with the timer, if there is one."""
+        if self.timer is not None:
+            self.timer.end_move(board.M, len(_layout(board.M).moves) - len(board.moves))
+
+    def _play_switching_game(self, board):
+        """Return the open edge of a `SwitchingGame` with the largest voltage difference across it."""
+        if not hasattr(self.solver, "solve_network"):
+            raise TypeError(f"{self.solver} can't solve a SwitchingGame, use NumpySolver or SparseSolver")
+        timer = self.timer
+        with _phase(timer, "netlist"):
+            candidates = board.open_moves()
+            shorted = board.states == SHORT
+            resistors = board.u[candidates], board.v[candidates]
+            wires = board.u[shorted], board.v[shorted]
+        with _phase(timer, "solve"):
+            voltages = self.solver.solve_network(board.n, board.s, board.t, resistors, wires, self.use_extra_resistors)
+        with _phase(timer, "order"):
+            diffs = np.abs(voltages[resistors[0]] - voltages[resistors[1]])
+            # ties go to the edge that comes first
+            best = candidates[np.argmax(diffs >= diffs.max() - self.solver.tolerance)]
+        if timer is not None:
+            timer.end_move(None, len(candidates))
+        return int(best)
+
+    def top_moves(self, board, k=5):
+        """Return a dictionary of the `k` moves with the largest voltage diffs, in the order Shannon prefers them."""
+        if getattr(self.solver, "needs_graph", True):
+            board = BirdCage(board.M, board.moves)
+        voltage_diffs = self._get_voltage_diffs(board, k)
+        if self.timer is not None:
+            self.timer.discard() # not a move
+        return dict(list(voltage_diffs.items())[:k])
+
+    def _get_voltage_diffs(self, birdcage, k=None):
+        """Return a dictionary voltage diffs, keyed by move, in order of decreasing voltage diff
+
+        If `k` is given then only the largest `k` may be returned (which is faster for large boards)."""
+        timer = self.timer
+        if self.cache is None:
+            voltage_diffs = self._compute_voltage_diffs(birdcage, k)
+        else:
+            with _phase(timer, "cache"):
+                key = self.cache.key(type(self.solver).__name__, birdcage.M, birdcage.moves, self.use_extra_resistors)
+                voltage_diffs = self.cache.get(key)
+            if voltage_diffs is None:
+                voltage_diffs = self._compute_voltage_diffs(birdcage)
+                with _phase(timer, "cache"):
+                    self.cache.put(key, voltage_diffs)
+        return voltage_diffs
+
+    def _compute_voltage_diffs(self, birdcage, k=None):
+        timer = self.timer
+        with _phase(timer, "candidates"):
+            # moves from top-left to bottom-right (in case of ties)
+            played = set(birdcage.moves)
+            candidate_moves = [move for move in _top_left_moves(birdcage.M) if move not in played]
+
+        if timer is None:
+            diffs = self.solver.voltage_diffs(birdcage, candidate_moves, self.use_extra_resistors)
+        else:
+            diffs = self.solver.voltage_diffs(birdcage, candidate_moves, self.use_extra_resistors, timer=timer)
+        with _phase(timer, "order"):
+            # sort by value and return largest
+            return _top_voltage_diffs(candidate_moves, diffs, k, self.solver.tolerance)
+
     def voltage_diffs_str(self, birdcage):
         M = birdcage.M
 
         voltage_diffs = self._get_voltage_diffs(birdcage)
+        if self.timer is not None:
+            self.timer.discard() # not a move
 
         # scale to integers by multiplying all fractions by lcm of the denominators
-        denoms = [v.denominator for v in voltage_diffs.values()]
-        factor = ilcm(*denoms)
+        denoms = [int(v.denominator) for v in voltage_diffs.values()]
+        factor = math.lcm(*denoms)
         scaled_voltage_diffs = {k: v * factor for k, v in voltage_diffs.items()}
 
         max_width = max([len(str(v)) for v in scaled_voltage_diffs.values()])
@@ -381,11 +1755,593 @@ class Shannon:
     def __repr__(self):
         return "Shannon"
 
+class IncrementalShannon(Shannon):
+    """Shannon's heuristic, using a `CircuitSession` that is updated as each move is played,
+    rather than rebuilding the board and solving the circuit from scratch every turn.
+
+    The session is restarted whenever the board is not a continuation of the game so far."""
+
+    def __init__(self, use_extra_resistors=True, refactor_interval=16, cache=None, timer=None):
+        super().__init__(use_extra_resistors, solver=NumpySolver(), cache=cache, timer=timer)
+        self.refactor_interval = refactor_interval
+        self.session = None
+
+    def play(self, board):
+        voltage_diffs = self._get_voltage_diffs(board, k=1)
+        self._end_move(board)
+        return next(iter(voltage_diffs))
+
+    def _compute_voltage_diffs(self, birdcage, k=None):
+        timer = self.timer
+        with _phase(timer, "update"):
+            session = self._sync(birdcage)
+        with _phase(timer, "candidates"):
+            # moves from top-left to bottom-right (in case of ties)
+            played = set(birdcage.moves)
+            candidate_moves = [move for move in _top_left_moves(birdcage.M) if move not in played]
+
+        with _phase(timer, "lookup"):
+            diffs = session.voltage_diffs(candidate_moves)
+        with _phase(timer, "order"):
+            return _top_voltage_diffs(candidate_moves, diffs, k, self.solver.tolerance)
+
+    def _sync(self, board):
+        """Bring the session up to date with the moves on `board`."""
+        session = self.session
+        if session is None or session.M != board.M or board.moves[:len(session.moves)] != session.moves:
+            session = CircuitSession(board.M, use_extra_resistors=self.use_extra_resistors, refactor_interval=self.refactor_interval)
+            self.session = session
+        for move in board.moves[len(session.moves):]:
+            session.move(move)
+        return session
+
+def _winning_moves(board):
+    """Return lists of the indexes of the open moves on a `CompactBirdCage` that win straight away for CUT,
+    and that win straight away for SHORT."""
+    layout = board.layout
+    short_sets, cut_sets = board.short_sets, board.cut_sets
+    top, bottom = short_sets.find(layout.top), short_sets.find(layout.bottom)
+    left, right = cut_sets.find((0, 1)), cut_sets.find((2 * board.M, 1))
+    played = board.cuts | board.shorts
+    cut_wins, short_wins = [], []
+    for i in range(len(layout.moves)):
+        if played >> i & 1:
+            continue
+        u, v = layout.edges[i]
+        if {short_sets.find(u), short_sets.find(v)} == {top, bottom}:
+            short_wins.append(i)
+        a, b = layout.dual_edges[i]
+        if {cut_sets.find(a), cut_sets.find(b)} == {left, right}:
+            cut_wins.append(i)
+    return cut_wins, short_wins
+
+class LookaheadShannon(IncrementalShannon):
+    """Shannon's heuristic with lookahead: rather than playing the move with the largest voltage difference,
+    play the move that leaves the least current flowing to ground (for CUT) or the most (for SHORT) after
+    the opponent's best reply.
+
+    The current to ground is the voltage at the bottom of the cage, since it is connected to ground by a
+    unit resistor, so this needs the extra resistors. Every move and reply is scored from the inverse of
+    the nodal matrix held by a `CircuitSession`: a move is a rank-one update of the inverse, and the effect
+    of a reply after it only needs the entries of the inverse between the ends of the two edges, so every
+    pair of moves is scored with a few array operations on the matrix of those entries, with no more
+    solves. Moves that win straight away are always played, and replies that win straight away are
+    always blocked.
+
+    With `depth` greater than 2 (it should be even), the best `width` moves, and the opponent's best `width`
+    replies to each, are searched further, by updating a copy of the session with both of them. Ties go to
+    the move nearest the top-left, as for `Shannon`."""
+
+    def __init__(self, depth=2, width=4, refactor_interval=16, timer=None):
+        # there is no `cache`, since moves are chosen from the session's inverse, not from voltage diffs
+        super().__init__(use_extra_resistors=True, refactor_interval=refactor_interval, timer=timer)
+        self.depth = depth
+        self.width = width
+
+    def play(self, board):
+        with _phase(self.timer, "update"):
+            session = self._sync(board)
+        move, _ = self._search(CompactBirdCage(board.M, board.moves), session, self.depth)
+        self._end_move(board)
+        return move
+
+    def _search(self, board, session, depth):
+        """Return the best move on `board` and its value (the current to ground after the best reply,
+        or -inf or inf if CUT or SHORT can force a win within the search)."""
+        layout = board.layout
+        cut = len(board.moves) % 2 == 0
+        lose = np.inf if cut else -np.inf # the value of a move that loses for the side to move
+        with _phase(self.timer, "candidates"):
+            cut_wins, short_wins = _winning_moves(board)
+            wins, threats = (cut_wins, short_wins) if cut else (short_wins, cut_wins)
+            if wins:
+                return layout.moves[min(wins, key=lambda i: _top_left_order(layout.moves[i]))], -lose
+            # moves from top-left to bottom-right (in case of ties)
+            played = board.cuts | board.shorts
+            moves = np.array([layout.move_index[move] for move in _top_left_moves(board.M)
+                              if not played >> layout.move_index[move] & 1])
+        with _phase(self.timer, "solve"):
+            if session._stale:
+                session._refactor()
+            after, values = self._pair_values(session, moves, cut)
+        with _phase(self.timer, "order"):
+            # the opponent's winning replies, unless the move blocks them
+            values[:, np.isin(moves, threats)] = lose
+            np.fill_diagonal(values, np.nan)
+            if len(moves) == 1:
+                scores = after
+            else:
+                scores = np.nanmax(values, axis=1) if cut else np.nanmin(values, axis=1)
+        if depth > 2:
+            scores = self._deepen(board, session, depth, moves, values, scores, cut)
+        with _phase(self.timer, "order"):
+            best = np.nanmin(scores) if cut else np.nanmax(scores)
+            tolerance = self.solver.tolerance
+            good = scores <= best + tolerance if cut else scores >= best - tolerance
+            i = np.flatnonzero(good)[0]
+        return layout.moves[moves[i]], scores[i]
+
+    def _pair_values(self, session, moves, cut):
+        """Return the current to ground after each of `moves`, and a matrix of the current after each
+        of `moves` (rows) followed by each of the opponent's replies (columns)."""
+        layout = session.layout
+        K, V = session.K, session.V
+        a, b = layout.u[moves], layout.v[moves]
+        W = K[:, a] - K[:, b] # the change in voltages per unit of current between the ends of each edge
+        T = W[a] - W[b] # the effect of a current through each edge on the voltage across each edge
+        s = np.diag(T) # the effective resistance across each edge (excluding fixed nodes)
+        d = V[a] - V[b]
+        k = W[layout.bottom]
+        eps = 1e-9
+
+        def gain(cut, s):
+            # the rank-one update of the inverse for each edge is `gain * outer(W, W)` (see `CircuitSession._update`)
+            if cut:
+                return 1 / np.maximum(1 - s, eps)
+            return np.where(s > eps, -1 / np.maximum(s, eps), 0)
+
+        g = gain(cut, s)
+        after = V[layout.bottom] + g * d * k
+        # the effective resistance, voltage and bottom row entries of each reply's edge after each move
+        gt = g[:, None] * T
+        s2 = s[None, :] + gt * T
+        d2 = d[None, :] + gt * d[:, None]
+        k2 = k[None, :] + gt * k[:, None]
+        values = after[:, None] + gain(not cut, s2) * d2 * k2
+        return after, values
+
+    def _deepen(self, board, session, depth, moves, values, scores, cut):
+        """Search the best `width` moves, and the best `width` replies to each, to `depth` plies."""
+        layout = board.layout
+        finite = np.isfinite(scores)
+        order = np.argsort(scores if cut else -scores, kind="stable")
+        candidates = [i for i in order if finite[i]][:self.width]
+        deeper = np.full(len(moves), np.nan)
+        deeper[~finite] = scores[~finite]
+        for i in candidates:
+            replies = np.argsort(-values[i] if cut else values[i], kind="stable")
+            replies = [j for j in replies if j != i and np.isfinite(values[i, j])][:self.width]
+            results = []
+            for j in replies:
+                child = session.copy()
+                child.move(layout.moves[moves[i]]).move(layout.moves[moves[j]])
+                board.move(layout.moves[moves[i]]).move(layout.moves[moves[j]])
+                results.append(self._search(board, child, depth - 2)[1])
+                board.undo().undo()
+            deeper[i] = (max(results) if cut else min(results)) if results else scores[i]
+        return deeper
+
+    def __repr__(self):
+        return f"LookaheadShannon(depth={self.depth})"
+
+def prewarm(solver=None, background=True):
+    """Import the dependencies of `solver` (an `LcapySolver` by default), and solve a small circuit with it,
+    so that Shannon's first move isn't slowed down by them.
+
+    If `background` is set then this is done in a daemon thread, which is returned, so that it can run
+    while (for example) the board is being drawn."""
+    def warm():
+        Shannon(solver=solver or LcapySolver()).play(BirdCage(M=2))
+    if not background:
+        warm()
+        return None
+    thread = threading.Thread(target=warm, daemon=True)
+    thread.start()
+    return thread
+
+class _SpanningTrees:
+    """Lehman's strategy for the player trying to connect `s` and `t` in a Shannon switching game.
+
+    The connecting player claims edges, which joins their ends, and the other player deletes them.
+    If the graph has two edge-disjoint trees spanning the same set of nodes, including `s` and `t`,
+    then the connecting player can win even if it is the other player's turn. When the other player
+    deletes an edge from one tree it splits in two, and there is always an edge in the other tree that
+    joins the two parts back together: claiming that edge keeps two trees spanning the (now smaller) set.
+
+    Edges are indexed by move, `edges` gives the nodes at each end, and each pair in `joined` is two
+    nodes that start off joined. The trees are found with a matroid partition (augmenting path)
+    algorithm, and then repaired after each move, so they only have to be found once per game."""
+
+    def __init__(self, edges, s, t, joined=()):
+        self.edges = edges
+        self.s = s
+        self.t = t
+        self.sets = _UnionFind()
+        for a, b in joined:
+            self.sets.union(a, b)
+        self.open = set(range(len(edges)))
+        self.trees = None # a pair of sets of edges, or None if not known
+        self.broken = None # (tree, a, b) if an edge between a and b was deleted from a tree
+        self.planned = None # (edge, trees) for the edge chosen by `_first_move`
+
+    def claim(self, i):
+        """Claim edge `i` for the connecting player."""
+        self.open.discard(i)
+        a, b = self._ends(i)
+        if self.planned is not None and self.planned[0] == i:
+            self.trees = self.planned[1]
+            self.broken = None
+        elif self.trees is not None:
+            # claiming i joins a and b, so a path from a to b in a tree becomes a cycle
+            for k, tree in enumerate(self.trees):
+                if i in tree:
+                    tree.discard(i)
+                    continue
+                path = self._tree_path(tree, a, b)
+                if path:
+                    tree.discard(path[0])
+                elif self.broken is None or self.broken[0] != k:
+                    self.trees = None # a and b were not spanned by the trees
+                    break
+            else:
+                self.broken = None
+        self.planned = None
+        self.sets.union(*self.edges[i])
+
+    def delete(self, i):
+        """Delete edge `i`, for the other player."""
+        self.open.discard(i)
+        if self.trees is not None:
+            for k, tree in enumerate(self.trees):
+                if i in tree:
+                    if self.broken is not None:
+                        self.trees = None # can only repair one tree at a time
+                    else:
+                        tree.discard(i)
+                        self.broken = (k, *self._ends(i))
+                    break
+
+    def connected(self):
+        """Check if `s` and `t` have been joined."""
+        return self.sets.connected(self.s, self.t)
+
+    def has_trees(self):
+        """Check if there are two spanning trees, so the connecting player wins even if it is the other
+        player's turn (finding the trees again if the last move broke them)."""
+        if self.trees is None or self.broken is not None:
+            self.trees = self._find_trees()
+            self.broken = None
+        return self.trees is not None
+
+    def choose(self, lost=False):
+        """Return the edge the connecting player should claim next. If `lost` is True the position is
+        known to be lost, so there is no point looking for a move that leads to spanning trees."""
+        if self.trees is not None and self.broken is not None:
+            i = self._reconnect()
+            if i is not None:
+                return i
+            self.trees = None
+        if lost:
+            return self._shortest_path_edge()
+        if self.trees is None:
+            self.trees = self._find_trees()
+            self.broken = None
+        if self.trees is not None:
+            # any edge in the trees keeps them spanning, so move towards t
+            return self._tree_path(self.trees[0], self._find(self.s), self._find(self.t))[0]
+        return self._first_move()
+
+    def _find(self, node):
+        return self.sets.find(node)
+
+    def _ends(self, i):
+        a, b = self.edges[i]
+        return self._find(a), self._find(b)
+
+    def _tree_path(self, tree, a, b):
+        """Return the edges on the path from `a` to `b` in `tree`, or None if there is no path."""
+        if a == b:
+            return []
+        adjacency = {}
+        for i in tree:
+            u, v = self._ends(i)
+            adjacency.setdefault(u, []).append((v, i))
+            adjacency.setdefault(v, []).append((u, i))
+        return _forest_path(adjacency, a, b)
+
+    def _reconnect(self):
+        """Return an edge in the unbroken tree that joins the two parts of the broken tree."""
+        k, a, b = self.broken
+        adjacency = {}
+        for i in self.trees[k]:
+            u, v = self._ends(i)
+            adjacency.setdefault(u, []).append(v)
+            adjacency.setdefault(v, []).append(u)
+        part = {a}
+        stack = [a]
+        while stack:
+            for v in adjacency.get(stack.pop(), ()):
+                if v not in part:
+                    part.add(v)
+                    stack.append(v)
+        if b in part:
+            return None
+        for i in sorted(self.trees[1 - k]):
+            u, v = self._ends(i)
+            if (u in part) != (v in part):
+                return i
+        return None
+
+    def _find_trees(self, forests=None):
+        """Return two edge-disjoint trees spanning the same set of nodes, including `s` and `t`,
+        or None if there are no such trees. If `forests` is a list, the first pair of maximal
+        forests found is appended to it."""
+        s, t = self._find(self.s), self._find(self.t)
+        edges = [(i, *self._ends(i)) for i in sorted(self.open)]
+        edges = [(i, u, v) for i, u, v in edges if u != v]
+        while True:
+            F = _max_forests(edges)
+            if forests is not None and not forests:
+                forests.append(F)
+            parts = [_forest_component(F[k], s) for k in range(2)]
+            if t not in parts[0] or t not in parts[1]:
+                return None
+            if parts[0] == parts[1]:
+                # restrict the forests to the trees containing s
+                return [{i for i, u, v in F[k] if u in parts[k]} for k in range(2)]
+            # the nodes spanned by both trees must be in both parts
+            nodes = parts[0] & parts[1]
+            edges = [(i, u, v) for i, u, v in edges if u in nodes and v in nodes]
+
+    def _first_move(self):
+        """Return an edge to claim when there are no spanning trees, preferring one after which there are."""
+        forests = []
+        self._find_trees(forests)
+        F = forests[0] if forests else ([], [])
+        # claiming an edge that joins two trees of a forest can make it span
+        components = []
+        for k in range(2):
+            sets = _UnionFind()
+            for _, u, v in F[k]:
+                sets.union(u, v)
+            components.append(sets)
+        candidates = sorted(self.open, key=lambda i: (
+            components[1].connected(*self._ends(i)),
+            components[0].connected(*self._ends(i)),
+            i,
+        ))
+        for i in candidates:
+            trial = _SpanningTrees(self.edges, self.s, self.t)
+            trial.sets = self.sets.copy()
+            trial.open = set(self.open)
+            trial.claim(i)
+            if trial.connected():
+                return i
+            trees = trial._find_trees()
+            if trees is not None:
+                self.planned = (i, trees)
+                return i
+        # a lost position: head for t anyway
+        return self._shortest_path_edge()
+
+    def _shortest_path_edge(self):
+        """Return the first edge on a shortest path from `s` to `t` (or any edge if there is no path)."""
+        adjacency = {}
+        for i in self.open:
+            u, v = self._ends(i)
+            if u != v:
+                adjacency.setdefault(u, []).append((v, i))
+                adjacency.setdefault(v, []).append((u, i))
+        path = _forest_path(adjacency, self._find(self.s), self._find(self.t))
+        return path[0] if path else min(self.open)
+
+def _forest_path(adjacency, a, b):
+    """Return the edges on a shortest path from `a` to `b` in a graph given as a mapping from each node
+    to a list of (neighbour, edge) pairs, or None if there is no path."""
+    previous = {a: None}
+    queue = [a]
+    for node in queue:
+        for neighbour, i in adjacency.get(node, ()):
+            if neighbour not in previous:
+                previous[neighbour] = (node, i)
+                if neighbour == b:
+                    path = []
+                    while previous[neighbour] is not None:
+                        neighbour, i = previous[neighbour]
+                        path.append(i)
+                    return path[::-1]
+                queue.append(neighbour)
+    return None
+
+def _forest_component(forest, node):
+    """Return the set of nodes in the same tree as `node` in `forest`, a list of (edge, u, v) triples."""
+    adjacency = {}
+    for _, u, v in forest:
+        adjacency.setdefault(u, []).append(v)
+        adjacency.setdefault(v, []).append(u)
+    component = {node}
+    stack = [node]
+    while stack:
+        for v in adjacency.get(stack.pop(), ()):
+            if v not in component:
+                component.add(v)
+                stack.append(v)
+    return component
+
+def _root_forest(adjacency):
+    """Return the parent (and the edge to it), depth and root of each node in a forest given as for
+    `_forest_path`. Nodes that aren't in the mapping are roots on their own."""
+    parent, depth, root = {}, {}, {}
+    for r in adjacency:
+        if r in depth:
+            continue
+        depth[r] = 0
+        root[r] = r
+        queue = [r]
+        for node in queue:
+            for neighbour, i in adjacency[node]:
+                if neighbour not in depth:
+                    parent[neighbour] = (node, i)
+                    depth[neighbour] = depth[node] + 1
+                    root[neighbour] = r
+                    queue.append(neighbour)
+    return parent, depth, root
+
+def _rooted_path(rooted, a, b):
+    """Return the edges on the path from `a` to `b` in a forest rooted by `_root_forest`, or None if there
+    is no path."""
+    parent, depth, root = rooted
+    if root.get(a, a) != root.get(b, b):
+        return None
+    from_a, from_b = [], []
+    while a != b:
+        if depth.get(a, 0) >= depth.get(b, 0):
+            a, i = parent[a]
+            from_a.append(i)
+        else:
+            b, i = parent[b]
+            from_b.append(i)
+    return from_a + from_b[::-1]
+
+def _max_forests(edges):
+    """Return two edge-disjoint forests with as many edges as possible in total, from `edges`
+    (a list of (edge, u, v) triples). Each forest is returned as a list of triples.
+
+    Edges are added greedily, and then each edge that doesn't fit is inserted using the shortest
+    augmenting path of swaps between the forests (Edmonds' matroid partition algorithm)."""
+    ends = {i: (u, v) for i, u, v in edges}
+    member = {} # forest of each edge in a forest
+    adjacency = [{}, {}]
+    def add(i, k):
+        u, v = ends[i]
+        member[i] = k
+        adjacency[k].setdefault(u, []).append((v, i))
+        adjacency[k].setdefault(v, []).append((u, i))
+    def remove(i):
+        u, v = ends[i]
+        k = member.pop(i)
+        adjacency[k][u].remove((v, i))
+        adjacency[k][v].remove((u, i))
+
+    sets = [_UnionFind(), _UnionFind()]
+    leftover = []
+    for i, u, v in edges:
+        for k in range(2):
+            if not sets[k].connected(u, v):
+                sets[k].union(u, v)
+                add(i, k)
+                break
+        else:
+            leftover.append(i)
+
+    for e in leftover:
+        # breadth first search for a sequence of swaps that makes room for e
+        label = {e: None}
+        queue = [e]
+        rooted = [None, None] # the forests don't change during the search, so paths can be found by climbing
+        for g in queue:
+            done = False
+            for k in range(2):
+                if member.get(g) == k:
+                    continue
+                if rooted[k] is None:
+                    rooted[k] = _root_forest(adjacency[k])
+                path = _rooted_path(rooted[k], *ends[g])
+                if path is None:
+                    # g fits in forest k, so move each edge along the chain into the forest it is labelled with
+                    while g is not None:
+                        previous = label[g]
+                        if g in member:
+                            remove(g)
+                        add(g, k)
+                        if previous is not None:
+                            g, k = previous
+                        else:
+                            g = None
+                    done = True
+                    break
+                for f in path:
+                    if f not in label:
+                        # f can leave forest k, if g joins it
+                        label[f] = (g, k)
+                        queue.append(f)
+            if done:
+                break
+
+    return [[(i, *ends[i]) for i in ends if member.get(i) == k] for k in range(2)]
+
+class Perfect:
+    """A player that uses Lehman's strategy, based on spanning trees, to play the Shannon switching game.
+
+    As SHORT it plays the strategy on the bird cage, and as CUT it plays it on the dual graph (the white
+    graph on the equivalent Bridg-It board), where CUT is trying to join the left and right sides.
+    It wins from every position that can be won (against any replies), and since the trees are repaired
+    after each move it is fast enough for large boards.
+
+    The other player's strategy is followed too. Since exactly one player can win, a position without
+    trees is lost just when the other player has trees, and then there's no need to try every move
+    looking for one that leads to trees (which is the usual case for SHORT, as CUT moves first)."""
+
+    def __init__(self):
+        self.strategy = None
+        self.other = None
+        self.cut = None
+        self.M = None
+        self.moves = []
+
+    def play(self, board):
+        cut = len(board.moves) % 2 == 0
+        if (self.strategy is None or self.M != board.M or self.cut != cut
+                or board.moves[:len(self.moves)] != self.moves):
+            self._start(board.M, cut)
+        layout = _layout(board.M)
+        for move in board.moves[len(self.moves):]:
+            i = layout.move_index[move.upper()]
+            if (len(self.moves) % 2 == 0) == cut:
+                self.strategy.claim(i)
+                self.other.delete(i)
+            else:
+                self.strategy.delete(i)
+                self.other.claim(i)
+            self.moves.append(move.upper())
+        lost = self.strategy.trees is None and self.other.has_trees()
+        return layout.moves[self.strategy.choose(lost)]
+
+    def _start(self, M, cut):
+        layout = _layout(M)
+        # join the faces along each side, as in BirdCage.cut_sets
+        joined = []
+        for i in range(M - 1):
+            joined.append(((0, 2 * i + 1), (0, 2 * i + 3)))
+            joined.append(((2 * M, 2 * i + 1), (2 * M, 2 * i + 3)))
+        cut_strategy = _SpanningTrees(layout.dual_edges, (0, 1), (2 * M, 1), joined)
+        short_strategy = _SpanningTrees(layout.edges, layout.top, layout.bottom)
+        self.strategy, self.other = (cut_strategy, short_strategy) if cut else (short_strategy, cut_strategy)
+        self.M = M
+        self.cut = cut
+        self.moves = []
+
+    def __repr__(self):
+        return "Perfect"
+
 class Human:
     def __init__(self, term):
         self.term = term
         self.x = 4
         self.y = 2
+        # the lines of the last board drawn, and its moves
+        self._frame = None
+        self._frame_moves = None
 
     def print_board(self, board):
         print(self.term.move_xy(0, 0) + str(board))
@@ -397,8 +2353,11 @@ class Human:
         self.reverse_char(board)
 
     def get_char_at(self, board):
-        board_list = str(board).split("\n")
-        return board_list[self.y - 1][self.x]
+        # only render the board again if it has changed since the last key press
+        if self._frame_moves != (board.M, *board.moves):
+            self._frame = str(board).split("\n")
+            self._frame_moves = (board.M, *board.moves)
+        return self._frame[self.y - 1][self.x]
 
     def clear_char(self, board):
         print(self.term.move_xy(self.x, self.y) + self.get_char_at(board))
@@ -406,30 +2365,33 @@ class Human:
     def reverse_char(self, board):
         print(self.term.move_xy(self.x, self.y) + self.term.reverse(self.get_char_at(board)))
 
+    def handle_key(self, val, board):
+        """Move the cursor if `val` is an arrow key. If it is enter, return the move under the cursor
+        if it can be played, otherwise return None."""
+        if val.code == self.term.KEY_LEFT and self.x > 4:
+            self.move_cursor(-2, 0, board)
+        elif val.code == self.term.KEY_RIGHT and self.x < 4 * board.M:
+            self.move_cursor(2, 0, board)
+        elif val.code == self.term.KEY_UP and self.y > 2:
+            self.move_cursor(0, -1, board)
+        elif val.code == self.term.KEY_DOWN and self.y < 2 * board.M:
+            self.move_cursor(0, 1, board)
+        elif val.code == self.term.KEY_ENTER:
+            move = _to_alpha((self.x - 2) // 2, 2 * board.M + 1 - self.y)
+            if is_valid_move(move, board.M) and move not in board.moves:
+                return move
+        return None
 
     def play(self, board):
-        all_moves = valid_moves(board.M)
-        candidate_moves = set(all_moves) - set(board.moves)
         move = None
         self.reverse_char(board)
         with self.term.cbreak():
             val = ''
             while val.lower() != 'q':
                 val = self.term.inkey()
-                if val.code == self.term.KEY_LEFT and self.x > 4:
-                    self.move_cursor(-2, 0, board)
-                elif val.code == self.term.KEY_RIGHT and self.x < 4 * board.M:
-                    self.move_cursor(2, 0, board)
-                elif val.code == self.term.KEY_UP and self.y > 2:
-                    self.move_cursor(0, -1, board)
-                elif val.code == self.term.KEY_DOWN and self.y < 2 * board.M:
-                    self.move_cursor(0, 1, board)
-                elif val.code == self.term.KEY_ENTER:
-                    move = _to_alpha((self.x - 2) // 2, 2 * board.M + 1 - self.y)
-                    if move in candidate_moves:
-                        break
-                    else:
-                        move = None
+                move = self.handle_key(val, board)
+                if move is not None:
+                    break
         return move
 
     def __repr__(self):
@@ -1,36 +1,156 @@
-from birdcage import *
-
-if __name__ == "__main__":
-    # Run some random games and see what the difference between
-    # the top two distinct voltage differences is, when measured using
-    # a 10-bit analog to digital converter (like the Arduino).
+import argparse
+import multiprocessing
 
-    resolution = 1024
+import numpy as np
 
-    min_delta = resolution
+from birdcage import *
+from birdcage import _top_left_order
 
-    for i in range(10):
-        print(i)
-        bc = BirdCage(M=4)
-        s = Shannon()
+def random_game_positions(M, games):
+    """Play random games on a board of size `M`, and return every position in them."""
+    positions = []
+    for i in range(games):
+        bc = BirdCage(M=M)
         p1 = Random()
         p2 = Random()
 
         while not (bc.white_has_won() or bc.black_has_won()):
-            voltage_diffs = s._get_voltage_diffs(bc)
-            distinct = set(voltage_diffs.values())
-            distinct_sorted = sorted([(v * resolution).evalf() for v in distinct if v > 0], reverse=True)
-            if len(distinct_sorted) > 1:
-                delta = distinct_sorted[0] - distinct_sorted[1]
-                if delta < min_delta:
-                    min_delta = delta
-                    print(min_delta)
-                    print(bc)
+            positions.append(list(bc.moves))
 
             move = p1.play(bc)
             bc.move(move)
+            if bc.white_has_won():
+                break
 
             move = p2.play(bc)
             bc.move(move)
+    return positions
+
+def min_deltas(voltage_diffs, resolution=1024, tolerance=NumpySolver.tolerance):
+    """Return the difference between the top two distinct voltage differences in each row of `voltage_diffs`
+    (as returned by `batch_voltage_diffs`), measured in steps of an analog to digital converter with `resolution`
+    levels. Rows with only one distinct voltage difference have a delta of `resolution`."""
+    voltage_diffs = voltage_diffs * resolution
+    voltage_diffs = -np.sort(-np.nan_to_num(voltage_diffs, nan=-np.inf), axis=1)
+    top = voltage_diffs[:, 0]
+    # the largest voltage diff that is distinct from the top one
+    distinct = (voltage_diffs < top[:, None] - tolerance * resolution) & (voltage_diffs > 0)
+    second = np.where(distinct, voltage_diffs, -np.inf).max(axis=1)
+    return np.where(np.isfinite(second), top - second, resolution)
+
+def shannon_moves(voltage_diffs, M, tolerance=NumpySolver.tolerance):
+    """Return the index of the move Shannon plays from each row of `voltage_diffs`: the largest voltage diff,
+    with near-ties going to the move nearest the top-left (as for `Shannon`)."""
+    moves = list(valid_moves(M))
+    order = np.array(sorted(range(len(moves)), key=lambda i: _top_left_order(moves[i])))
+    d = np.nan_to_num(voltage_diffs[:, order], nan=-np.inf)
+    top = d.max(axis=1)
+    return order[np.argmax(d >= top[:, None] - tolerance, axis=1)]
+
+def _solve_chunk(args):
+    states, M, use_extra_resistors, pull_up_resistance = args
+    return batch_voltage_diffs(states, M, use_extra_resistors, pull_up_resistance=pull_up_resistance)
+
+def shannon_positions(M=4, workers=None, chunk_size=4096, use_extra_resistors=True, pull_up_resistance=PULL_UP_RESISTANCE):
+    """Generate every distinct position that can be reached when Shannon plays CUT against every possible
+    SHORT reply, with CUT to move, along with Shannon's voltage diffs (solved on `workers` processes),
+    for the circuit with or without the extra resistors (and pull-ups of `pull_up_resistance`).
+
+    Positions are generated a ply at a time, in chunks of up to `chunk_size` boards, as pairs of a list
+    of `CompactBirdCage` boards and an array of their voltage diffs (as returned by `batch_voltage_diffs`).
+    Without the extra resistors some positions can't be solved (their voltage diffs are all NaN), so
+    Shannon can't choose a move in them, and the game isn't followed any further."""
+    frontier = {(0, 0): CompactBirdCage(M)}
+    pool = multiprocessing.Pool(workers) if workers != 1 else None
+    try:
+        while frontier:
+            boards = list(frontier.values())
+            chunks = [
+                (np.stack([board.states() for board in boards[start:start + chunk_size]]), M, use_extra_resistors, pull_up_resistance)
+                for start in range(0, len(boards), chunk_size)
+            ]
+            solved = pool.imap(_solve_chunk, chunks) if pool is not None else map(_solve_chunk, chunks)
+            frontier = {}
+            for start, voltage_diffs in zip(range(0, len(boards), chunk_size), solved):
+                chunk = boards[start:start + chunk_size]
+                yield chunk, voltage_diffs
+                solvable = ~np.all(np.isnan(voltage_diffs), axis=1)
+                for board, i, ok in zip(chunk, shannon_moves(voltage_diffs, M), solvable):
+                    if not ok:
+                        continue
+                    board.move(board.layout.moves[i])
+                    if not board.white_has_won():
+                        for move in board.layout.moves:
+                            if board.state(move) != OPEN:
+                                continue
+                            board.move(move)
+                            key = (board.cuts, board.shorts)
+                            if not board.black_has_won() and key not in frontier:
+                                frontier[key] = board.copy()
+                            board.undo()
+                    board.undo()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def exhaustive_min_delta(M=4, resolution=1024, workers=None, worst=5, use_extra_resistors=True,
+                         pull_up_resistance=PULL_UP_RESISTANCE):
+    """Return the number of positions Shannon can face as CUT (against any SHORT replies), the smallest
+    delta over all of them (see `min_deltas`), and the `worst` positions, as (delta, board) pairs.
+
+    The circuit is solved with or without the extra resistors (with pull-ups of `pull_up_resistance`).
+    Positions whose circuit can't be solved have a delta of 0, since the machine can't choose a move."""
+    count = 0
+    worst_positions = []
+    for boards, voltage_diffs in shannon_positions(M, workers, use_extra_resistors=use_extra_resistors,
+                                                   pull_up_resistance=pull_up_resistance):
+        count += len(boards)
+        deltas = min_deltas(voltage_diffs, resolution)
+        deltas[np.all(np.isnan(voltage_diffs), axis=1)] = 0
+        for j in np.argsort(deltas, kind="stable")[:worst]:
+            worst_positions.append((float(deltas[j]), boards[j].copy()))
+        worst_positions = sorted(worst_positions, key=lambda item: item[0])[:worst]
+    return count, worst_positions[0][0], worst_positions
+
+if __name__ == "__main__":
+    # Run some random games and see what the difference between
+    # the top two distinct voltage differences is, when measured using
+    # a 10-bit analog to digital converter (like the Arduino).
+    # With --exhaustive, check every position that Shannon can face as CUT instead.
+    parser = argparse.ArgumentParser()
+    parser.add_argument("games", type=int, nargs="?", default=10, help="number of random games to play")
+    parser.add_argument("--exhaustive", action="store_true", help="check every position Shannon can face as CUT")
+    parser.add_argument("--M", type=int, default=4, help="board size")
+    parser.add_argument("--resolution", type=int, default=1024, help="number of analog to digital converter levels")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--no-extra-resistors", action="store_true", help="solve the circuit without the extra resistors")
+    parser.add_argument("--pull-up-resistance", type=float, default=PULL_UP_RESISTANCE,
+                        help="pull-up resistance, as a multiple of the other resistors")
+    args = parser.parse_args()
+    use_extra_resistors = not args.no_extra_resistors
+
+    resolution = args.resolution
+
+    if args.exhaustive:
+        count, min_delta, worst = exhaustive_min_delta(
+            args.M, resolution, args.workers, use_extra_resistors=use_extra_resistors, pull_up_resistance=args.pull_up_resistance
+        )
+        print(count, "positions")
+        for delta, board in worst:
+            print(board)
+            print("delta", delta)
+        print("min_delta", min_delta)
+    else:
+        positions = random_game_positions(args.M, args.games)
+        print(len(positions), "positions")
+
+        # evaluate all the positions in one go
+        deltas = min_deltas(
+            batch_voltage_diffs(positions, M=args.M, use_extra_resistors=use_extra_resistors,
+                                pull_up_resistance=args.pull_up_resistance),
+            resolution,
+        )
 
-        print("min_delta", min_delta)
\ No newline at end of file
+        i = np.argmin(deltas)
+        print(BirdCage(M=args.M, moves=positions[i]))
+        print("min_delta", min(deltas[i], resolution))
@@ -0,0 +1,210 @@
+"""A compact binary format for game records, which can be written and read a game at a time.
+
+A file starts with a 5 byte header, the magic bytes b"BCGR" and a version byte (1), followed by
+the games. Each game is a 6 byte header (all integers are little-endian):
+
+    M          uint16    the board size
+    cut        uint8     the length of the name of the CUT player
+    short      uint8     the length of the name of the SHORT player
+    n          uint16    the number of moves
+
+followed by the two player names (in UTF-8), then the moves, as indexes in `valid_moves` order.
+Each move is one byte, or two on boards with more than 255 moves (M > 11).
+
+Games can be checked in bulk, without building a board for each one, by `validate_games`:
+
+    python game_records.py convert tournament.jsonl games.bcg
+    python game_records.py validate games.bcg
+"""
+
+import argparse
+import json
+import struct
+import time
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+
+from birdcage import *
+from birdcage import _layout
+
+MAGIC = b"BCGR"
+VERSION = 1
+GAME_HEADER = struct.Struct("<HBBH")
+
+# a game read from a file, where `moves` is an array of move indexes (in `valid_moves` order)
+GameRecord = namedtuple("GameRecord", ["M", "cut", "short", "moves"])
+
+def _move_typecode(M):
+    return "B" if len(_layout(M).moves) <= 255 else "H"
+
+def record_moves(record):
+    """Return the moves of a `GameRecord`, as move strings (as for `board.moves`)."""
+    moves = _layout(record.M).moves
+    return [moves[i] for i in record.moves]
+
+class GameWriter:
+    """Append games to a game record file at `path`, creating it if it doesn't exist."""
+
+    def __init__(self, path):
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(MAGIC + bytes([VERSION]))
+
+    def write(self, M, moves, cut="", short=""):
+        """Write a game on a board of size `M`, with `moves` given as move strings or indexes."""
+        layout = _layout(M)
+        indexes = array(_move_typecode(M), [
+            layout.move_index[move.upper()] if isinstance(move, str) else move for move in moves
+        ])
+        cut, short = cut.encode(), short.encode()
+        if len(cut) > 255 or len(short) > 255:
+            raise ValueError("Player names must be at most 255 bytes long")
+        self.file.write(GAME_HEADER.pack(M, len(cut), len(short), len(indexes)))
+        self.file.write(cut + short)
+        self.file.write(indexes.tobytes())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_games(path, games):
+    """Append `games` (an iterable of `GameRecord`s, or anything with the same fields) to `path`."""
+    with GameWriter(path) as writer:
+        for game in games:
+            writer.write(game.M, game.moves, game.cut, game.short)
+
+def read_games(path):
+    """Generate the games in the game record file at `path`, as `GameRecord`s, one at a time."""
+    with open(path, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a game record file: {path}")
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError(f"Unsupported game record version: {header[len(MAGIC)]}")
+        while True:
+            game_header = f.read(GAME_HEADER.size)
+            if not game_header:
+                return
+            if len(game_header) < GAME_HEADER.size:
+                raise ValueError(f"Truncated game record file: {path}")
+            M, cut_length, short_length, n = GAME_HEADER.unpack(game_header)
+            names = f.read(cut_length + short_length)
+            moves = array(_move_typecode(M))
+            data = f.read(n * moves.itemsize)
+            if len(names) < cut_length + short_length or len(data) < n * moves.itemsize:
+                raise ValueError(f"Truncated game record file: {path}")
+            moves.frombytes(data)
+            yield GameRecord(M, names[:cut_length].decode(), names[cut_length:].decode(), moves)
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+# the edges of a board as node numbers, and its dual edges as face numbers, for `game_winner`
+_Graph = namedtuple("_Graph", ["n", "u", "v", "nodes", "top", "bottom", "du", "dv", "faces", "left", "right"])
+
+@lru_cache(maxsize=None)
+def _graph(M):
+    layout = _layout(M)
+    face_index = {}
+    def face(f):
+        return face_index.setdefault(f, len(face_index))
+    du = [face(a) for a, _ in layout.dual_edges]
+    dv = [face(b) for _, b in layout.dual_edges]
+    left, right = face((0, 1)), face((2 * M, 1))
+    # as for CompactBirdCage, the faces along each side of the board are joined
+    sides = [(face((x, 2 * i + 1)), face((x, 2 * i + 3))) for x in (0, 2 * M) for i in range(M - 1)]
+    faces = list(range(len(face_index)))
+    for a, b in sides:
+        faces[_find(faces, a)] = _find(faces, b)
+    return _Graph(
+        len(layout.moves), layout.u.tolist(), layout.v.tolist(), len(layout.nodes), layout.top, layout.bottom,
+        du, dv, tuple(faces), left, right,
+    )
+
+def game_winner(M, moves):
+    """Return the winner ("cut" or "short") of a game on a board of size `M`, or None if it is unfinished.
+
+    `moves` are move indexes (in `valid_moves` order). This doesn't build a board, so it is much faster
+    than playing the moves on one. Raise `ValueError` if any move is not valid, has already been made,
+    or is made after the game has been won."""
+    graph = _graph(M)
+    played = bytearray(graph.n)
+    nodes = list(range(graph.nodes))
+    faces = list(graph.faces)
+    for ply, i in enumerate(moves):
+        if not 0 <= i < graph.n:
+            raise ValueError(f"Invalid move index {i} at ply {ply + 1}")
+        if played[i]:
+            raise ValueError(f"Move {_layout(M).moves[i]} has already been made, at ply {ply + 1}")
+        played[i] = 1
+        if ply % 2 == 0: # CUT
+            faces[_find(faces, graph.du[i])] = _find(faces, graph.dv[i])
+            won = _find(faces, graph.left) == _find(faces, graph.right)
+        else: # SHORT
+            nodes[_find(nodes, graph.u[i])] = _find(nodes, graph.v[i])
+            won = _find(nodes, graph.top) == _find(nodes, graph.bottom)
+        if won:
+            if ply + 1 < len(moves):
+                raise ValueError(f"Moves made after the game was won, at ply {ply + 2}")
+            return "cut" if ply % 2 == 0 else "short"
+    return None
+
+def validate_games(games):
+    """Check that every game in `games` (an iterable of `GameRecord`s) is legal, and find its winner.
+
+    Return a dictionary counting the games, the wins for each side, the unfinished games and the
+    invalid games, and a list of (game number, error message) for the invalid games."""
+    counts = {"games": 0, "cut": 0, "short": 0, "unfinished": 0, "invalid": 0}
+    errors = []
+    for number, game in enumerate(games):
+        counts["games"] += 1
+        try:
+            winner = game_winner(game.M, game.moves)
+        except ValueError as e:
+            counts["invalid"] += 1
+            errors.append((number, str(e)))
+            continue
+        counts[winner or "unfinished"] += 1
+    return counts, errors
+
+def convert_tournament(results_path, path):
+    """Append the games in a tournament results file (see `tournament.py`) to the game record file at `path`,
+    and return the number of games."""
+    count = 0
+    with open(results_path) as f, GameWriter(path) as writer:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                writer.write(result["M"], result["moves"], result["cut"], result["short"])
+                count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert and validate game record files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="convert tournament results to game records")
+    convert.add_argument("results", help="tournament results (JSON lines)")
+    convert.add_argument("path", help="game record file to append to")
+    validate = subparsers.add_parser("validate", help="check the games in a game record file")
+    validate.add_argument("path", help="game record file")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(convert_tournament(args.results, args.path), "games")
+    else:
+        start = time.perf_counter()
+        counts, errors = validate_games(read_games(args.path))
+        seconds = time.perf_counter() - start
+        for number, error in errors:
+            print(f"game {number}: {error}")
+        print(", ".join(f"{name} {count}" for name, count in counts.items()))
+        print(f"{counts['games'] / seconds:.0f} games/s")
@@ -0,0 +1,287 @@
+"""Monte Carlo tree search over Bird Cage positions.
+
+`MCTS` is a player that grows a search tree with UCT selection, scoring each new position with a
+random rollout to the end of the game. Rollouts are fast because the winner of a full board doesn't
+depend on the order the moves were played in: the open edges are shuffled and dealt out alternately,
+and then it is only a matter of whether SHORT's edges join the top to the bottom. Optionally,
+Shannon's voltage differences are used as a prior near the root, so the moves he would play are
+tried first and favoured until the rollouts say otherwise.
+
+Each move is searched until a time budget (or a number of rollouts) runs out, and the most visited
+move so far is played. The search can be spread across a pool of processes with root parallelism:
+each process grows its own tree from the same position with a different seed, and the visit counts
+at the root are added up. (The tree itself can't be shared between processes.)
+
+    python mcts.py --M 5 --time-limit 2 --workers 4 A1 c1
+"""
+
+import argparse
+import math
+import multiprocessing
+import random
+import time
+from collections import namedtuple
+
+from birdcage import *
+from birdcage import _layout
+
+# the result of a search: the chosen move, its estimated win rate for the side to move, the number
+# of rollouts and the time taken, and the number of visits to each move at the root
+MCTSResult = namedtuple("MCTSResult", ["move", "value", "rollouts", "seconds", "visits"])
+
+def report(result):
+    """Return a one-line summary of an `MCTSResult`."""
+    rate = result.rollouts / result.seconds if result.seconds > 0 else 0
+    top = sorted(result.visits.items(), key=lambda item: -item[1])[:5]
+    return (
+        f"best {result.move} (win rate {result.value:.1%}), {result.rollouts} rollouts in {result.seconds:.2f}s "
+        f"({rate:.0f} rollouts/s), visits {', '.join(f'{move} {n}' for move, n in top)}"
+    )
+
+class _Node:
+    __slots__ = ("move", "cut", "prior", "visits", "wins", "children", "winner")
+
+    def __init__(self, move, cut, prior=0.0):
+        self.move = move # the index of the move that led here
+        self.cut = cut # whether CUT made that move
+        self.prior = prior
+        self.visits = 0
+        self.wins = 0 # for the side that made the move
+        self.children = None
+        self.winner = None # "cut" or "short", if the game is over
+
+class _Tree:
+    """A search tree for one process."""
+
+    def __init__(self, M, moves, exploration, prior_weight, prior_depth, use_extra_resistors, seed):
+        self.board = CompactBirdCage(M, moves)
+        self.layout = _layout(M)
+        self.u = self.layout.u.tolist()
+        self.v = self.layout.v.tolist()
+        self.exploration = exploration
+        self.prior_weight = prior_weight
+        self.prior_depth = prior_depth
+        self.use_extra_resistors = use_extra_resistors
+        self.rng = random.Random(seed)
+        self.root = _Node(None, len(moves) % 2 == 1)
+        self.rollouts = 0
+
+    def run(self, deadline=None, max_rollouts=None):
+        """Run iterations until `deadline` (a `time.monotonic` time, which is the same in every process)
+        or `max_rollouts` is reached."""
+        while (max_rollouts is None or self.rollouts < max_rollouts) and (deadline is None or time.monotonic() < deadline):
+            self._iterate()
+
+    def _iterate(self):
+        board = self.board
+        node = self.root
+        path = [node]
+        while node.children and node.winner is None:
+            node = self._select(node)
+            board.move(self.layout.moves[node.move])
+            path.append(node)
+        if node.winner is None and len(path) > 1 and node.visits == 0:
+            # first visit to a position: see whether the game is over
+            if board.white_has_won():
+                node.winner = "cut"
+            elif board.black_has_won():
+                node.winner = "short"
+        if node.winner is None and (node.visits > 0 or node is self.root):
+            self._expand(node, len(path) - 1)
+            if node.children:
+                node = self._select(node)
+                board.move(self.layout.moves[node.move])
+                path.append(node)
+                if board.white_has_won():
+                    node.winner = "cut"
+                elif board.black_has_won():
+                    node.winner = "short"
+        if node.winner is not None:
+            short_won = node.winner == "short"
+        else:
+            short_won = self._rollout()
+        self.rollouts += 1
+        for node in path:
+            node.visits += 1
+            if node.cut != short_won:
+                node.wins += 1
+        for _ in range(len(path) - 1):
+            board.undo()
+
+    def _expand(self, node, depth):
+        board = self.board
+        played = board.cuts | board.shorts
+        moves = [i for i in range(len(self.layout.moves)) if not played >> i & 1]
+        priors = [0.0] * len(moves)
+        if self.prior_weight > 0 and depth < self.prior_depth:
+            diffs = batch_voltage_diffs(board.states()[None, :], board.M, self.use_extra_resistors)[0]
+            largest = max(float(diffs[i]) for i in moves)
+            if largest > 0:
+                priors = [float(diffs[i]) / largest for i in moves]
+        cut = len(board.moves) % 2 == 0
+        children = [_Node(i, cut, prior) for i, prior in zip(moves, priors)]
+        # unvisited moves are tried in this order: Shannon's, or top-left first (as in `valid_moves`)
+        children.sort(key=lambda child: -child.prior)
+        node.children = children
+
+    def _select(self, node):
+        log_visits = math.log(node.visits) if node.visits > 0 else 0.0
+        best, best_score = None, -math.inf
+        for child in node.children:
+            if child.visits == 0:
+                return child
+            score = (
+                child.wins / child.visits
+                + self.exploration * math.sqrt(log_visits / child.visits)
+                + self.prior_weight * child.prior / (1 + child.visits)
+            )
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    def _rollout(self):
+        """Deal out the open edges at random, and return whether SHORT wins the full board."""
+        board = self.board
+        played = board.cuts | board.shorts
+        shorts = []
+        open_moves = []
+        for i in range(len(self.layout.moves)):
+            if board.shorts >> i & 1:
+                shorts.append(i)
+            elif not played >> i & 1:
+                open_moves.append(i)
+        self.rng.shuffle(open_moves)
+        # SHORT gets every other open edge, starting with the first if it's SHORT to move
+        shorts.extend(open_moves[len(board.moves) % 2 == 0::2])
+        parent = list(range(len(self.layout.nodes)))
+        for i in shorts:
+            a, b = self.u[i], self.v[i]
+            while parent[a] != a:
+                parent[a] = a = parent[parent[a]]
+            while parent[b] != b:
+                parent[b] = b = parent[parent[b]]
+            parent[a] = b
+        a, b = self.layout.top, self.layout.bottom
+        while parent[a] != a:
+            a = parent[a]
+        while parent[b] != b:
+            b = parent[b]
+        return a == b
+
+    def root_stats(self):
+        """Return the visits and wins of each move at the root, keyed by move index."""
+        return {child.move: (child.visits, child.wins) for child in self.root.children or []}
+
+def _search_tree(args):
+    M, moves, deadline, max_rollouts, exploration, prior_weight, prior_depth, use_extra_resistors, seed = args
+    tree = _Tree(M, moves, exploration, prior_weight, prior_depth, use_extra_resistors, seed)
+    tree.run(deadline, max_rollouts)
+    return tree.root_stats(), tree.rollouts
+
+class MCTS:
+    """A player that chooses moves by Monte Carlo tree search.
+
+    Each move is searched for `time_limit` seconds, or until `max_rollouts` rollouts have been run (on
+    each of `workers` processes), whichever comes first. `exploration` is the UCT exploration constant.
+    If `prior_weight` is non-zero, Shannon's voltage differences (scaled so the largest is 1) are added
+    to the UCT score of each move, weighted by `prior_weight` and fading as the move is visited, at nodes
+    less than `prior_depth` plies below the root. The search is seeded from `seed`, or from the `random`
+    module if it is None. The result of the last search is kept in `last`, and the total rollouts and
+    search time in `rollouts` and `seconds`.
+
+    With more than one worker, the pool of processes is started on the first search and kept for the
+    rest, and every worker stops at the same time, so the time limit covers the whole search. Call
+    `close` (or use the player in a `with` block) to stop the pool."""
+
+    def __init__(self, time_limit=1.0, max_rollouts=None, workers=1, exploration=0.7, prior_weight=1.0,
+                 prior_depth=2, use_extra_resistors=True, seed=None):
+        if time_limit is None and max_rollouts is None:
+            raise ValueError("A time limit or a maximum number of rollouts is needed")
+        self.time_limit = time_limit
+        self.max_rollouts = max_rollouts
+        self.workers = workers
+        self.exploration = exploration
+        self.prior_weight = prior_weight
+        self.prior_depth = prior_depth
+        self.use_extra_resistors = use_extra_resistors
+        self.rng = random.Random(seed) if seed is not None else random
+        self.last = None
+        self.rollouts = 0
+        self.seconds = 0.0
+        self.pool = None
+
+    def search(self, board):
+        """Search the position on `board` and return an `MCTSResult`."""
+        start = time.monotonic()
+        deadline = None if self.time_limit is None else start + self.time_limit
+        workers = self.workers if self.workers is not None else multiprocessing.cpu_count()
+        tasks = [
+            (board.M, list(board.moves), deadline, self.max_rollouts, self.exploration, self.prior_weight,
+             self.prior_depth, self.use_extra_resistors, self.rng.getrandbits(32))
+            for _ in range(workers)
+        ]
+        if workers != 1 and self.pool is None:
+            self.pool = multiprocessing.Pool(workers)
+        stats = {}
+        rollouts = 0
+        results = self.pool.imap_unordered(_search_tree, tasks) if workers != 1 else map(_search_tree, tasks)
+        for root_stats, n in results:
+            rollouts += n
+            for i, (visits, wins) in root_stats.items():
+                total = stats.get(i, (0, 0))
+                stats[i] = (total[0] + visits, total[1] + wins)
+        seconds = time.monotonic() - start
+        moves = _layout(board.M).moves
+        if stats:
+            # the most visited move, as it is the most reliable (ties go to the move with the most wins)
+            i = max(stats, key=lambda i: stats[i])
+            visits, wins = stats[i]
+            move, value = moves[i], wins / visits if visits else 0.0
+        else: # the game is over
+            move, value = None, 0.0
+        result = MCTSResult(move, value, rollouts, seconds, {moves[i]: visits for i, (visits, _) in stats.items()})
+        self.last = result
+        self.rollouts += rollouts
+        self.seconds += seconds
+        return result
+
+    def play(self, board):
+        return self.search(board).move
+
+    def close(self):
+        """Stop the pool of worker processes, if there is one."""
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def rollouts_per_second(self):
+        """Return the rollouts per second over every search so far (across all the workers)."""
+        return self.rollouts / self.seconds if self.seconds > 0 else 0.0
+
+    def __repr__(self):
+        return "MCTS"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search a Bird Cage position with Monte Carlo tree search.")
+    parser.add_argument("moves", nargs="*", help="moves played so far")
+    parser.add_argument("--M", type=int, default=3, help="board size")
+    parser.add_argument("--time-limit", type=float, default=1.0, help="seconds to search for")
+    parser.add_argument("--rollouts", type=int, default=None, help="maximum number of rollouts on each worker")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--no-prior", action="store_true", help="don't use Shannon's voltage differences as a prior")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    board = CompactBirdCage(args.M, args.moves)
+    print(board)
+    with MCTS(
+        time_limit=args.time_limit, max_rollouts=args.rollouts, workers=args.workers,
+        prior_weight=0.0 if args.no_prior else 1.0, seed=args.seed,
+    ) as player:
+        print(report(player.search(board)))
@@ -0,0 +1,216 @@
+"""Monte Carlo simulation of the physical (Arduino) version of Shannon's machine.
+
+The Arduino in `arduino/birdcage.ino` reads the node voltages with a 10-bit `analogRead`, and the
+bird cage is built from 1% resistors, so the machine doesn't always see the same voltage differences
+as the ideal circuit. This draws many sets of resistor values at once, solves the circuit for all of
+them together (as a stack of linear systems, one for each set), quantizes the node voltages as the
+analog to digital converter (ADC) would, and picks the move with the largest difference, just as the
+Arduino code does (ties go to the move nearest the top-left). Comparing these moves with the ideal
+move shows how robust the hardware is.
+
+    python monte_carlo.py --M 4 --games 20 --samples 10000 --bits 10 --tolerance 0.01
+"""
+
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from birdcage import *
+from birdcage import _layout, _merge_nodes, _top_left_order
+
+# a model of the hardware: the number of bits of the ADC, the tolerance of the resistors in the
+# bird cage (as a fraction), the tolerance of the pull-up resistors and the series resistor (the
+# Arduino's internal pull-ups vary a lot more than 1%), the standard deviation of the noise in each
+# ADC reading (in steps), and whether resistor values are drawn from a "uniform" distribution over
+# the tolerance range, or a "normal" one with the tolerance as three standard deviations
+Hardware = namedtuple(
+    "Hardware",
+    ["bits", "tolerance", "pull_up_tolerance", "series_tolerance", "noise", "distribution"],
+    defaults=[10, 0.01, 0.0, 0.01, 0.0, "uniform"],
+)
+
+# the result of simulating a position: the ideal move, how often the machine played a different
+# move, how often that move was worse than the ideal one (rather than tied with it), and a dictionary
+# of how often the machine played each move
+PositionResult = namedtuple("PositionResult", ["moves", "ideal", "differs", "worse", "counts"])
+
+def _perturb(rng, shape, tolerance, distribution):
+    """Return an array of relative resistor values, each within `tolerance` of 1."""
+    if tolerance == 0:
+        return np.ones(shape)
+    if distribution == "uniform":
+        return 1 + rng.uniform(-tolerance, tolerance, shape)
+    if distribution == "normal":
+        return 1 + np.clip(rng.normal(0, tolerance / 3, shape), -tolerance, tolerance)
+    raise ValueError(f"Unknown distribution: {distribution}")
+
+def sample_resistors(M, samples, hardware=Hardware(), seed=None):
+    """Return `samples` sets of resistor values for a board of size `M`, relative to their nominal values.
+
+    These are arrays of the bird cage resistors (with a column for each move, in `valid_moves` order),
+    the pull-up resistors (with a column for each node in the layout), and the series resistor."""
+    rng = np.random.default_rng(seed)
+    layout = _layout(M)
+    return (
+        _perturb(rng, (samples, len(layout.moves)), hardware.tolerance, hardware.distribution),
+        _perturb(rng, (samples, len(layout.nodes)), hardware.pull_up_tolerance, hardware.distribution),
+        _perturb(rng, samples, hardware.series_tolerance, hardware.distribution),
+    )
+
+def perturbed_voltages(M, states, resistors, pull_ups, series):
+    """Return the node voltages for a position (an array of edge `states`), for each set of resistor values.
+
+    The result has a row for each set of resistors (as returned by `sample_resistors`), and a column for
+    each node in the layout. The extra resistors are always used, as in the hardware. All sets are solved
+    together, as a stack of linear systems that share the same nodes."""
+    layout = _layout(M)
+    n = len(layout.nodes)
+    S = len(resistors)
+    shorted = states == SHORT
+    groups, k = _merge_nodes(n, (layout.u[shorted], layout.v[shorted]))
+    top, bottom = groups[layout.top], groups[layout.bottom]
+    if top == bottom:
+        raise ValueError("The circuit has a short from top to bottom")
+
+    # the weighted Laplacian for each set of resistors, ignoring resistors between merged nodes
+    edges = np.flatnonzero((states == OPEN) & (groups[layout.u] != groups[layout.v]))
+    u, v = groups[layout.u[edges]], groups[layout.v[edges]]
+    g = 1 / resistors[:, edges]
+    L = np.zeros((S, k * k))
+    rows = np.arange(S)[:, None]
+    np.add.at(L, (rows, u * k + v), -g)
+    np.add.at(L, (rows, v * k + u), -g)
+    np.add.at(L, (rows, u * k + u), g)
+    np.add.at(L, (rows, v * k + v), g)
+    L = L.reshape(S, k, k)
+    # pull-up resistors to 1V, and the series resistor from the bottom to 0V
+    pull_up_g = np.zeros((S, k))
+    np.add.at(pull_up_g, (rows, groups[None, :]), 1 / (PULL_UP_RESISTANCE * pull_ups))
+    L[:, np.arange(k), np.arange(k)] += pull_up_g
+    L[:, bottom, bottom] += 1 / series
+    b = pull_up_g
+
+    # the top is held at 1V
+    free = np.flatnonzero(np.arange(k) != top)
+    b = b[:, free] - L[:, free, top]
+    V = np.ones((S, k))
+    V[:, free] = np.linalg.solve(L[:, free][:, :, free], b[:, :, None])[:, :, 0]
+    return V[:, groups]
+
+def quantize(voltages, bits=10, noise=0.0, rng=None):
+    """Return the readings an ADC with `bits` bits would give for `voltages` (as a fraction of its
+    reference voltage), with Gaussian noise of standard deviation `noise` steps."""
+    levels = 1 << bits
+    readings = voltages * levels
+    if noise > 0:
+        readings = readings + (rng or np.random.default_rng()).normal(0, noise, readings.shape)
+    return np.clip(np.floor(readings), 0, levels - 1).astype(np.int64)
+
+def physical_moves(M, states, readings):
+    """Return the move (as an index in `valid_moves` order) the Arduino plays for each row of node `readings`:
+    the open move with the largest difference between the readings at either end, with ties going to
+    the move nearest the top-left."""
+    layout = _layout(M)
+    order = np.array(sorted(np.flatnonzero(states == OPEN), key=lambda i: _top_left_order(layout.moves[i])))
+    diffs = np.abs(readings[:, layout.u[order]] - readings[:, layout.v[order]])
+    return order[np.argmax(diffs, axis=1)]
+
+def simulate_position(M, moves, resistors, hardware=Hardware(), rng=None):
+    """Simulate the machine choosing a move from the position reached by `moves`, with each set of
+    resistor values (as returned by `sample_resistors`).
+
+    Return a `PositionResult`, and boolean arrays of which machines played a different move, and a worse one."""
+    layout = _layout(M)
+    states = CompactBirdCage(M, moves).states()
+    V = perturbed_voltages(M, states, *resistors)
+    chosen = physical_moves(M, states, quantize(V, hardware.bits, hardware.noise, rng))
+
+    # the ideal move, from the circuit with nominal resistor values (as `Shannon` plays)
+    nominal = perturbed_voltages(M, states, *(np.ones_like(r[:1]) for r in resistors))[0]
+    ideal_diffs = np.abs(nominal[layout.u] - nominal[layout.v])
+    best = ideal_diffs[states == OPEN].max()
+    open_moves = sorted(np.flatnonzero(states == OPEN), key=lambda i: _top_left_order(layout.moves[i]))
+    ideal = next(i for i in open_moves if ideal_diffs[i] >= best - NumpySolver.tolerance)
+
+    differs = chosen != ideal
+    worse = ideal_diffs[chosen] < best - NumpySolver.tolerance
+    played, counts = np.unique(chosen, return_counts=True)
+    result = PositionResult(
+        list(moves),
+        layout.moves[ideal],
+        differs.mean(),
+        worse.mean(),
+        {layout.moves[i]: int(count) for i, count in zip(played, counts)},
+    )
+    return result, differs, worse
+
+def simulate_game(M, moves, samples=1000, hardware=Hardware(), seed=None):
+    """Simulate the machine playing CUT through a game, given its `moves` (where CUT's moves are the
+    ideal ones). Each simulated machine keeps the same resistors for the whole game.
+
+    Return a list of `PositionResult` for each position where CUT is to move, and the fraction of
+    machines that played a different move (and a worse move) somewhere in the game."""
+    rng = np.random.default_rng(seed)
+    resistors = sample_resistors(M, samples, hardware, rng)
+    results = []
+    any_differs = np.zeros(samples, dtype=bool)
+    any_worse = np.zeros(samples, dtype=bool)
+    for i in range(0, len(moves), 2):
+        result, differs, worse = simulate_position(M, moves[:i], resistors, hardware, rng)
+        results.append(result)
+        any_differs |= differs
+        any_worse |= worse
+    return results, any_differs.mean(), any_worse.mean()
+
+def shannon_games(M, games, seed=0):
+    """Return the moves of games between Shannon (as CUT) and a random SHORT player."""
+    import random
+
+    random.seed(seed)
+    shannon = Shannon(solver=NumpySolver())
+    all_moves = []
+    for _ in range(games):
+        board = CompactBirdCage(M)
+        while True:
+            board.move(shannon.play(board))
+            if board.white_has_won():
+                break
+            board.move(Random().play(board))
+            if board.black_has_won():
+                break
+        all_moves.append(board.moves)
+    return all_moves
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate resistor tolerance and ADC quantization in Shannon's machine.")
+    parser.add_argument("--M", type=int, default=4, help="board size")
+    parser.add_argument("--games", type=int, default=20, help="number of games against a random SHORT player")
+    parser.add_argument("--samples", type=int, default=10000, help="number of simulated machines")
+    parser.add_argument("--bits", type=int, default=10, help="ADC resolution in bits")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="tolerance of the bird cage resistors")
+    parser.add_argument("--pull-up-tolerance", type=float, default=0.0, help="tolerance of the pull-up resistors")
+    parser.add_argument("--noise", type=float, default=0.0, help="standard deviation of ADC noise, in steps")
+    parser.add_argument("--distribution", default="uniform", choices=["uniform", "normal"])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    hardware = Hardware(
+        bits=args.bits,
+        tolerance=args.tolerance,
+        pull_up_tolerance=args.pull_up_tolerance,
+        series_tolerance=args.tolerance,
+        noise=args.noise,
+        distribution=args.distribution,
+    )
+    positions = []
+    for game, moves in enumerate(shannon_games(args.M, args.games, args.seed)):
+        results, differs, worse = simulate_game(args.M, moves, args.samples, hardware, seed=args.seed + game)
+        print(f"game {game}: {display_moves(moves)}")
+        print(f"  machines that played a different move: {differs:.2%}, a worse move: {worse:.2%}")
+        positions.extend(results)
+    print()
+    print("positions where the machine differs most often:")
+    for result in sorted(positions, key=lambda result: -result.differs)[:5]:
+        print(f"  {display_moves(result.moves) or '(start)'}: ideal {result.ideal}, "
+              f"differs {result.differs:.2%}, worse {result.worse:.2%}, moves {result.counts}")
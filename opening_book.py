@@ -0,0 +1,279 @@
+"""An opening book of Shannon's moves, so the first few moves of a game don't need a circuit solve.
+
+The book holds every position that CUT can face in the first few plies when Shannon plays CUT
+against any SHORT replies, along with Shannon's ranking of the moves in it. Positions are stored
+in a binary file that is memory-mapped when it is read, so opening a book is instant whatever its
+size. The file starts with a 16 byte header (all integers are little-endian):
+
+    magic      4 bytes   b"BCBK"
+    version    uint8     1
+    M          uint8     the board size
+    extra      uint8     1 if the book was built with `use_extra_resistors`
+    k          uint8     the number of ranked moves in each record
+    plies      uint32    the book holds positions with fewer than this many moves played
+    count      uint32    the number of records
+
+followed by `count` records, sorted by key, each of which is:
+
+    key        uint64    the position key (see `position_key`) of the canonical form of the position
+    moves      k uint8   the best `k` moves (indexes in `valid_moves` order, in the canonical
+                         orientation), in Shannon's order, or 255 if there are fewer than `k` open moves
+    ranks      k uint8   the rank of each move, where moves with the same rank are tied
+    diffs      k uint16  the voltage difference across each move, in units of 1/65535 V
+
+Since positions are stored in their canonical orientation (see `canonical_form`), a move that is
+tied with others may be in a different place in Shannon's (top-left first) order once it is
+translated back to the orientation of the board, so ties are stored as ranks and broken on lookup.
+
+    python opening_book.py build --M 4 --plies 6 book4.bin
+    python opening_book.py export book4.bin opening_book.h
+"""
+
+import argparse
+import struct
+
+import numpy as np
+
+from birdcage import *
+from birdcage import _layout, _order_voltage_diffs, _top_left_moves, _top_left_order
+
+MAGIC = b"BCBK"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBBII")
+NO_MOVE = 255
+DIFF_SCALE = 65535
+
+def _record_dtype(k):
+    return np.dtype([("key", "<u8"), ("moves", "u1", (k,)), ("ranks", "u1", (k,)), ("diffs", "<u2", (k,))])
+
+# the largest board an opening book can be built for, since each position's key must fit in 64 bits
+MAX_M = 4
+
+def position_key(cuts, shorts, n):
+    """Return the 64-bit key of the position with bitboards `cuts` and `shorts`, on a board with `n` moves.
+
+    This is `cuts | shorts << n`, which is unique, but only fits in 64 bits for boards with up to 32
+    moves (so up to M=4). `ValueError` is raised for bigger boards."""
+    if n > 32:
+        raise ValueError(f"Position keys only fit in 64 bits for boards with up to 32 moves, not {n}")
+    return cuts | shorts << n
+
+def _check_size(M):
+    if not 1 <= M <= MAX_M:
+        raise ValueError(f"Opening books are only supported for M=1 to M={MAX_M}, not M={M}")
+
+def _canonical_key(board):
+    (cuts, shorts), translation = canonical_form(board)
+    return position_key(cuts, shorts, len(_layout(board.M).moves)), translation
+
+def book_positions(M=3, plies=4, use_extra_resistors=True):
+    """Generate every position that CUT can face with fewer than `plies` moves played, when Shannon plays
+    CUT against any SHORT replies, along with Shannon's voltage diffs for it.
+
+    Positions are generated a ply at a time, as pairs of a `CompactBirdCage` board and a dictionary of
+    voltage diffs, keyed by move, in Shannon's order."""
+    frontier = {(0, 0): CompactBirdCage(M)}
+    layout = _layout(M)
+    while frontier:
+        boards = list(frontier.values())
+        diffs = batch_voltage_diffs(np.stack([board.states() for board in boards]), M, use_extra_resistors)
+        frontier = {}
+        for board, row in zip(boards, diffs):
+            ordered = _order_voltage_diffs(
+                {
+                    move: float(row[layout.move_index[move]])
+                    for move in _top_left_moves(M)
+                    if board.state(move) == OPEN
+                },
+                NumpySolver.tolerance,
+            )
+            yield board, ordered
+            if len(board.moves) + 2 >= plies:
+                continue
+            board.move(next(iter(ordered)))
+            if not board.white_has_won():
+                for move in layout.moves:
+                    if board.state(move) != OPEN:
+                        continue
+                    board.move(move)
+                    key = (board.cuts, board.shorts)
+                    if not board.black_has_won() and key not in frontier:
+                        frontier[key] = board.copy()
+                    board.undo()
+            board.undo()
+
+def _ranks(diffs, tolerance):
+    """Return the rank of each of a list of decreasing `diffs`, where diffs within `tolerance` of the
+    first of a run share its rank (as for `_order_voltage_diffs`)."""
+    ranks = []
+    for i, v in enumerate(diffs):
+        if i == 0 or diffs[ranks[-1]] - v > tolerance:
+            ranks.append(i)
+        else:
+            ranks.append(ranks[-1])
+    return ranks
+
+def build_book(path, M=3, plies=4, k=8, use_extra_resistors=True):
+    """Build an opening book for boards of size `M` (see `book_positions`), store the best `k` moves for
+    each position, and write it to `path`. Return the number of positions in the book.
+
+    If the moves tied with the `k`th best would not fit, `k` is increased so that they do."""
+    _check_size(M)
+    layout = _layout(M)
+    entries = {}
+    for board, ordered in book_positions(M, plies, use_extra_resistors):
+        key, translation = _canonical_key(board)
+        if key in entries:
+            continue
+        to_canonical = {original: canonical for canonical, original in translation.items()}
+        moves = list(ordered)
+        diffs = list(ordered.values())
+        entries[key] = (
+            [layout.move_index[to_canonical[move]] for move in moves],
+            _ranks(diffs, NumpySolver.tolerance),
+            [round(v * DIFF_SCALE) for v in diffs],
+        )
+
+    # make room for every move tied with the kth
+    width = 1
+    for _, ranks, _ in entries.values():
+        end = min(k, len(ranks))
+        while end < len(ranks) and ranks[end] == ranks[end - 1]:
+            end += 1
+        width = max(width, end)
+
+    records = np.zeros(len(entries), dtype=_record_dtype(width))
+    records["moves"] = NO_MOVE
+    for i, key in enumerate(sorted(entries)):
+        moves, ranks, diffs = entries[key]
+        n = min(width, len(moves))
+        records[i]["key"] = key
+        records[i]["moves"][:n] = moves[:n]
+        records[i]["ranks"][:n] = ranks[:n]
+        records[i]["diffs"][:n] = diffs[:n]
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, M, int(use_extra_resistors), width, plies, len(records)))
+        f.write(records.tobytes())
+    return len(records)
+
+class OpeningBook:
+    """An opening book written by `build_book`, memory-mapped from `path`."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Not an opening book: {path}")
+        magic, version, self.M, extra, self.k, self.plies, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not an opening book: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported opening book version: {version}")
+        _check_size(self.M)
+        self.use_extra_resistors = bool(extra)
+        self.layout = _layout(self.M)
+        if count == 0:
+            self.records = np.zeros(0, dtype=_record_dtype(self.k))
+        else:
+            self.records = np.memmap(path, dtype=_record_dtype(self.k), mode="r", offset=HEADER.size, shape=(count,))
+
+    def __len__(self):
+        return len(self.records)
+
+    def lookup(self, board):
+        """Return a dictionary of Shannon's best moves on `board`, with their voltage diffs, in Shannon's order,
+        or None if the position is not in the book."""
+        if board.M != self.M or len(board.moves) >= self.plies or len(board.moves) % 2 == 1:
+            return None
+        key, translation = _canonical_key(board)
+        i = np.searchsorted(self.records["key"], key)
+        if i == len(self.records) or self.records["key"][i] != key:
+            return None
+        record = self.records[i]
+        ranked = [
+            (int(rank), translation[self.layout.moves[move]], int(diff) / DIFF_SCALE)
+            for move, rank, diff in zip(record["moves"], record["ranks"], record["diffs"])
+            if move != NO_MOVE
+        ]
+        ranked.sort(key=lambda item: (item[0], _top_left_order(item[1])))
+        return {move: diff for _, move, diff in ranked}
+
+    def move(self, board):
+        """Return Shannon's move on `board`, or None if the position is not in the book."""
+        ranked = self.lookup(board)
+        return next(iter(ranked)) if ranked else None
+
+class BookPlayer:
+    """A player that plays from an opening book, and falls back to another player (Shannon, by default)
+    for positions that aren't in it. A fallback Shannon must use the extra resistors if the book does."""
+
+    def __init__(self, book, player=None):
+        self.book = book if isinstance(book, OpeningBook) else OpeningBook(book)
+        if player is None:
+            player = Shannon(use_extra_resistors=self.book.use_extra_resistors)
+        elif getattr(player, "use_extra_resistors", self.book.use_extra_resistors) != self.book.use_extra_resistors:
+            raise ValueError(
+                f"The book was built with use_extra_resistors={self.book.use_extra_resistors}, "
+                f"but {player!r} has use_extra_resistors={player.use_extra_resistors}"
+            )
+        self.player = player
+        self.hits = 0
+        self.misses = 0
+
+    def play(self, board):
+        move = None if isinstance(board, SwitchingGame) else self.book.move(board)
+        if move is not None:
+            self.hits += 1
+            return move
+        self.misses += 1
+        return self.player.play(board)
+
+    def __repr__(self):
+        return f"BookPlayer({self.player!r})"
+
+def export_c(book_path, out, name="opening_book"):
+    """Write the opening book in `book_path` to `out` as a C header, with the bytes of the file (in the
+    same format) in a `PROGMEM` array called `name`, for the Arduino sketch."""
+    with open(book_path, "rb") as f:
+        data = f.read()
+    book = OpeningBook(book_path)
+    prefix = name.upper()
+    lines = [
+        f"// Opening book for M={book.M}, generated by opening_book.py (see there for the format)",
+        "#include <avr/pgmspace.h>",
+        "",
+        f"#define {prefix}_M {book.M}",
+        f"#define {prefix}_K {book.k}",
+        f"#define {prefix}_PLIES {book.plies}",
+        f"#define {prefix}_COUNT {len(book)}",
+        f"#define {prefix}_HEADER_SIZE {HEADER.size}",
+        f"#define {prefix}_RECORD_SIZE {_record_dtype(book.k).itemsize}",
+        "",
+        f"const uint8_t {name}[{len(data)}] PROGMEM = {{",
+    ]
+    for start in range(0, len(data), 16):
+        lines.append("  " + ", ".join(f"0x{b:02x}" for b in data[start:start + 16]) + ",")
+    lines.append("};")
+    with open(out, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or export an opening book of Shannon's moves.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build an opening book")
+    build.add_argument("path", help="file to write the book to")
+    build.add_argument("--M", type=int, default=4, help="board size")
+    build.add_argument("--plies", type=int, default=6, help="include positions with fewer than this many moves played")
+    build.add_argument("-k", type=int, default=8, help="number of ranked moves to store for each position")
+    build.add_argument("--no-extra-resistors", action="store_true", help="build the book without the extra resistors")
+    export = subparsers.add_parser("export", help="export an opening book as a C header")
+    export.add_argument("path", help="opening book file")
+    export.add_argument("out", help="C header file to write")
+    export.add_argument("--name", default="opening_book", help="name of the C array")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_book(args.path, args.M, args.plies, args.k, not args.no_extra_resistors)
+        print(count, "positions")
+    else:
+        export_c(args.path, args.out, args.name)
@@ -1,4 +1,7 @@
+import itertools
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from birdcage import *
 
@@ -8,36 +11,91 @@ import warnings
 
 warnings.filterwarnings("ignore")
 
+class Screen:
+    """Draw text on the terminal from row `top` down, only writing the characters that have changed
+    since the last time it was drawn."""
+
+    def __init__(self, term, top=0):
+        self.term = term
+        self.top = top
+        self.lines = []
+
+    def draw(self, text):
+        out = []
+        lines = text.split("\n")
+        for y, line in enumerate(lines):
+            old = self.lines[y] if y < len(self.lines) else ""
+            x = 0
+            while x < len(line):
+                if x < len(old) and line[x] == old[x]:
+                    x += 1
+                    continue
+                # write the run of changed characters in one go
+                end = x + 1
+                while end < len(line) and (end >= len(old) or line[end] != old[end]):
+                    end += 1
+                out.append(self.term.move_xy(x, self.top + y) + line[x:end])
+                x = end
+            if len(old) > len(line):
+                out.append(self.term.move_xy(len(line), self.top + y) + " " * (len(old) - len(line)))
+        for y in range(len(lines), len(self.lines)):
+            out.append(self.term.move_xy(0, self.top + y) + " " * len(self.lines[y]))
+        self.lines = lines
+        print("".join(out), end="", flush=True)
+
+def think(executor, player, board, term, human=None, row=0):
+    """Work out `player`'s move on `board` on a worker thread, showing a spinner on `row` until it's done.
+    Meanwhile `human` (if any) can move their cursor around the board."""
+    future = executor.submit(player.play, board)
+    start = time.perf_counter()
+    with term.cbreak():
+        for spinner in itertools.cycle("|/-\\"):
+            if future.done():
+                break
+            elapsed = time.perf_counter() - start
+            print(term.move_xy(0, row) + f"{player} is thinking {spinner} {elapsed:.1f}s" + term.clear_eol, end="", flush=True)
+            val = term.inkey(timeout=0.1)
+            if val and human is not None:
+                human.handle_key(val, board) # moves can't be played until it's their turn
+    print(term.move_xy(0, row) + term.clear_eol, end="", flush=True)
+    return future.result()
+
 def play_interactive(board, player1, player2, term=None):
-    with term.fullscreen(), term.hidden_cursor():
+    players = (player1, player2)
+    human = next((player for player in players if isinstance(player, Human)), None)
+    screen = Screen(term, top=1)
+    with term.fullscreen(), term.hidden_cursor(), ThreadPoolExecutor(max_workers=1) as executor:
         print(term.move(0, 0) + "{} (W) - {} (B)".format(player1, player2))
-        print(term.move(1, 0) + str(board))
+        screen.draw(str(board))
+        status = 1 + len(screen.lines)
         while True:
-            if not isinstance(player1, Human) and not isinstance(player2, Human):
-                with term.cbreak(): # wait for key press
-                    inp = term.inkey()
-            move = player1.play(board)
-            board = board.move(move)
-            print(term.move(1, 0) + str(board))
-            if board.white_has_won():
-                print(f"{player1} wins")
-                break
-            if not isinstance(player1, Human) and not isinstance(player2, Human):
-                with term.cbreak(): # wait for key press
-                    inp = term.inkey()
-            move = player2.play(board)
+            side = len(board.moves) % 2
+            player = players[side]
+            if isinstance(player, Human):
+                move = player.play(board)
+                if move is None: # quit
+                    return
+            else:
+                if human is None:
+                    with term.cbreak(): # wait for key press
+                        inp = term.inkey()
+                move = think(executor, player, board, term, human, status)
             board = board.move(move)
-            print(term.move(1, 0) + str(board))
-            if board.black_has_won():
-                print(f"{player2} wins")
+            screen.draw(str(board))
+            if human is not None:
+                human.reverse_char(board) # the cursor may have been drawn over
+            if board.white_has_won() if side == 0 else board.black_has_won():
+                print(term.move_xy(0, status) + f"{player} wins", end="", flush=True)
                 break
         with term.cbreak(): # wait for key press
             inp = term.inkey()
 
 if __name__ == '__main__':
     M = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    # load the circuit solver while the board is drawn
+    prewarm()
     term = Terminal()
     board = BirdCage(M=M)
     player1 = Shannon()
     player2 = Human(term)
-    play_interactive(board, player1, player2, term=term)
\ No newline at end of file
+    play_interactive(board, player1, player2, term=term)
@@ -0,0 +1,319 @@
+"""Game-tree search over Bird Cage positions.
+
+`Search` runs a negamax search with alpha-beta pruning and iterative deepening, ordering moves by
+Shannon's voltage differences, and caching results in a transposition table keyed by Zobrist hashes
+of the position. Given enough depth it proves which side wins, and finds the winning line.
+"""
+
+import random
+import sys
+import time
+from collections import namedtuple
+
+from birdcage import CUT, OPEN, SHORT, CompactBirdCage, batch_voltage_diffs, display_moves, symmetries
+
+# a win for the side to move in n plies scores WIN - n, and a loss -(WIN - n)
+WIN = 10000
+# scores beyond this are proven wins (or losses)
+PROVEN = WIN - 1000
+
+# transposition table bound types
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# the result of a search: the score for the side to move, the best move and principal variation,
+# the depth searched, and statistics
+SearchResult = namedtuple(
+    "SearchResult",
+    ["score", "move", "pv", "depth", "nodes", "seconds", "table_probes", "table_hits"],
+)
+
+def winner(result, board):
+    """Return "CUT" or "SHORT" if `result` proves that side wins from `board`, or None if it is unknown."""
+    if abs(result.score) < PROVEN:
+        return None
+    cut_to_move = len(board.moves) % 2 == 0
+    return "CUT" if (result.score > 0) == cut_to_move else "SHORT"
+
+def report(result):
+    """Return a one-line summary of a `SearchResult`."""
+    nps = result.nodes / result.seconds if result.seconds > 0 else 0
+    hit_rate = result.table_hits / result.table_probes if result.table_probes else 0
+    if abs(result.score) >= PROVEN:
+        outcome = f"{'win' if result.score > 0 else 'loss'} in {WIN - abs(result.score)}"
+    else:
+        outcome = f"unknown (score {result.score})"
+    return (
+        f"depth {result.depth}: {outcome}, best {result.move}, pv {display_moves(result.pv)}, "
+        f"{result.nodes} nodes in {result.seconds:.2f}s ({nps:.0f} nodes/s), table hit rate {hit_rate:.1%}"
+    )
+
+class TranspositionTable:
+    """A fixed-size transposition table, indexed by the low bits of a Zobrist hash.
+
+    Each slot holds (hash, depth, bound type, score, best move). When two positions share a slot,
+    the one searched to the greater depth is kept."""
+
+    def __init__(self, size=1 << 20):
+        self.size = 1 << max(size - 1, 1).bit_length() # round up to a power of two
+        self.mask = self.size - 1
+        self.entries = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+
+    def probe(self, h):
+        """Return the entry for hash `h`, or None."""
+        self.probes += 1
+        entry = self.entries[h & self.mask]
+        if entry is not None and entry[0] == h:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, h, depth, bound, score, move):
+        slot = h & self.mask
+        entry = self.entries[slot]
+        if entry is None or entry[0] != h or depth >= entry[1]:
+            self.entries[slot] = (h, depth, bound, score, move)
+
+    def __len__(self):
+        return sum(entry is not None for entry in self.entries)
+
+class _Timeout(Exception):
+    pass
+
+class Search:
+    """Negamax search with alpha-beta pruning over positions on a board of size `M`.
+
+    Moves are ordered by the transposition table's best move, then by Shannon's voltage differences
+    (largest first) at nodes with at least `order_depth` plies left to search, or by a history
+    heuristic nearer the leaves. The transposition table holds `table_size` entries, and is kept
+    between searches.
+
+    If `symmetric` is set then positions are stored in the transposition table under their
+    canonical hash (the smallest over the board's symmetries, see `birdcage.symmetries`), so
+    reflections of a position share an entry, and the entry's best move is translated back."""
+
+    def __init__(self, M=3, table_size=1 << 20, order_depth=3, use_extra_resistors=True, seed=0, symmetric=True):
+        self.M = M
+        self.order_depth = order_depth
+        self.use_extra_resistors = use_extra_resistors
+        self.table = TranspositionTable(table_size)
+        board = CompactBirdCage(M)
+        self.layout = board.layout
+        n = len(self.layout.moves)
+        rng = random.Random(seed)
+        # a random key for each move being CUT or SHORT
+        self.keys = {CUT: [rng.getrandbits(64) for _ in range(n)], SHORT: [rng.getrandbits(64) for _ in range(n)]}
+        self.history = [0] * n
+        self.nodes = 0
+        self.symmetries = symmetries(M, top_bottom=True) if symmetric else symmetries(M)[:1]
+
+    def hash(self, board):
+        """Return the Zobrist hash of the position on `board`, which doesn't depend on the move order
+        (or, if `symmetric` is set, on the orientation of the board)."""
+        return min(self._hashes(board))
+
+    def _hashes(self, board):
+        """Return the Zobrist hashes of each symmetric equivalent of the position on `board`."""
+        hashes = []
+        for perm in self.symmetries:
+            h = 0
+            for i in range(len(self.layout.moves)):
+                if board.cuts >> i & 1:
+                    h ^= self.keys[CUT][perm[i]]
+                elif board.shorts >> i & 1:
+                    h ^= self.keys[SHORT][perm[i]]
+            hashes.append(h)
+        return tuple(hashes)
+
+    def _child_hashes(self, hashes, kind, i):
+        """Return the hashes of the position after playing move `i`, given the hashes before it."""
+        keys = self.keys[kind]
+        return tuple(h ^ keys[perm[i]] for h, perm in zip(hashes, self.symmetries))
+
+    def search(self, board, max_depth=None, time_limit=None):
+        """Search the position on `board` with iterative deepening, and return a `SearchResult`.
+
+        The search stops once the result is proven, `max_depth` plies have been searched, or
+        `time_limit` seconds have passed (in which case the deepest completed search is returned)."""
+        board = CompactBirdCage(board.M, board.moves)
+        remaining = len(self.layout.moves) - len(board.moves)
+        max_depth = remaining if max_depth is None else min(max_depth, remaining)
+        start = time.perf_counter()
+        self.deadline = None if time_limit is None else start + time_limit
+        self.nodes = 0
+        self.table.probes = self.table.hits = 0
+        result = None
+        hashes = self._hashes(board)
+        recursion_limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(recursion_limit, 4 * remaining + 100))
+        try:
+            for depth in range(1, max_depth + 1):
+                try:
+                    score = self._negamax(board, hashes, depth, -WIN, WIN)
+                except _Timeout:
+                    break
+                seconds = time.perf_counter() - start
+                probes, hits = self.table.probes, self.table.hits
+                pv = self._pv(board, hashes)
+                result = SearchResult(score, pv[0] if pv else None, pv, depth, self.nodes, seconds, probes, hits)
+                if abs(score) >= PROVEN:
+                    break
+        finally:
+            sys.setrecursionlimit(recursion_limit)
+        if result is None: # ran out of time before completing depth 1
+            result = SearchResult(0, None, [], 0, self.nodes, time.perf_counter() - start, self.table.probes, self.table.hits)
+        return result
+
+    def _negamax(self, board, hashes, depth, alpha, beta):
+        """Return the score of the position for the side to move, searching `depth` plies."""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 1024 == 0 and time.perf_counter() > self.deadline:
+            raise _Timeout()
+
+        original_alpha = alpha
+        # moves are stored in the table in the orientation of the canonical hash
+        h = min(hashes)
+        perm = self.symmetries[hashes.index(h)]
+        tt_move = None
+        entry = self.table.probe(h)
+        if entry is not None:
+            _, entry_depth, bound, score, tt_move = entry
+            if tt_move is not None:
+                tt_move = perm[tt_move]
+            # proven wins and losses hold at any depth
+            if entry_depth >= depth or abs(score) >= PROVEN:
+                if bound == EXACT:
+                    return score
+                if bound == LOWER and (entry_depth >= depth or score >= PROVEN):
+                    alpha = max(alpha, score)
+                elif bound == UPPER and (entry_depth >= depth or score <= -PROVEN):
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+
+        cut = len(board.moves) % 2 == 0
+        kind = CUT if cut else SHORT
+        cut_wins, short_wins, live = self._classify(board)
+        wins, threats = (cut_wins, short_wins) if cut else (short_wins, cut_wins)
+        if wins:
+            self.table.store(h, depth, EXACT, WIN - 1, perm[wins[0]])
+            return WIN - 1
+        if len(threats) > 1:
+            # only one of the opponent's winning moves can be blocked
+            self.table.store(h, depth, EXACT, -(WIN - 2), perm[threats[0]])
+            return -(WIN - 2)
+
+        if depth == 0:
+            return 0
+
+        if threats:
+            moves = threats # the only move that doesn't lose straight away
+        else:
+            moves = self._order_moves(board, depth, tt_move, live)
+        best_score = -WIN
+        best_move = None
+        for i in moves:
+            board.move(self.layout.moves[i])
+            score = -self._negamax(board, self._child_hashes(hashes, kind, i), depth - 1, -beta, -alpha)
+            # a win (or loss) is one ply further away from this position
+            if score >= PROVEN:
+                score -= 1
+            elif score <= -PROVEN:
+                score += 1
+            board.undo()
+            if score > best_score:
+                best_score = score
+                best_move = i
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.history[i] += depth * depth
+                break
+
+        if best_score <= original_alpha:
+            bound = UPPER
+        elif best_score >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.table.store(h, depth, bound, best_score, None if best_move is None else perm[best_move])
+        return best_score
+
+    def _classify(self, board):
+        """Return lists of the open moves that win for CUT, that win for SHORT, and that are live.
+
+        A move is dead if both its ends have already been joined by SHORT, or the faces either side
+        of it have already been joined by CUT. Playing a dead move is the same as passing, which can
+        never be better than playing a live move, so dead moves need not be searched."""
+        layout = self.layout
+        short_sets, cut_sets = board.short_sets, board.cut_sets
+        top, bottom = short_sets.find(layout.top), short_sets.find(layout.bottom)
+        left, right = cut_sets.find((0, 1)), cut_sets.find((2 * self.M, 1))
+        cut_wins, short_wins, live = [], [], []
+        open_moves = ~(board.cuts | board.shorts)
+        for i in range(len(layout.moves)):
+            if not open_moves >> i & 1:
+                continue
+            u, v = layout.edges[i]
+            u, v = short_sets.find(u), short_sets.find(v)
+            a, b = layout.dual_edges[i]
+            a, b = cut_sets.find(a), cut_sets.find(b)
+            if (u == top and v == bottom) or (u == bottom and v == top):
+                short_wins.append(i)
+            if (a == left and b == right) or (a == right and b == left):
+                cut_wins.append(i)
+            if u != v and a != b:
+                live.append(i)
+        if not live: # all moves are dead
+            live = [i for i in range(len(layout.moves)) if open_moves >> i & 1]
+        return cut_wins, short_wins, live
+
+    def _order_moves(self, board, depth, tt_move, moves):
+        """Return the indices of `moves`, in the order to search them."""
+        if depth >= self.order_depth:
+            diffs = batch_voltage_diffs(board.states()[None, :], self.M, self.use_extra_resistors)[0]
+            moves.sort(key=lambda i: -diffs[i])
+        else:
+            moves.sort(key=lambda i: -self.history[i])
+        if tt_move is not None and tt_move in moves:
+            moves.remove(tt_move)
+            moves.insert(0, tt_move)
+        return moves
+
+    def _pv(self, board, hashes):
+        """Return the principal variation, by following the best moves in the transposition table.
+
+        Past the end of the table's entries, the line is finished with immediate wins and forced blocks."""
+        pv = []
+        board = board.copy()
+        while not (board.white_has_won() or board.black_has_won()):
+            cut = len(board.moves) % 2 == 0
+            cut_wins, short_wins, _ = self._classify(board)
+            wins, threats = (cut_wins, short_wins) if cut else (short_wins, cut_wins)
+            h = min(hashes)
+            entry = self.table.probe(h)
+            if wins:
+                i = wins[0]
+            elif entry is not None and entry[4] is not None:
+                i = self.symmetries[hashes.index(h)][entry[4]]
+            elif threats:
+                i = threats[0]
+            else:
+                break
+            move = self.layout.moves[i]
+            if board.state(move) != OPEN:
+                break
+            board.move(move)
+            pv.append(move)
+            hashes = self._child_hashes(hashes, CUT if cut else SHORT, i)
+        return pv
+
+if __name__ == "__main__":
+    # Search a position given on the command line, e.g. python search.py 3 A5 c5 C3 a1 B4
+    M = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    board = CompactBirdCage(M, sys.argv[2:])
+    print(board)
+    search = Search(M)
+    result = search.search(board)
+    print(report(result))
+    print("winner", winner(result, board))
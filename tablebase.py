@@ -0,0 +1,267 @@
+"""An endgame tablebase: the result of perfect play from every legal Bird Cage position.
+
+Every edge is OPEN, CUT or SHORT, and CUT moves first, so in a legal position with `p` moves
+played, `ceil(p / 2)` of them are CUT. Positions are numbered with a perfect hash that has no gaps:
+first by the number of moves played, then by which edges have been played, then by which of those
+were CUT (the last two using the combinatorial number system). Each position's value is one signed
+byte: positive if CUT wins with perfect play, negative if SHORT does, where the magnitude is one more
+than the number of plies until the game ends (a win as quickly as possible, or a loss as slowly as
+possible), so 1 or -1 means the game has already been won. Values are found by retrograde analysis,
+a ply at a time from the full board back to the empty one, since every move fills one more edge.
+
+The file is a 16 byte header (the magic bytes b"BCTB", a version byte, M, the number of moves on the
+board, a padding byte and the number of positions as a little-endian uint64) followed by the values,
+and it is memory-mapped when it is read, so a probe is a single array lookup.
+
+There are 414,584 legal positions for M=3, which take a few seconds to solve. For M=4 there are about
+1.6 * 10^11, which would need a 160GB table, so tablebases with more than `MAX_POSITIONS` positions
+are refused.
+
+    python tablebase.py build --M 3 tablebase3.bin
+    python tablebase.py analyse tablebase3.bin A1 c1 C3 a5 B2 e3 E5 d4 D2 e1 B4 c5
+"""
+
+import argparse
+import struct
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+import numpy as np
+
+from birdcage import *
+from birdcage import _layout, _top_left_order
+
+MAGIC = b"BCTB"
+VERSION = 1
+HEADER = struct.Struct("<4sBBBxQ")
+# the largest tablebase that will be built, in positions (one byte each)
+MAX_POSITIONS = 1 << 32
+
+# a move that changed the result of a game with perfect play: the ply (from 1), the move, and
+# the value (see `Tablebase.value`) of the position before and after it
+Mistake = namedtuple("Mistake", ["ply", "move", "before", "after"])
+
+@lru_cache(maxsize=None)
+def _tables(n):
+    """Return the binomial coefficients C(i, k) for 0 <= i, k <= n, and the index of the first
+    position with each number of moves played (with an extra entry for the total)."""
+    binom = np.array([[comb(i, k) for k in range(n + 2)] for i in range(n + 1)], dtype=np.int64)
+    sizes = [comb(n, p) * comb(p, (p + 1) // 2) for p in range(n + 1)]
+    return binom, np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+def position_count(M):
+    """Return the number of legal positions on a board of size `M`."""
+    n = len(_layout(M).moves)
+    return int(_tables(n)[1][-1])
+
+def position_index(cuts, shorts, n):
+    """Return the index of each position given by arrays of `cuts` and `shorts` bitboards (as in
+    `CompactBirdCage`), on a board with `n` moves. This is a perfect hash of legal positions."""
+    binom, offsets = _tables(n)
+    cuts = np.asarray(cuts, dtype=np.int64)
+    played = cuts | np.asarray(shorts, dtype=np.int64)
+    count = np.zeros(played.shape, dtype=np.int64) # moves played so far
+    cut_count = np.zeros(played.shape, dtype=np.int64)
+    played_rank = np.zeros(played.shape, dtype=np.int64)
+    cut_rank = np.zeros(played.shape, dtype=np.int64)
+    for i in range(n):
+        bit = (played >> i) & 1
+        cut = (cuts >> i) & 1
+        count += bit
+        cut_count += cut
+        played_rank += bit * binom[i, count]
+        cut_rank += cut * binom[count - 1, cut_count]
+    if np.any(cut_count != (count + 1) // 2):
+        raise ValueError("Not a legal position: CUT must have made half the moves (rounding up)")
+    return offsets[count] + played_rank * binom[count, cut_count] + cut_rank
+
+def _has_won(states, layout, passable):
+    """Return whether the top and bottom of the board are joined by edges whose state is in `passable`."""
+    ok = np.isin(states, passable)
+    reach = np.zeros((len(states), len(layout.nodes)), dtype=bool)
+    reach[:, layout.top] = True
+    while True:
+        before = reach.sum()
+        for e in range(len(layout.moves)):
+            u, v = layout.u[e], layout.v[e]
+            joined = ok[:, e] & (reach[:, u] | reach[:, v])
+            reach[:, u] |= joined
+            reach[:, v] |= joined
+        if reach.sum() == before:
+            return reach[:, layout.bottom]
+
+def _layer(n, p):
+    """Return the `cuts` and `shorts` bitboards of every legal position with `p` moves played."""
+    cut_subsets = list(combinations(range(p), (p + 1) // 2))
+    cuts, shorts = [], []
+    for played in combinations(range(n), p):
+        bits = [1 << i for i in played]
+        total = sum(bits)
+        for subset in cut_subsets:
+            c = sum(bits[j] for j in subset)
+            cuts.append(c)
+            shorts.append(total ^ c)
+    return np.array(cuts, dtype=np.int64), np.array(shorts, dtype=np.int64)
+
+def build_tablebase(path, M=3):
+    """Solve every legal position on a board of size `M` by retrograde analysis, and write the tablebase to `path`."""
+    if M < 1:
+        raise ValueError(f"Invalid board size: {M}")
+    count = position_count(M)
+    if count > MAX_POSITIONS:
+        raise ValueError(f"A tablebase for M={M} would have {count:,} positions, more than the limit of {MAX_POSITIONS:,}")
+    layout = _layout(M)
+    n = len(layout.moves)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, M, n, count))
+    values = np.memmap(path, dtype=np.int8, mode="r+", offset=HEADER.size, shape=(count,))
+    bits = np.int64(1) << np.arange(n, dtype=np.int64)
+    for p in range(n, -1, -1):
+        cuts, shorts = _layer(n, p)
+        states = np.where((cuts[:, None] & bits) != 0, CUT, np.where((shorts[:, None] & bits) != 0, SHORT, OPEN))
+        value = np.zeros(len(cuts), dtype=np.int8)
+        value[~_has_won(states, layout, [OPEN, SHORT])] = 1 # CUT has won
+        value[_has_won(states, layout, [SHORT])] = -1 # SHORT has won
+        live = np.flatnonzero(value == 0)
+        if len(live):
+            # the value of each move, from the point of view of the side to move
+            side = 1 if p % 2 == 0 else -1
+            best = np.full(len(live), -1, dtype=np.int64)
+            best_value = np.zeros(len(live), dtype=np.int64)
+            for e in range(n):
+                open_edge = states[live, e] == OPEN
+                if not open_edge.any():
+                    continue
+                i = live[open_edge]
+                if side == 1:
+                    child = position_index(cuts[i] | bits[e], shorts[i], n)
+                else:
+                    child = position_index(cuts[i], shorts[i] | bits[e], n)
+                child_value = values[child].astype(np.int64)
+                w = side * child_value
+                # win as quickly as possible, or lose as slowly as possible
+                score = np.where(w > 0, 1000 - w, -w)
+                better = score > best[open_edge]
+                best[open_edge] = np.where(better, score, best[open_edge])
+                best_value[open_edge] = np.where(better, child_value, best_value[open_edge])
+            value[live] = best_value + np.sign(best_value)
+        values[position_index(cuts, shorts, n)] = value
+    values.flush()
+    return count
+
+class Tablebase:
+    """A tablebase written by `build_tablebase`, memory-mapped from `path`."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Not a tablebase: {path}")
+        magic, version, self.M, self.n, count = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not a tablebase: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported tablebase version: {version}")
+        self.layout = _layout(self.M)
+        self.values = np.memmap(path, dtype=np.int8, mode="r", offset=HEADER.size, shape=(count,))
+
+    def __len__(self):
+        return len(self.values)
+
+    def _index(self, cuts, shorts):
+        return int(position_index(np.int64(cuts), np.int64(shorts), self.n))
+
+    def _board(self, board):
+        if board.M != self.M:
+            raise ValueError(f"Tablebase is for M={self.M}, not M={board.M}")
+        return board if isinstance(board, CompactBirdCage) else CompactBirdCage(board.M, board.moves)
+
+    def value(self, board):
+        """Return the value of the position on `board`: positive if CUT wins with perfect play and negative
+        if SHORT does, where the magnitude is one more than the number of plies left."""
+        board = self._board(board)
+        return int(self.values[self._index(board.cuts, board.shorts)])
+
+    def winner(self, board):
+        """Return the side ("CUT" or "SHORT") that wins from `board` with perfect play."""
+        return "CUT" if self.value(board) > 0 else "SHORT"
+
+    def distance(self, board):
+        """Return the number of plies until the game ends from `board`, with perfect play."""
+        return abs(self.value(board)) - 1
+
+    def move_values(self, board):
+        """Return a dictionary of the value of the position after each open move on `board`."""
+        board = self._board(board)
+        cut = len(board.moves) % 2 == 0
+        values = {}
+        for i, move in enumerate(self.layout.moves):
+            bit = 1 << i
+            if (board.cuts | board.shorts) & bit:
+                continue
+            if cut:
+                values[move] = int(self.values[self._index(board.cuts | bit, board.shorts)])
+            else:
+                values[move] = int(self.values[self._index(board.cuts, board.shorts | bit)])
+        return values
+
+    def best_moves(self, board):
+        """Return the moves on `board` that keep its value (winning as quickly, or losing as slowly, as
+        possible), from top-left to bottom-right."""
+        value = self.value(board)
+        target = value - 1 if value > 0 else value + 1
+        return sorted((move for move, v in self.move_values(board).items() if v == target), key=_top_left_order)
+
+    def mistakes(self, moves):
+        """Return the moves in a game that threw away a win (see `Mistake`)."""
+        board = CompactBirdCage(self.M)
+        result = []
+        for ply, move in enumerate(moves, 1):
+            before = self.value(board)
+            board.move(move)
+            after = self.value(board)
+            if (before > 0) != (after > 0):
+                result.append(Mistake(ply, move.upper(), before, after))
+        return result
+
+class TablebasePlayer:
+    """A player that plays perfectly using a tablebase, winning as quickly as possible (or losing as
+    slowly as possible), choosing the move nearest the top-left if there is more than one."""
+
+    def __init__(self, tablebase):
+        self.tablebase = tablebase if isinstance(tablebase, Tablebase) else Tablebase(tablebase)
+
+    def play(self, board):
+        moves = self.tablebase.best_moves(board)
+        if not moves:
+            raise ValueError("The game is already over")
+        return moves[0]
+
+    def __repr__(self):
+        return "TablebasePlayer"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query a Bird Cage tablebase.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="build a tablebase")
+    build.add_argument("path", help="file to write the tablebase to")
+    build.add_argument("--M", type=int, default=3, help="board size")
+    analyse = subparsers.add_parser("analyse", help="find the mistakes in a game")
+    analyse.add_argument("path", help="tablebase file")
+    analyse.add_argument("moves", nargs="*", help="moves of the game")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(build_tablebase(args.path, args.M), "positions")
+    else:
+        tablebase = Tablebase(args.path)
+        board = CompactBirdCage(tablebase.M)
+        print(f"start: {tablebase.winner(board)} wins in {tablebase.distance(board)} plies")
+        for mistake in tablebase.mistakes(args.moves):
+            side = "CUT" if mistake.ply % 2 == 1 else "SHORT"
+            print(
+                f"ply {mistake.ply}: {side} played {mistake.move}, which loses "
+                f"(best was {', '.join(tablebase.best_moves(CompactBirdCage(tablebase.M, args.moves[:mistake.ply - 1])))})"
+            )
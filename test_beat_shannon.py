@@ -0,0 +1,37 @@
+from birdcage import *
+from beat_shannon import *
+
+def _replay(M, line, use_extra_resistors=True):
+    """Play SHORT's moves in `line` against Shannon, and return the game."""
+    shannon = Shannon(use_extra_resistors=use_extra_resistors, solver=ExactSolver())
+    board = CompactBirdCage(M)
+    for i, move in enumerate(line):
+        if i % 2 == 0:
+            assert shannon.play(board) == move
+        board.move(move)
+    return board
+
+def test_find_wins_M3():
+    wins = find_wins(3, workers=1)
+    assert wins.first_move == "A1"
+    lines = list(winning_lines(wins))
+    assert len(lines) == count_lines(wins) == 2
+    for line in lines:
+        board = _replay(3, line)
+        assert board.black_has_won()
+    assert [display_moves(line) for line in winning_lines(wins, shortest=True)] == [
+        "A1, c1, C3, a5, B2, e3, E5, d4, D2, e1, C5, b4",
+        "A1, c1, C3, e3, E5, a5, B2, d4, D2, e1, C5, b4",
+    ]
+
+def test_find_wins_without_extra_resistors():
+    wins = find_wins(3, use_extra_resistors=False, workers=1)
+    for line in winning_lines(wins):
+        assert _replay(3, line, use_extra_resistors=False).black_has_won()
+
+def test_find_wins_max_plies():
+    assert count_lines(find_wins(3, max_plies=10, workers=1)) == 0
+    assert count_lines(find_wins(3, max_plies=12, workers=1)) == 2
+
+def test_find_wins_parallel():
+    assert find_wins(3, workers=2) == find_wins(3, workers=1)
@@ -0,0 +1,25 @@
+from benchmark import *
+
+def test_run_benchmarks():
+    results = run_benchmarks("CompactBirdCage.move", sizes=[3, 4], repeat=1, min_time=0.001)
+    assert list(results) == ["CompactBirdCage.move[M=3]", "CompactBirdCage.move[M=4]"]
+    assert all(seconds > 0 for seconds in results.values())
+
+def test_history(tmp_path):
+    path = tmp_path / "benchmarks.json"
+    history = load_history(path)
+    assert history == []
+    history.append(make_run({"a[M=3]": 1.0, "b[M=3]": 1.0}))
+    history.append(make_run({"a[M=3]": 2.0}))
+    save_history(path, history)
+    history = load_history(path)
+    assert len(history) == 2
+
+    rows, regressions = compare(make_run({"a[M=3]": 2.1, "b[M=3]": 1.5, "c[M=3]": 1.0}), history)
+    # a is compared with the latest run, b with the first
+    assert [(name, before) for name, before, _, _ in rows] == [("a[M=3]", 2.0), ("b[M=3]", 1.0)]
+    assert regressions == ["b[M=3]"]
+
+    other = make_run({"a[M=3]": 10.0})
+    other["machine"] = "elsewhere"
+    assert compare(other, history) == ([], [])
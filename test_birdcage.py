@@ -1,5 +1,13 @@
 from birdcage import *
-from birdcage import _to_alpha, _to_numeric
+from birdcage import _bareiss_solve, _to_alpha, _to_numeric, _top_voltage_diffs
+from fractions import Fraction
+import copy
+import os
+import random
+import subprocess
+import sys
+import time
+import numpy as np
 import pytest
 from sympy import Rational
 
@@ -19,12 +27,27 @@ def test_to_numeric():
     assert _to_numeric("A1") == (1, 1)
     assert _to_numeric("A2") == (1, 2)
     assert _to_numeric("A3") == (1, 3)
+    assert _to_numeric("C11") == (3, 11)
+    assert _to_numeric("AA1") == (27, 1)
 
 
 def test_to_alpha():
     assert _to_alpha(1, 1) == ("A1")
     assert _to_alpha(1, 2) == ("A2")
     assert _to_alpha(1, 3) == ("A3")
+    assert _to_alpha(3, 11) == ("C11")
+    assert _to_alpha(26, 1) == ("Z1")
+    assert _to_alpha(27, 1) == ("AA1")
+
+
+@pytest.mark.parametrize("board_type", [BirdCage, CompactBirdCage, BridgIt])
+def test_repr_column_labels_after_z(board_type):
+    rows = repr(board_type(M=14)).split("\n")
+    # AA is written downwards, after A to Z
+    top, bottom = rows[-4], rows[-3]
+    assert bottom.split() == [chr(ord("A") + i) for i in range(26)] + ["A"]
+    assert top.split() == ["A"]
+    assert top.index("A") == bottom.rindex("A")
 
 
 def test_is_valid_move():
@@ -212,4 +235,623 @@ def test_discrete_voltage_discrimination():
     s = Shannon(use_extra_resistors=False)
     voltage_diffs = s._get_voltage_diffs(bc)
     assert voltage_diffs["C1"] > voltage_diffs["G3"]
-    assert round((voltage_diffs["C1"] * 1024).evalf()) == round((voltage_diffs["G3"] * 1024).evalf())
\ No newline at end of file
+    assert round((voltage_diffs["C1"] * 1024).evalf()) == round((voltage_diffs["G3"] * 1024).evalf())
+
+@pytest.mark.parametrize("use_extra_resistors", [False, True])
+def test_numpy_solver_matches_lcapy(use_extra_resistors):
+    bc = BirdCage()
+    lcapy = Shannon(use_extra_resistors=use_extra_resistors)
+    numpy = Shannon(use_extra_resistors=use_extra_resistors, solver=NumpySolver())
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5"]
+    for move in moves:
+        expected = lcapy._get_voltage_diffs(bc)
+        actual = numpy._get_voltage_diffs(bc)
+        # same ordering, including ties
+        assert list(actual) == list(expected)
+        for k, v in expected.items():
+            assert actual[k] == pytest.approx(float(v))
+        bc.move(move)
+
+def test_numpy_solver_game_M4():
+    bc = BirdCage(M=4)
+    s = Shannon(solver=NumpySolver())
+    moves = ["A1", "c1", "C3", "e3", "E5", "a7", "A5", "d4", "C5", "g5", "G7", "f6"]
+    for m1, m2 in zip(*[iter(moves)] * 2):
+        assert s.play(bc) == m1
+        bc.move(m1)
+        bc.move(m2)
+
+def test_numpy_solver_part_of_circuit_not_connected():
+    bc = BirdCage(moves=["E1", "E3", "D2", "B2", "D4", "B4", "E5"])
+    s = Shannon(solver=NumpySolver())
+    s._get_voltage_diffs(bc)
+
+    s = Shannon(use_extra_resistors=False, solver=NumpySolver())
+    with pytest.raises(ValueError):
+        s._get_voltage_diffs(bc)
+
+@pytest.mark.parametrize("use_extra_resistors", [False, True])
+@pytest.mark.parametrize("iterative", [False, True])
+def test_sparse_solver_matches_numpy_solver(use_extra_resistors, iterative):
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5"]
+    numpy = Shannon(use_extra_resistors=use_extra_resistors, solver=NumpySolver())
+    sparse = Shannon(use_extra_resistors=use_extra_resistors, solver=SparseSolver(iterative))
+    for i in range(len(moves)):
+        bc = BirdCage(moves=moves[:i])
+        expected = numpy._get_voltage_diffs(bc)
+        # the sparse solver doesn't need the graph, so works with any board
+        actual = sparse._get_voltage_diffs(CompactBirdCage(moves=moves[:i]))
+        assert list(actual) == list(expected)
+        assert list(actual.values()) == pytest.approx(list(expected.values()), abs=1e-12)
+
+def test_sparse_solver_part_of_circuit_not_connected():
+    bc = BirdCage(moves=["E1", "E3", "D2", "B2", "D4", "B4", "E5"])
+    s = Shannon(use_extra_resistors=False, solver=SparseSolver())
+    with pytest.raises(ValueError):
+        s._get_voltage_diffs(bc)
+
+def test_sparse_solver_game_M30():
+    random.seed(30)
+    bc = CompactBirdCage(M=30)
+    s = Shannon(solver=SparseSolver())
+    while not bc.white_has_won():
+        move = s.play(bc)
+        assert move == next(iter(s.top_moves(bc, k=3)))
+        bc.move(move)
+        if bc.white_has_won():
+            break
+        bc.move(Random().play(bc))
+        assert not bc.black_has_won()
+
+@pytest.mark.parametrize("use_extra_resistors", [True, False])
+def test_exact_solver_matches_lcapy(use_extra_resistors):
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1"]
+    lcapy = Shannon(use_extra_resistors=use_extra_resistors)
+    exact = Shannon(use_extra_resistors=use_extra_resistors, solver=ExactSolver())
+    for i in range(0, len(moves), 2):
+        bc = BirdCage(moves=moves[:i])
+        expected = lcapy._get_voltage_diffs(bc)
+        actual = exact._get_voltage_diffs(CompactBirdCage(moves=moves[:i]))
+        assert list(actual.items()) == list(expected.items())
+        assert all(isinstance(v, Fraction) for v in actual.values())
+        assert exact.voltage_diffs_str(bc) == lcapy.voltage_diffs_str(bc)
+
+def test_exact_solver_ties():
+    # A3 and B4 both have a flow of 21 (from the notebook), so Shannon plays B4 (nearest the top-left)
+    bc = BirdCage(moves=["A5", "c5", "C3", "a1"])
+    s = Shannon(use_extra_resistors=False, solver=ExactSolver())
+    voltage_diffs = s._get_voltage_diffs(bc)
+    assert voltage_diffs["A3"] == voltage_diffs["B4"] == Fraction(1, 2)
+    assert list(voltage_diffs)[:2] == ["B4", "A3"]
+    assert s.play(bc) == "B4"
+    assert s.voltage_diffs_str(bc).splitlines()[2] == "4    ● 21 ● 10 ●    "
+
+def test_exact_solver_game_M4():
+    # as test_shannon_game_M4, without Lcapy
+    bc = CompactBirdCage(M=4)
+    s = Shannon(solver=ExactSolver())
+    moves = ["A1", "c1", "C3", "e3", "E5", "a7", "A5", "d4", "C5", "g5", "G7", "f6", "E7", "d6", "F4", "g3", "G1", "f2", "C7", "b6", "D2", "e1"]
+    for m1, m2 in zip(*[iter(moves)] * 2):
+        assert s.play(bc) == m1
+        bc.move(m1)
+        bc.move(m2)
+    assert bc.black_has_won()
+
+def test_bareiss_solve():
+    # the first pivot is zero, so rows have to be swapped
+    A = [[0, 2, 1], [3, 1, -1], [1, 4, 2]]
+    b = [5, 2, 7]
+    y, d = _bareiss_solve(A, b)
+    x = [Fraction(v, d) for v in y]
+    assert [sum(a * v for a, v in zip(row, x)) for row in A] == b
+    with pytest.raises(ValueError):
+        _bareiss_solve([[1, 2], [2, 4]], [1, 2])
+
+def test_voltage_diff_cache_fractions(tmp_path):
+    path = tmp_path / "cache.db"
+    bc = CompactBirdCage(moves=["A1", "c3"])
+    cache = VoltageDiffCache(path=path)
+    diffs = Shannon(solver=ExactSolver(), cache=cache)._get_voltage_diffs(bc)
+    cache.close()
+    cache = VoltageDiffCache(path=path)
+    cached = Shannon(solver=ExactSolver(), cache=cache)._get_voltage_diffs(bc)
+    assert cache.info().hits == 1
+    assert list(cached.items()) == list(diffs.items())
+    assert all(isinstance(v, Fraction) for v in cached.values())
+    cache.close()
+
+def test_top_moves():
+    bc = BirdCage(M=4, moves=["A1", "c1"])
+    s = Shannon(solver=NumpySolver())
+    expected = list(s._get_voltage_diffs(bc).items())
+    for k in (1, 2, 5, 30):
+        assert list(s.top_moves(bc, k).items()) == expected[:k]
+    # near-ties go to the first move
+    moves = ["A1", "B2", "C1", "A3"]
+    diffs = [1.0, 2.0, 2.0 + 5e-10, 1.5]
+    assert list(_top_voltage_diffs(moves, diffs, 1, 1e-9)) == ["B2"]
+    assert list(_top_voltage_diffs(moves, diffs, 3, 1e-9)) == ["B2", "C1", "A3"]
+    assert list(_top_voltage_diffs(moves, diffs, None, 1e-9)) == ["B2", "C1", "A3", "A1"]
+    # exact ties go to the first move too
+    diffs = [Fraction(1), Fraction(2), Fraction(2), Fraction(3, 2)]
+    assert list(_top_voltage_diffs(moves, diffs, 1)) == ["B2"]
+    assert list(_top_voltage_diffs(moves, diffs, 3)) == ["B2", "C1", "A3"]
+
+def test_incremental_shannon_game_M4():
+    bc = BirdCage(M=4)
+    s = IncrementalShannon()
+    moves = ["A1", "c1", "C3", "e3", "E5", "a7", "A5", "d4", "C5", "g5", "G7", "f6", "E7", "d6", "F4", "g3", "G1", "f2", "C7", "b6", "D2", "e1"]
+    sessions = set()
+    for m1, m2 in zip(*[iter(moves)] * 2):
+        assert s.play(bc) == m1
+        sessions.add(id(s.session))
+        bc.move(m1)
+        bc.move(m2)
+    assert bc.black_has_won()
+    # the session was updated move by move, not restarted
+    assert len(sessions) == 1
+
+@pytest.mark.parametrize("use_extra_resistors", [False, True])
+@pytest.mark.parametrize("refactor_interval", [1, 4, 100])
+def test_circuit_session_matches_numpy_solver(use_extra_resistors, refactor_interval):
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5"]
+    session = CircuitSession(use_extra_resistors=use_extra_resistors, refactor_interval=refactor_interval)
+    s = Shannon(use_extra_resistors=use_extra_resistors, solver=NumpySolver())
+    for i, move in enumerate(moves):
+        bc = BirdCage(moves=moves[:i])
+        expected = s._get_voltage_diffs(bc)
+        assert session.voltage_diffs(list(expected)) == pytest.approx(list(expected.values()))
+        session.move(move)
+
+def test_circuit_session_copy():
+    session = CircuitSession(moves=["A1", "c1"])
+    session.voltage_diffs(["C3"])
+    child = session.copy()
+    child.move("C3")
+    assert session.moves == ["A1", "C1"]
+    assert session.voltage_diffs(["A5"]) == pytest.approx(CircuitSession(moves=["A1", "c1"]).voltage_diffs(["A5"]))
+    assert child.voltage_diffs(["A5"]) == pytest.approx(CircuitSession(moves=["A1", "c1", "C3"]).voltage_diffs(["A5"]))
+
+@pytest.mark.parametrize("moves", [["A1", "c1", "C3"], ["A1", "c1", "C3", "a5"]])
+def test_lookahead_shannon_pair_values(moves):
+    s = LookaheadShannon()
+    bc = CompactBirdCage(4, moves)
+    session = s._sync(bc)
+    session.voltage_diffs([])
+    layout = bc.layout
+    open_moves = np.array([i for i, move in enumerate(layout.moves) if bc.state(move) == OPEN])
+    after, values = s._pair_values(session, open_moves, len(moves) % 2 == 0)
+    for x, i in enumerate(open_moves[:6]):
+        assert after[x] == pytest.approx(_bottom_voltage(moves + [layout.moves[i]]))
+        for y, j in enumerate(open_moves[:6]):
+            if i != j:
+                assert values[x, y] == pytest.approx(_bottom_voltage(moves + [layout.moves[i], layout.moves[j]]))
+
+def _bottom_voltage(moves):
+    session = CircuitSession(4, moves)
+    session.voltage_diffs([])
+    return session.V[session.layout.bottom]
+
+def test_lookahead_shannon_has_no_cache():
+    with pytest.raises(TypeError):
+        LookaheadShannon(cache=VoltageDiffCache())
+
+@pytest.mark.parametrize("depth", [2, 4])
+def test_lookahead_shannon_wins_and_blocks(depth):
+    s = LookaheadShannon(depth=depth)
+    game = ["A3", "E3", "C1", "E5", "B4", "E1"] # SHORT wins with E1
+    assert s.play(CompactBirdCage(3, game[:4])) == "E1"
+    assert s.play(BirdCage(moves=game[:5])) == "E1"
+
+def _short_can_win(player, board):
+    """Return whether SHORT has a line that beats `player` as CUT from `board` (with CUT to move)."""
+    board.move(player.play(board))
+    try:
+        if board.white_has_won():
+            return False
+        for move in board.layout.moves:
+            if board.state(move) == OPEN:
+                board.move(move)
+                won = board.black_has_won() or _short_can_win(player, board)
+                board.undo()
+                if won:
+                    return True
+        return False
+    finally:
+        board.undo()
+
+@pytest.mark.parametrize("depth", [2, 4])
+def test_lookahead_shannon_cannot_be_beaten_M3(depth):
+    # unlike Shannon, who loses to Fisher's line
+    assert _short_can_win(Shannon(solver=NumpySolver()), CompactBirdCage(3))
+    assert not _short_can_win(LookaheadShannon(depth=depth), CompactBirdCage(3))
+
+def test_incremental_shannon_new_game():
+    s = IncrementalShannon(use_extra_resistors=False)
+    bc = BirdCage(moves=["A5", "c5"])
+    assert s.play(bc) == "C3"
+    # a different game restarts the session
+    bc = BirdCage(moves=["E1", "E3", "D2", "B2", "D4", "B4", "E5"])
+    with pytest.raises(ValueError):
+        s.play(bc)
+    assert s.session.moves == bc.moves
+
+@pytest.mark.parametrize("use_extra_resistors", [False, True])
+def test_batch_voltage_diffs(use_extra_resistors):
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5"]
+    positions = [moves[:i] for i in range(len(moves) + 1)]
+    # this one can only be solved with the extra resistors
+    positions.append(["E1", "E3", "D2", "B2", "D4", "B4", "E5"])
+    diffs = batch_voltage_diffs(positions, use_extra_resistors=use_extra_resistors)
+    assert diffs.shape == (len(positions), len(list(valid_moves())))
+
+    s = Shannon(use_extra_resistors=use_extra_resistors, solver=NumpySolver())
+    for position, row in zip(positions, diffs):
+        try:
+            expected = s._get_voltage_diffs(BirdCage(moves=position))
+        except ValueError:
+            assert np.all(np.isnan(row))
+            continue
+        for move, diff in zip(valid_moves(), row):
+            if move in expected:
+                assert diff == pytest.approx(expected[move])
+            else:
+                assert np.isnan(diff)
+
+def test_batch_voltage_diffs_states():
+    states = np.full((2, len(list(valid_moves()))), OPEN, dtype=np.int8)
+    states[1, list(valid_moves()).index("A5")] = CUT
+    states[1, list(valid_moves()).index("C5")] = SHORT
+    diffs = batch_voltage_diffs(states, use_extra_resistors=False)
+    assert diffs[1, list(valid_moves()).index("C3")] == pytest.approx(71 / 129)
+    assert np.array_equal(diffs[1], batch_voltage_diffs([["A5", "C5"]], use_extra_resistors=False)[0], equal_nan=True)
+
+def test_compact_boards_match():
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5", "d4"]
+    bc, br, cb, cr = BirdCage(), BridgIt(), CompactBirdCage(), CompactBridgIt()
+    for move in moves:
+        assert repr(cb) == repr(bc)
+        assert repr(cr) == repr(br)
+        assert not cb.white_has_won()
+        assert not cb.black_has_won()
+        for b in (bc, br, cb, cr):
+            b.move(move)
+    assert repr(cb) == repr(bc)
+    assert repr(cr) == repr(br)
+    assert not cb.white_has_won()
+    assert cb.black_has_won()
+    assert cr.black_has_won()
+
+def test_compact_birdcage_undo_copy_hash():
+    bc = CompactBirdCage(M=4, moves=["A1", "c1", "C3"])
+    copy = bc.copy()
+    bc.move("E3")
+    assert bc.state("E3") == SHORT
+    assert copy.moves == ["A1", "C1", "C3"]
+    assert bc.undo() == copy
+    assert bc.state("E3") == OPEN
+
+    # same position, different move order
+    other = CompactBirdCage(M=4, moves=["C3", "c1", "A1"])
+    assert other == bc
+    assert hash(other) == hash(bc)
+    assert other != CompactBirdCage(M=4, moves=["C3", "a1", "C1"])
+    assert len({bc, other, copy}) == 1
+
+    with pytest.raises(ValueError):
+        bc.move("A2")
+    with pytest.raises(ValueError):
+        bc.move("c1")
+
+def test_compact_birdcage_shannon():
+    bc = CompactBirdCage(M=4)
+    s = IncrementalShannon()
+    moves = ["A1", "c1", "C3", "e3", "E5", "a7", "A5", "d4", "C5", "g5", "G7", "f6", "E7", "d6", "F4", "g3", "G1", "f2", "C7", "b6", "D2", "e1"]
+    for m1, m2 in zip(*[iter(moves)] * 2):
+        assert s.play(bc) == m1
+        bc.move(m1)
+        bc.move(m2)
+    assert not bc.white_has_won()
+    assert bc.black_has_won()
+
+def test_bridg_it_win_with_unconnected_edge():
+    # C5 is not connected to anything, but white has still joined the left and right sides
+    b = BridgIt(moves=["C5", "c3", "A1", "b4", "C1", "d4"])
+    assert not b.white_has_won()
+    b.move("E1")
+    assert b.white_has_won()
+    assert not b.black_has_won()
+
+def test_birdcage_black_has_won_after_cut_wins():
+    bc = BirdCage(moves=["A1", "a3", "C1", "a5", "E1"])
+    assert bc.white_has_won()
+    assert not bc.black_has_won()
+
+def test_compact_birdcage_undo_win():
+    moves = ["A5", "c5", "C3", "a1", "B4", "e3", "E1", "d2", "C1", "b2", "E5", "d4"]
+    bc = CompactBirdCage(moves=moves)
+    assert bc.black_has_won()
+    for _ in range(len(moves)):
+        bc.undo()
+        assert not bc.black_has_won()
+        assert not bc.white_has_won()
+    assert bc == CompactBirdCage()
+    bc = CompactBirdCage(moves=["A1", "a3", "C1", "a5", "E1"])
+    assert bc.white_has_won()
+    assert not bc.undo().white_has_won()
+
+
+def _perfect_always_wins(bc, player, perfect_cut):
+    """Check that `player` wins against every reply from the position on `bc`."""
+    if bc.white_has_won() or bc.black_has_won():
+        return bc.white_has_won() == perfect_cut
+    if (len(bc.moves) % 2 == 0) == perfect_cut:
+        return _perfect_always_wins(bc.copy().move(player.play(bc)), player, perfect_cut)
+    replies = [move for move in valid_moves(bc.M) if bc.state(move) == OPEN]
+    return all(_perfect_always_wins(bc.copy().move(move), copy.deepcopy(player), perfect_cut) for move in replies)
+
+def test_perfect_cut_M2():
+    assert _perfect_always_wins(CompactBirdCage(M=2), Perfect(), True)
+
+def test_perfect_short_M3():
+    # SHORT can win after Shannon's mistake (B4) in Fisher's line
+    bc = CompactBirdCage(moves=["A5", "c5", "C3", "a1", "B4"])
+    assert _perfect_always_wins(bc, Perfect(), False)
+
+def test_perfect_beats_shannon_M3():
+    bc = CompactBirdCage(moves=["A5", "c5", "C3", "a1", "B4"])
+    s = Shannon(use_extra_resistors=False, solver=NumpySolver())
+    p = Perfect()
+    while True:
+        bc.move(p.play(bc))
+        if bc.black_has_won():
+            break
+        bc.move(s.play(bc))
+        assert not bc.white_has_won()
+
+@pytest.mark.parametrize("M", [3, 4, 5, 20])
+def test_perfect_cut_beats_random(M):
+    random.seed(M)
+    bc = CompactBirdCage(M=M)
+    p = Perfect()
+    while not bc.white_has_won():
+        bc.move(p.play(bc))
+        if bc.white_has_won():
+            break
+        bc.move(Random().play(bc))
+        assert not bc.black_has_won()
+
+def test_perfect_short_large_M():
+    # CUT moves first and wins, so SHORT's positions are lost until CUT makes a mistake
+    random.seed(50)
+    bc = CompactBirdCage(M=50)
+    p = Perfect()
+    bc.move("A1")
+    start = time.perf_counter()
+    bc.move(p.play(bc))
+    assert time.perf_counter() - start < 1
+    while not bc.black_has_won():
+        bc.move(Random().play(bc))
+        if bc.black_has_won():
+            break
+        start = time.perf_counter()
+        bc.move(p.play(bc))
+        assert time.perf_counter() - start < 2
+        assert not bc.white_has_won()
+
+def test_symmetries():
+    for M in (2, 3, 4):
+        n = len(list(valid_moves(M)))
+        for perm in symmetries(M, top_bottom=True):
+            assert sorted(perm) == list(range(n))
+            assert all(perm[perm[i]] == i for i in range(n))
+    assert len(symmetries(3)) == 2
+    assert len(symmetries(3, top_bottom=True)) == 4
+
+def test_canonical_form():
+    # A1 and E1 are reflections of each other
+    form1, translate1 = canonical_form(BirdCage(moves=["A1", "c3"]))
+    form2, translate2 = canonical_form(CompactBirdCage(moves=["E1", "c3"]))
+    assert form1 == form2
+    assert translate1["A1"] == "A1" and translate2["A1"] == "E1"
+    # order independent
+    assert canonical_form(BirdCage(moves=["A1", "c3", "B4", "e1"]))[0] == canonical_form(BirdCage(moves=["B4", "e1", "A1", "c3"]))[0]
+    # top-bottom reflection is only used if asked for
+    assert canonical_form(BirdCage(moves=["A1"]))[0] != canonical_form(BirdCage(moves=["A5"]))[0]
+    assert canonical_form(BirdCage(moves=["A1"]), top_bottom=True)[0] == canonical_form(BirdCage(moves=["E5"]), top_bottom=True)[0]
+
+def test_canonical_form_translates_voltage_diffs():
+    bc = BirdCage(M=4, moves=["G1", "b4", "C5"])
+    (cuts, shorts), translate = canonical_form(bc)
+    layout_moves = list(valid_moves(4))
+    canonical = CompactBirdCage(M=4)
+    for i, move in enumerate(layout_moves):
+        if cuts >> i & 1:
+            canonical.cuts |= 1 << i
+        elif shorts >> i & 1:
+            canonical.shorts |= 1 << i
+    diffs = batch_voltage_diffs(canonical.states()[None, :], M=4)[0]
+    original = batch_voltage_diffs([bc.moves], M=4)[0]
+    index = {move: i for i, move in enumerate(layout_moves)}
+    for move, d in zip(layout_moves, diffs):
+        assert np.isclose(d, original[index[translate[move]]], equal_nan=True)
+
+def test_voltage_diff_cache():
+    cache = VoltageDiffCache(maxsize=2)
+    s = Shannon(solver=NumpySolver(), cache=cache)
+    bc = BirdCage(moves=["A1", "c3", "E1", "a3"])
+    diffs = s._get_voltage_diffs(bc)
+    assert cache.info() == CacheInfo(0, 1, 2, 1)
+    # same CUT and SHORT sets, played in a different order
+    assert s._get_voltage_diffs(BirdCage(moves=["E1", "a3", "A1", "c3"])) == diffs
+    assert cache.info() == CacheInfo(1, 1, 2, 1)
+    # kept separate from the circuit without extra resistors
+    Shannon(use_extra_resistors=False, solver=NumpySolver(), cache=cache)._get_voltage_diffs(bc)
+    assert cache.info() == CacheInfo(1, 2, 2, 2)
+    # least recently used entry is evicted
+    s._get_voltage_diffs(BirdCage(moves=["A1"]))
+    assert cache.info() == CacheInfo(1, 3, 2, 2)
+    s._get_voltage_diffs(bc)
+    assert cache.info().misses == 4
+
+def test_voltage_diff_cache_persistent(tmp_path):
+    path = tmp_path / "cache.db"
+    bc = BirdCage(moves=["A1", "c3", "E1"])
+    cache = VoltageDiffCache(path=path)
+    diffs = Shannon(use_extra_resistors=False, cache=cache)._get_voltage_diffs(bc)
+    cache.close()
+    cache = VoltageDiffCache(path=path)
+    s = Shannon(use_extra_resistors=False, cache=cache)
+    assert s._get_voltage_diffs(bc) == diffs
+    assert cache.info().hits == 1 and cache.info().misses == 0
+    assert isinstance(next(iter(s._get_voltage_diffs(bc).values())), Rational)
+    assert s.voltage_diffs_str(bc) == Shannon(use_extra_resistors=False).voltage_diffs_str(bc)
+    cache.close()
+
+def test_phase_timer():
+    moves = []
+    s = Shannon(use_extra_resistors=False, solver=NumpySolver())
+    with s.timed(PhaseTimer(callback=moves.append)) as timer:
+        bc = BirdCage(M=3)
+        bc.move(s.play(bc))
+        bc.move("a3")
+        bc.move(s.play(bc))
+    assert s.timer is None
+    assert moves == timer.moves
+    assert timer.summary().startswith("2 moves")
+    assert [(t.M, t.candidates) for t in timer.moves] == [(3, 13), (3, 11)]
+    assert set(timer.moves[0].phases) == {"board", "candidates", "netlist", "solve", "lookup", "order"}
+    assert all(calls == 2 for _, calls in timer.totals().values())
+    assert "solve" in timer.summary()
+    for line in timer.collapsed().splitlines():
+        stack, weight = line.rsplit(" ", 1)
+        assert stack.startswith("Shannon;M=3;") and int(weight) >= 0
+
+def test_phase_timer_lcapy():
+    s = Shannon(use_extra_resistors=False)
+    timer = PhaseTimer()
+    s.timer = timer
+    s.play(BirdCage(moves=["A1"]))
+    assert {"netlist", "parse", "solve", "lookup"} <= set(timer.moves[0].phases)
+
+def test_phase_timer_only_records_moves():
+    s = Shannon(solver=ExactSolver())
+    with s.timed() as timer:
+        bc = BirdCage(M=3)
+        s.play(bc)
+        s.top_moves(bc)
+        s.voltage_diffs_str(bc)
+        s.play(bc)
+    assert len(timer.moves) == 2
+    # looking at the top moves isn't counted in the next move either
+    assert all(calls == 1 for _, calls in timer.moves[1].phases.values())
+    assert timer.summary().startswith("2 moves")
+
+def test_import_time():
+    # Lcapy, SymPy and networkx aren't imported until they are needed
+    code = (
+        "import sys, time; start = time.perf_counter(); import birdcage; seconds = time.perf_counter() - start; "
+        "list(birdcage.valid_moves(4)); birdcage._to_alpha(27, 1); "
+        "print(seconds); print(','.join(m for m in ('lcapy', 'sympy', 'networkx') if m in sys.modules))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.splitlines()
+    assert out[1] == ""
+    # a generous limit (importing Lcapy takes about a second)
+    assert float(out[0]) < 0.5
+
+def test_boards_dont_import_networkx():
+    # boards are built and drawn without networkx, which is only imported for a solver's graph
+    code = (
+        "import sys, birdcage; bc = birdcage.BirdCage(4, ['A1', 'c1']); str(bc); "
+        "str(birdcage.BridgIt(4, ['A1', 'b2'])); print('networkx' in sys.modules); "
+        "bc.G; print('networkx' in sys.modules)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    ).stdout.splitlines()
+    assert out == ["False", "True"]
+
+def test_birdcage_graph_follows_moves():
+    bc = BirdCage(moves=["A1"])
+    def edge(move):
+        return bc._move_to_edge(*_to_numeric(move))
+    assert edge("A1") not in bc.G.edges # CUT
+    bc.move("C1")
+    assert bc.G.edges[edge("C1")]["weight"] == 0 # SHORT
+    assert bc.G.edges[edge("A5")]["weight"] == 1
+
+def test_prewarm():
+    prewarm(NumpySolver()).join()
+    assert prewarm(background=False) is None
+
+def _write_birdcage_edge_list(path, M):
+    """Write the bird cage of size `M` as an edge list, with the edges in top-left order (for ties)."""
+    bc = BirdCage(M)
+    moves = sorted(valid_moves(M), key=lambda move: (-_to_numeric(move)[1], _to_numeric(move)[0]))
+    with open(path, "w") as f:
+        f.write(f"# bird cage of size {M}\n")
+        top, bottom = bc._map_node(0, 2 * M), bc._map_node(0, 0)
+        f.write(f"terminals {top[0]},{top[1]} {bottom[0]},{bottom[1]}\n")
+        for move in moves:
+            (x1, y1), (x2, y2) = bc._move_to_edge(*_to_numeric(move))
+            f.write(f"{x1},{y1} {x2},{y2}  # {move}\n")
+    return moves
+
+@pytest.mark.parametrize("solver", [NumpySolver(), SparseSolver(), ExactSolver()])
+def test_switching_game_matches_birdcage(tmp_path, solver):
+    path = tmp_path / "birdcage4.txt"
+    moves = _write_birdcage_edge_list(path, 4)
+    game = SwitchingGame.from_file(path)
+    assert len(game.states) == len(moves)
+    bc = BirdCage(M=4)
+    s = Shannon(solver=solver)
+    random.seed(4)
+    while True:
+        move = s.play(bc)
+        assert moves[s.play(game)] == move
+        bc.move(move)
+        game.move(moves.index(move))
+        assert game.white_has_won() == bc.white_has_won()
+        if bc.white_has_won():
+            break
+        move = Random().play(bc)
+        bc.move(move)
+        game.move(moves.index(move))
+        assert game.black_has_won() == bc.black_has_won()
+
+def test_switching_game():
+    # a triangle s-a-t with a direct edge s-t
+    game = SwitchingGame([0, 1, 0], [1, 2, 2], 0, 2)
+    assert game.n == 3
+    game.move(2)
+    assert not game.white_has_won()
+    game.move(0)
+    assert not game.black_has_won()
+    game2 = game.copy()
+    game2.move(1)
+    assert game2.white_has_won()
+    assert not game.white_has_won()
+    game.undo()
+    assert game.moves == [2]
+    with pytest.raises(ValueError):
+        game.move(2)
+    assert Random().play(game) in (0, 1)
+    with pytest.raises(TypeError):
+        Shannon().play(game)
+    # the exact solver agrees with the floating point ones
+    game = SwitchingGame([0, 1, 0], [1, 2, 2], 0, 2)
+    for solver in (NumpySolver(), SparseSolver(), ExactSolver()):
+        assert Shannon(solver=solver).play(game) == 2
+
+def test_switching_game_file_errors(tmp_path):
+    path = tmp_path / "bad.txt"
+    path.write_text("a b\nb c\n")
+    with pytest.raises(ValueError):
+        SwitchingGame.from_file(path)
+    game = SwitchingGame.from_file(path, s="a", t="c")
+    assert game.labels == ["a", "b", "c"]
+    path.write_text("a b c\n")
+    with pytest.raises(ValueError):
+        SwitchingGame.from_file(path, s="a", t="c")
@@ -0,0 +1,51 @@
+import random
+
+import pytest
+
+from find_min_delta import *
+
+def test_shannon_moves():
+    random.seed(1)
+    positions = random_game_positions(4, 5)
+    moves = shannon_moves(batch_voltage_diffs(positions, M=4), 4)
+    s = Shannon(solver=NumpySolver())
+    layout_moves = list(valid_moves(4))
+    for position, i in zip(positions, moves):
+        assert layout_moves[i] == s.play(BirdCage(M=4, moves=position))
+
+def test_min_deltas():
+    diffs = np.array([[0.5, 0.25, np.nan, 0.5], [0.5, np.nan, np.nan, np.nan]])
+    assert list(min_deltas(diffs, resolution=1024)) == [256, 1024]
+
+@pytest.mark.parametrize("use_extra_resistors", [True, False])
+def test_exhaustive_min_delta_M3(use_extra_resistors):
+    # every position Shannon can face as CUT, found directly
+    s = Shannon(use_extra_resistors=use_extra_resistors, solver=NumpySolver())
+    seen = set()
+    def visit(bc):
+        seen.add(bc)
+        bc = bc.copy().move(s.play(bc))
+        if bc.white_has_won():
+            return
+        for move in valid_moves(3):
+            if bc.state(move) == OPEN:
+                bc2 = bc.copy().move(move)
+                if not bc2.black_has_won() and bc2 not in seen:
+                    visit(bc2)
+    visit(CompactBirdCage(3))
+
+    count, min_delta, worst = exhaustive_min_delta(3, workers=1, worst=3, use_extra_resistors=use_extra_resistors)
+    assert count == len(seen)
+    assert len(worst) == 3
+    assert min_delta == worst[0][0] <= worst[1][0] <= worst[2][0]
+    assert all(board in seen for _, board in worst)
+
+def test_exhaustive_min_delta_configurations():
+    deltas = {
+        (use_extra_resistors, pull_up): exhaustive_min_delta(
+            3, workers=1, use_extra_resistors=use_extra_resistors, pull_up_resistance=pull_up
+        )[1]
+        for use_extra_resistors, pull_up in [(True, PULL_UP_RESISTANCE), (True, 10), (False, PULL_UP_RESISTANCE)]
+    }
+    # stronger pull-ups, or none at all, separate Shannon's top two moves further on this board
+    assert deltas[True, PULL_UP_RESISTANCE] < deltas[True, 10] < deltas[False, PULL_UP_RESISTANCE]
@@ -0,0 +1,56 @@
+import pytest
+
+from birdcage import *
+from game_records import *
+from tournament import run
+
+def test_write_and_read_games(tmp_path):
+    path = tmp_path / "games.bcg"
+    with GameWriter(path) as writer:
+        writer.write(3, ["A1", "c3", "C1"], "shannon", "human")
+        writer.write(4, [0, 5, 7])
+    # appending to an existing file
+    write_games(path, [GameRecord(12, "big", "board", [300, 1])])
+    games = list(read_games(path))
+    assert len(games) == 3
+    assert games[0].M == 3 and games[0].cut == "shannon" and games[0].short == "human"
+    assert record_moves(games[0]) == ["A1", "C3", "C1"]
+    assert list(games[1].moves) == [0, 5, 7] and games[1].cut == ""
+    assert list(games[2].moves) == [300, 1] # two bytes per move
+
+def test_read_games_errors(tmp_path):
+    path = tmp_path / "games.bcg"
+    path.write_bytes(b"nope")
+    with pytest.raises(ValueError, match="Not a game record file"):
+        list(read_games(path))
+    with GameWriter(path := tmp_path / "truncated.bcg") as writer:
+        writer.write(3, ["A1", "c3", "C1"])
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError, match="Truncated"):
+        list(read_games(path))
+
+def test_game_winner():
+    index = CompactBirdCage(3).layout.move_index
+    assert game_winner(3, []) is None
+    assert game_winner(3, [index[move] for move in ["A5", "A3", "C5", "A1", "E5"]]) == "cut"
+    assert game_winner(3, [index[move] for move in ["A3", "E3", "C1", "E5", "B4", "E1"]]) == "short"
+    assert game_winner(3, [index[move] for move in ["A3", "E3", "C1", "E5", "B4"]]) is None
+    with pytest.raises(ValueError, match="already been made"):
+        game_winner(3, [0, 1, 0])
+    with pytest.raises(ValueError, match="Invalid move index"):
+        game_winner(3, [13])
+    with pytest.raises(ValueError, match="after the game was won"):
+        game_winner(3, [index[move] for move in ["A5", "A3", "C5", "A1", "E5", "C1"]])
+
+def test_validate_games(tmp_path):
+    path = tmp_path / "games.bcg"
+    run(["random", "shannon-numpy"], [3, 4], 3, seed=3, workers=1, records=path)
+    write_games(path, [GameRecord(3, "", "", [0, 0])])
+    counts, errors = validate_games(read_games(path))
+    assert counts["games"] == 13
+    assert counts["cut"] + counts["short"] == 12
+    assert counts["invalid"] == 1 and errors[0][0] == 12
+    # the same winners as playing the games on a board
+    for game in list(read_games(path))[:12]:
+        board = CompactBirdCage(game.M, record_moves(game))
+        assert game_winner(game.M, game.moves) == ("cut" if board.white_has_won() else "short")
@@ -0,0 +1,55 @@
+import pytest
+
+from birdcage import *
+from mcts import *
+
+# a game that SHORT wins with E1
+GAME = ["A3", "E3", "C1", "E5", "B4", "E1"]
+
+def test_mcts_takes_win():
+    board = CompactBirdCage(3, GAME[:5])
+    assert MCTS(time_limit=None, max_rollouts=200, seed=0).play(board) == "E1"
+
+def test_mcts_blocks_win():
+    board = CompactBirdCage(3, GAME[:4])
+    assert MCTS(time_limit=None, max_rollouts=500, seed=0).play(board) == "E1"
+
+def test_mcts_search():
+    board = CompactBirdCage(4, ["A1", "c1"])
+    player = MCTS(time_limit=None, max_rollouts=300, seed=1)
+    result = player.search(board)
+    assert result.rollouts == 300
+    assert sum(result.visits.values()) == 300
+    assert result.move == max(result.visits, key=result.visits.get)
+    assert 0 <= result.value <= 1
+    assert player.last == result
+    assert player.rollouts == 300 and player.rollouts_per_second() > 0
+    assert "rollouts/s" in report(result)
+    # the search is reproducible
+    assert MCTS(time_limit=None, max_rollouts=300, seed=1).search(board).visits == result.visits
+    with pytest.raises(ValueError):
+        MCTS(time_limit=None)
+
+def test_mcts_time_limit():
+    result = MCTS(time_limit=0.2, prior_weight=0).search(CompactBirdCage(5))
+    assert 0.2 <= result.seconds < 1
+    assert result.rollouts > 0
+
+def test_mcts_parallel():
+    board = CompactBirdCage(3, ["A1"])
+    with MCTS(time_limit=None, max_rollouts=200, workers=2, seed=2) as player:
+        result = player.search(board)
+        assert result.rollouts == 400
+        assert sum(result.visits.values()) == 400
+        # the pool is kept for the next move
+        pool = player.pool
+        player.search(board.copy().move("C1"))
+        assert player.pool is pool
+    assert player.pool is None
+
+def test_mcts_parallel_time_limit():
+    with MCTS(time_limit=0.3, workers=2, prior_weight=0) as player:
+        player.search(CompactBirdCage(5)) # start the pool
+        # every worker stops at the same deadline, so the whole search fits the time limit
+        result = player.search(CompactBirdCage(5, ["A1", "c1"]))
+    assert 0.3 <= result.seconds < 0.5
@@ -0,0 +1,49 @@
+import numpy as np
+
+from birdcage import *
+from birdcage import _layout
+from monte_carlo import *
+
+MOVES = ["A1", "c3", "C1", "d6"]
+
+def test_perturbed_voltages_nominal():
+    M = 4
+    states = CompactBirdCage(M, MOVES).states()
+    layout = _layout(M)
+    V = perturbed_voltages(M, states, *sample_resistors(M, 3, Hardware(tolerance=0, series_tolerance=0)))
+    diffs = np.abs(V[:, layout.u] - V[:, layout.v])
+    expected = batch_voltage_diffs(states[None, :], M)[0]
+    open_moves = states == OPEN
+    for row in diffs:
+        np.testing.assert_allclose(row[open_moves], expected[open_moves])
+
+def test_perturbed_voltages_batch():
+    # each set of resistors gives the same voltages whether it is solved alone or in a batch
+    M = 3
+    states = CompactBirdCage(M, ["A1", "c3"]).states()
+    resistors = sample_resistors(M, 5, Hardware(pull_up_tolerance=0.2), seed=1)
+    V = perturbed_voltages(M, states, *resistors)
+    for i in range(5):
+        np.testing.assert_allclose(V[i], perturbed_voltages(M, states, *(r[i:i + 1] for r in resistors))[0])
+
+def test_quantize():
+    assert quantize(np.array([0.0, 0.5, 1.0]), bits=10).tolist() == [0, 512, 1023]
+    assert quantize(np.array([0.0, 0.5, 1.0]), bits=2).tolist() == [0, 2, 3]
+
+def test_simulate_position_ideal_hardware():
+    M = 4
+    hardware = Hardware(bits=24, tolerance=0, series_tolerance=0)
+    result, differs, worse = simulate_position(M, MOVES, sample_resistors(M, 10, hardware), hardware)
+    assert result.ideal == Shannon(solver=NumpySolver()).play(BirdCage(M, MOVES))
+    assert result.differs == 0
+    assert result.worse == 0
+    assert result.counts == {result.ideal: 10}
+
+def test_simulate_game_reproducible():
+    M = 4
+    moves = ["A1", "c3", "C1", "e5", "E1", "d4", "G1"]
+    results, differs, worse = simulate_game(M, moves, samples=500, seed=42)
+    assert len(results) == 4
+    assert [result.ideal for result in results] == moves[::2]
+    assert 0 <= worse <= differs <= 1
+    assert simulate_game(M, moves, samples=500, seed=42) == (results, differs, worse)
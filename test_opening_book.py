@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from birdcage import *
+from birdcage import _layout
+from opening_book import *
+
+def _mirror(board):
+    layout = _layout(board.M)
+    perm = symmetries(board.M)[1]
+    return CompactBirdCage(board.M, [layout.moves[perm[layout.move_index[move]]] for move in board.moves])
+
+@pytest.mark.parametrize("M, plies", [(3, 6), (4, 4)])
+def test_opening_book_matches_shannon(tmp_path, M, plies):
+    path = tmp_path / "book.bin"
+    count = build_book(path, M, plies)
+    book = OpeningBook(path)
+    assert len(book) == count
+    assert book.M == M and book.plies == plies and book.use_extra_resistors
+    shannon = Shannon(solver=NumpySolver())
+    for board, ordered in book_positions(M, plies):
+        # the book gives Shannon's move in both orientations of each position
+        for b in (board, _mirror(board)):
+            assert book.move(b) == shannon.play(b)
+        ranked = book.lookup(board)
+        assert list(ranked)[:book.k] == list(ordered)[:len(ranked)]
+        np.testing.assert_allclose(list(ranked.values()), list(ordered.values())[:len(ranked)], atol=1 / 65535)
+
+def test_opening_book_misses(tmp_path):
+    path = tmp_path / "book.bin"
+    build_book(path, 3, plies=4)
+    book = OpeningBook(path)
+    assert book.move(CompactBirdCage(3, ["A1", "c3", "C1", "e5"])) is None # too deep
+    assert book.move(CompactBirdCage(3, ["A1"])) is None # SHORT to move
+    assert book.move(CompactBirdCage(4)) is None # different board size
+    assert book.move(CompactBirdCage(3, ["C1", "a3"])) is None # not Shannon's move
+
+def test_book_player(tmp_path):
+    path = tmp_path / "book.bin"
+    build_book(path, 3, plies=4)
+    player = BookPlayer(path, Shannon(solver=NumpySolver()))
+    board = CompactBirdCage(3)
+    assert player.play(board) == "A1"
+    board.move("A1").move("c3")
+    assert player.play(board) == Shannon(solver=NumpySolver()).play(board)
+    board.move("C1").move("e5")
+    assert player.play(board) == Shannon(solver=NumpySolver()).play(board)
+    assert (player.hits, player.misses) == (2, 1)
+    # the fallback has to use the same heuristic as the book
+    with pytest.raises(ValueError):
+        BookPlayer(path, Shannon(use_extra_resistors=False, solver=NumpySolver()))
+    assert repr(BookPlayer(path, Random())) == "BookPlayer(Random)"
+
+def test_opening_book_errors(tmp_path):
+    path = tmp_path / "not_a_book.bin"
+    path.write_bytes(b"not a book at all")
+    with pytest.raises(ValueError):
+        OpeningBook(path)
+
+def test_export_c(tmp_path):
+    path = tmp_path / "book.bin"
+    count = build_book(path, 3, plies=4)
+    out = tmp_path / "book.h"
+    export_c(path, out)
+    header = out.read_text()
+    assert f"#define OPENING_BOOK_COUNT {count}" in header
+    assert f"opening_book[{path.stat().st_size}] PROGMEM" in header
+    assert "0x42, 0x43, 0x42, 0x4b" in header # magic
+
+def test_opening_book_too_big(tmp_path):
+    # keys for bigger boards don't fit in 64 bits, so positions could collide
+    with pytest.raises(ValueError):
+        build_book(tmp_path / "book5.bin", 5, 2)
+    with pytest.raises(ValueError):
+        position_key(0, 1, 41)
+    assert position_key(1, 2, 32) == 1 | 2 << 32
@@ -0,0 +1,41 @@
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from blessed import Terminal
+
+from birdcage import *
+from play import Screen, think
+
+def _terminal():
+    return Terminal(kind="xterm-256color", stream=io.StringIO(), force_styling=True)
+
+def _writes(output):
+    """Return the (x, y, text) of each write in terminal `output`."""
+    return [(int(x) - 1, int(y) - 1, text) for y, x, text in re.findall(r"\x1b\[(\d+);(\d+)H([^\x1b]*)", output)]
+
+def test_screen_only_redraws_changes(capsys):
+    term = _terminal()
+    screen = Screen(term, top=1)
+    board = CompactBirdCage(3)
+    screen.draw(str(board))
+    assert "".join(text for _, _, text in _writes(capsys.readouterr().out)) == str(board).replace("\n", "")
+
+    board.move("C3")
+    screen.draw(str(board))
+    writes = _writes(capsys.readouterr().out)
+    # the cut edge, and the list of moves
+    assert writes == [(8, 4, " "), (0, 9, "C3")]
+    assert screen.lines == str(board).split("\n")
+
+    screen.draw("short")
+    writes = _writes(capsys.readouterr().out)
+    assert writes[0] == (0, 1, "short")
+    assert all(text.strip() == "" for _, _, text in writes[1:])
+
+def test_think():
+    term = _terminal()
+    board = CompactBirdCage(3, ["A1"])
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        move = think(executor, Shannon(solver=NumpySolver()), board, term, row=12)
+    assert move == Shannon(solver=NumpySolver()).play(board)
@@ -0,0 +1,51 @@
+from birdcage import *
+from search import *
+
+def test_search_proves_cut_wins_M3():
+    bc = CompactBirdCage(M=3)
+    result = Search(M=3).search(bc)
+    assert winner(result, bc) == "CUT"
+    assert result.score == WIN - len(result.pv)
+    assert result.table_probes > 0 and result.table_hits > 0
+
+def test_search_finds_short_win_M3():
+    # Fisher's line, after Shannon's mistake (B4)
+    bc = CompactBirdCage(moves=["A5", "c5", "C3", "a1", "B4"])
+    result = Search(M=3).search(bc)
+    assert winner(result, bc) == "SHORT"
+    bc2 = bc.copy()
+    for move in result.pv:
+        bc2.move(move)
+    assert bc2.black_has_won()
+
+def test_search_immediate_win():
+    bc = CompactBirdCage(moves=["A5", "c5", "C3", "a1", "B4"])
+    pv = Search(M=3).search(bc).pv
+    for move in pv[:-1]:
+        bc.move(move)
+    result = Search(M=3).search(bc, max_depth=1)
+    assert result.score == WIN - 1
+    bc.move(result.move)
+    assert bc.black_has_won()
+
+def test_search_time_limit():
+    bc = CompactBirdCage(M=5)
+    result = Search(M=5).search(bc, time_limit=0.5)
+    assert result.seconds < 5
+    assert result.move is None or bc.state(result.move) == OPEN
+
+def test_hash_is_independent_of_move_order():
+    search = Search(M=3)
+    assert search.hash(CompactBirdCage(moves=["A1", "a3", "C1"])) == search.hash(CompactBirdCage(moves=["C1", "a3", "A1"]))
+    assert search.hash(CompactBirdCage(moves=["A1", "a3"])) != search.hash(CompactBirdCage(moves=["a3", "A1"]))
+
+def test_symmetric_hash():
+    search = Search(M=3)
+    assert search.hash(CompactBirdCage(moves=["A1", "c3"])) == search.hash(CompactBirdCage(moves=["E1", "c3"]))
+    assert search.hash(CompactBirdCage(moves=["A1", "c3"])) == search.hash(CompactBirdCage(moves=["E5", "c3"]))
+    search = Search(M=3, symmetric=False)
+    assert search.hash(CompactBirdCage(moves=["A1", "c3"])) != search.hash(CompactBirdCage(moves=["E1", "c3"]))
+
+def test_search_without_symmetry():
+    bc = CompactBirdCage(M=3)
+    assert winner(Search(M=3, symmetric=False).search(bc), bc) == "CUT"
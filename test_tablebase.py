@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from birdcage import *
+from birdcage import _layout
+from tablebase import *
+from tablebase import _layer
+
+def _minimax(board):
+    """Return the value of `board` (as for `Tablebase.value`) by searching the whole game tree."""
+    if board.white_has_won():
+        return 1
+    if board.black_has_won():
+        return -1
+    side = 1 if len(board.moves) % 2 == 0 else -1
+    values = []
+    for move in board.layout.moves:
+        if board.state(move) == OPEN:
+            board.move(move)
+            values.append(_minimax(board))
+            board.undo()
+    # win as quickly as possible, or lose as slowly as possible
+    best = max(values, key=lambda v: 1000 - side * v if side * v > 0 else -side * v)
+    return best + (1 if best > 0 else -1)
+
+@pytest.fixture(scope="module")
+def tablebase3(tmp_path_factory):
+    path = tmp_path_factory.mktemp("tablebase") / "tablebase3.bin"
+    build_tablebase(path, 3)
+    return Tablebase(path)
+
+def test_position_index_is_perfect_hash():
+    for M in (2, 3):
+        n = len(_layout(M).moves)
+        indexes = np.concatenate([position_index(*_layer(n, p), n) for p in range(n + 1)])
+        assert len(indexes) == position_count(M)
+        assert np.array_equal(np.sort(indexes), np.arange(position_count(M)))
+    with pytest.raises(ValueError):
+        position_index(1, 2 | 4, 3) # SHORT has made more moves than CUT
+
+def test_tablebase_matches_minimax(tmp_path):
+    path = tmp_path / "tablebase2.bin"
+    assert build_tablebase(path, 2) == position_count(2)
+    tablebase = Tablebase(path)
+    n = len(_layout(2).moves)
+    layout = _layout(2)
+    for p in range(n + 1):
+        for cuts, shorts in zip(*_layer(n, p)):
+            # play the position's moves in any legal order
+            cut_moves = [move for i, move in enumerate(layout.moves) if cuts >> i & 1]
+            short_moves = [move for i, move in enumerate(layout.moves) if shorts >> i & 1]
+            moves = [move for pair in zip(cut_moves, short_moves + [None]) for move in pair if move is not None]
+            board = CompactBirdCage(2)
+            for move in moves:
+                board.move(move)
+            assert tablebase.value(board) == _minimax(board), moves
+
+def test_tablebase_M3(tablebase3):
+    assert len(tablebase3) == 414584
+    board = CompactBirdCage(3)
+    assert tablebase3.winner(board) == "CUT"
+    random_state = np.random.default_rng(3)
+    for _ in range(20):
+        board = CompactBirdCage(3)
+        while not (board.white_has_won() or board.black_has_won()):
+            open_moves = [move for move in board.layout.moves if board.state(move) == OPEN]
+            board.move(open_moves[random_state.integers(len(open_moves))])
+            if len(open_moves) <= 8:
+                assert tablebase3.value(board) == _minimax(board)
+    # a BirdCage board works too
+    assert tablebase3.value(BirdCage(3, ["A1"])) == tablebase3.value(CompactBirdCage(3, ["A1"]))
+
+def test_tablebase_mistakes(tablebase3):
+    # Shannon's third move loses (see test_shannon_game_M3)
+    moves = ["A1", "c1", "C3", "a5", "B2", "e3", "E5", "d4", "D2", "e1", "B4", "c5"]
+    mistakes = tablebase3.mistakes(moves)
+    assert [(mistake.ply, mistake.move) for mistake in mistakes] == [(5, "B2")]
+    assert mistakes[0].before > 0 and mistakes[0].after < 0
+    assert "B2" not in tablebase3.best_moves(CompactBirdCage(3, moves[:4]))
+
+def test_tablebase_player(tablebase3):
+    # perfect play as CUT wins against anything
+    player = TablebasePlayer(tablebase3)
+    random_state = np.random.default_rng(5)
+    for _ in range(10):
+        board = CompactBirdCage(3)
+        while True:
+            board.move(player.play(board))
+            if board.white_has_won():
+                break
+            open_moves = [move for move in board.layout.moves if board.state(move) == OPEN]
+            board.move(open_moves[random_state.integers(len(open_moves))])
+            assert not board.black_has_won()
+    # there is no move once the game is over
+    with pytest.raises(ValueError):
+        player.play(board)
+
+def test_build_tablebase_too_big(tmp_path):
+    path = tmp_path / "tablebase4.bin"
+    with pytest.raises(ValueError):
+        build_tablebase(path, 4)
+    assert not path.exists()
@@ -0,0 +1,33 @@
+from tournament import *
+
+def test_play_game_is_reproducible():
+    result1 = play_game(3, "random", "random", seed=42)
+    result2 = play_game(3, "random", "random", seed=42)
+    assert result1["moves"] == result2["moves"]
+    assert result1["winner"] == result2["winner"]
+    bc = CompactBirdCage(3, result1["moves"])
+    assert bc.white_has_won() == (result1["winner"] == "cut")
+
+def test_run(tmp_path):
+    path = tmp_path / "results.jsonl"
+    results = run(["random", "perfect"], [3], 3, seed=1, workers=1, path=path)
+    assert len(results) == 6
+    assert read_results(path) == results
+    for result in results:
+        # perfect always wins as CUT
+        if result["cut"] == "perfect":
+            assert result["winner"] == "cut"
+    summary = summarise(results)
+    assert "perfect" in summary and "random" in summary
+
+def test_run_parallel_matches_serial():
+    serial = run(["random", "shannon-numpy"], [3], 2, seed=2, workers=1)
+    parallel = run(["random", "shannon-numpy"], [3], 2, seed=2, workers=2)
+    key = lambda result: (result["cut"], result["game"])
+    assert [r["moves"] for r in sorted(serial, key=key)] == [r["moves"] for r in sorted(parallel, key=key)]
+
+def test_wilson_interval():
+    lo, hi = wilson_interval(50, 100)
+    assert 0.40 < lo < 0.41 and 0.59 < hi < 0.60
+    assert wilson_interval(0, 10)[0] == 0
+    assert wilson_interval(10, 10)[1] == 1
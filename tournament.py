@@ -0,0 +1,184 @@
+"""Play tournaments between Bird Cage players.
+
+Every ordered pairing of the players (the first plays CUT, the second SHORT) plays a number of games
+on each board size. Games are spread across a pool of processes, and each is seeded so that it can be
+replayed exactly. Results are appended to a JSON lines file as games finish, then summarised with win
+rates (and their confidence intervals), mean game lengths and mean think times per move.
+
+For example, to play 100 games of each pairing on boards of size 3 and 4:
+
+    python tournament.py --players shannon-numpy,random,perfect --sizes 3,4 --games 100
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import random
+import time
+from collections import defaultdict
+from itertools import permutations
+
+from birdcage import *
+from game_records import GameWriter
+from mcts import MCTS
+
+# the players that can take part, by name
+PLAYERS = {
+    "random": Random,
+    "shannon": Shannon,
+    "shannon-numpy": lambda: Shannon(solver=NumpySolver()),
+    "shannon-exact": lambda: Shannon(solver=ExactSolver()),
+    "incremental": IncrementalShannon,
+    "lookahead": LookaheadShannon,
+    "lookahead-4": lambda: LookaheadShannon(depth=4),
+    "perfect": Perfect,
+    # games are already spread across processes, so each search runs on one
+    "mcts": lambda: MCTS(time_limit=0.5, workers=1),
+}
+
+def game_seed(seed, M, cut, short, game):
+    """Return the seed for a game, which depends only on the tournament seed and the game's place in it."""
+    return random.Random(f"{seed}:{M}:{cut}:{short}:{game}").getrandbits(32)
+
+def play_game(M, cut, short, game=0, seed=0):
+    """Play a game between the players named `cut` and `short` on a board of size `M`, and return a result record."""
+    random.seed(seed)
+    players = (PLAYERS[cut](), PLAYERS[short]())
+    think_times = ([], [])
+    board = CompactBirdCage(M)
+    while not (board.white_has_won() or board.black_has_won()):
+        side = len(board.moves) % 2
+        start = time.perf_counter()
+        move = players[side].play(board)
+        think_times[side].append(time.perf_counter() - start)
+        board.move(move)
+    return {
+        "M": M,
+        "cut": cut,
+        "short": short,
+        "game": game,
+        "seed": seed,
+        "winner": "cut" if board.white_has_won() else "short",
+        "moves": board.moves,
+        "cut_think_time": sum(think_times[0]),
+        "short_think_time": sum(think_times[1]),
+    }
+
+def _play_game(args):
+    return play_game(*args)
+
+def schedule(players, sizes, games, seed=0):
+    """Return the arguments for `play_game` for every game in a tournament."""
+    return [
+        (M, cut, short, game, game_seed(seed, M, cut, short, game))
+        for M in sizes
+        for cut, short in permutations(players, 2)
+        for game in range(games)
+    ]
+
+def run(players, sizes, games, seed=0, workers=None, path=None, records=None):
+    """Play a tournament and return the list of results, appending each one to `path` (if given) as it finishes,
+    and its moves to the game record file `records` (if given, see `game_records.py`).
+
+    Games are played on `workers` processes (the number of CPUs by default), or in this process if it is 1."""
+    for name in players:
+        if name not in PLAYERS:
+            raise ValueError(f"Unknown player: {name}")
+    tasks = schedule(players, sizes, games, seed)
+    results = []
+    out = open(path, "a") if path is not None else None
+    writer = GameWriter(records) if records is not None else None
+    pool = multiprocessing.Pool(workers) if workers != 1 else None
+    try:
+        finished = pool.imap_unordered(_play_game, tasks) if pool is not None else map(_play_game, tasks)
+        for result in finished:
+            results.append(result)
+            if out is not None:
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+            if writer is not None:
+                writer.write(result["M"], result["moves"], result["cut"], result["short"])
+    finally:
+        if pool is not None:
+            pool.terminate()
+        if out is not None:
+            out.close()
+        if writer is not None:
+            writer.close()
+    return results
+
+def read_results(path):
+    """Read the results written by `run`."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def wilson_interval(wins, n, z=1.96):
+    """Return the Wilson score interval for a win rate (95% by default)."""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    centre = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+def summarise(results):
+    """Return a table (as a string) of statistics for each pairing, and for each player overall."""
+    pairings = defaultdict(list)
+    players = defaultdict(lambda: {"games": 0, "wins": 0, "moves": 0, "think_time": 0.0})
+    for result in results:
+        pairings[result["M"], result["cut"], result["short"]].append(result)
+        plies = len(result["moves"])
+        for side in ("cut", "short"):
+            stats = players[result["M"], result[side]]
+            stats["games"] += 1
+            stats["wins"] += result["winner"] == side
+            # CUT plays the odd plies
+            stats["moves"] += (plies + 1) // 2 if side == "cut" else plies // 2
+            stats["think_time"] += result[f"{side}_think_time"]
+
+    lines = [f"{'M':>3} {'CUT':>14} {'SHORT':>14} {'games':>6} {'CUT wins':>23} {'plies':>6} {'CUT ms/move':>12} {'SHORT ms/move':>14}"]
+    for (M, cut, short), games in sorted(pairings.items()):
+        n = len(games)
+        wins = sum(result["winner"] == "cut" for result in games)
+        lo, hi = wilson_interval(wins, n)
+        plies = sum(len(result["moves"]) for result in games)
+        cut_moves = sum((len(result["moves"]) + 1) // 2 for result in games)
+        short_moves = plies - cut_moves
+        cut_ms = 1000 * sum(result["cut_think_time"] for result in games) / max(cut_moves, 1)
+        short_ms = 1000 * sum(result["short_think_time"] for result in games) / max(short_moves, 1)
+        lines.append(
+            f"{M:>3} {cut:>14} {short:>14} {n:>6} {wins / n:>6.1%} [{lo:>6.1%}, {hi:>6.1%}] "
+            f"{plies / n:>6.1f} {cut_ms:>12.2f} {short_ms:>14.2f}"
+        )
+    lines.append("")
+    lines.append(f"{'M':>3} {'player':>14} {'games':>6} {'wins':>23} {'ms/move':>8}")
+    for (M, name), stats in sorted(players.items()):
+        lo, hi = wilson_interval(stats["wins"], stats["games"])
+        ms = 1000 * stats["think_time"] / max(stats["moves"], 1)
+        lines.append(
+            f"{M:>3} {name:>14} {stats['games']:>6} {stats['wins'] / stats['games']:>6.1%} [{lo:>6.1%}, {hi:>6.1%}] {ms:>8.2f}"
+        )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a tournament between Bird Cage players.")
+    parser.add_argument("--players", default="shannon-numpy,random,perfect", help=f"comma-separated players, from {', '.join(PLAYERS)}")
+    parser.add_argument("--sizes", default="3,4", help="comma-separated board sizes")
+    parser.add_argument("--games", type=int, default=10, help="games per pairing and board size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--out", default="tournament.jsonl", help="file to append results to")
+    parser.add_argument("--records", help="game record file to append the moves of each game to")
+    args = parser.parse_args()
+
+    results = run(
+        args.players.split(","),
+        [int(M) for M in args.sizes.split(",")],
+        args.games,
+        seed=args.seed,
+        workers=args.workers,
+        path=args.out,
+        records=args.records,
+    )
+    print(summarise(results))